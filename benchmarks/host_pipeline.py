@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+"""Benchmark the host-side stages of running a network tester experiment.
+
+Synthetic experiments are run on synthetic machines of various sizes using an
+:py:class:`~network_tester.emulator.EmulatedMachineController`, which also
+produces the (synthetic) result data read back. Each stage of the host-side
+pipeline is timed separately and the results are written as JSON, which is
+suitable for tracking performance over time.
+
+    $ python benchmarks/host_pipeline.py --boards 1 3 12 --output bench.json
+
+The stages timed are:
+
+``run``
+    The whole of :py:meth:`Experiment.run`, which includes the stages below.
+``place_and_route``
+    :py:meth:`Experiment._place_and_route`.
+``get_core_record_lookup``
+    :py:meth:`Experiment._get_core_record_lookup`.
+``construct_core_commands``
+    All calls to :py:meth:`Experiment._construct_core_commands`.
+``pack``
+    All calls to :py:meth:`Commands.pack`.
+``load_application``
+    Loading the application onto the emulated machine. This includes
+    emulating the experiment.
+``results_init``
+    :py:meth:`Results.__init__`.
+``totals``, ``core_totals``, ...
+    Each of the :py:attr:`Results.TABLES` methods.
+``to_csv.totals``, ``to_csv.core_totals``, ...
+    :py:func:`to_csv` applied to each table.
+
+The traffic patterns are:
+
+``link_throughput``
+    As in ``examples/link_throughput.py``. Every core on every chip sends to
+    the corresponding core at the far end of each of the six links of its
+    chip, with each link direction tested in a separate group.
+``group_sweep``
+    Every core sends to a randomly chosen core. The probability of sending a
+    packet is swept over many groups.
+``fan_out``
+    The first core on every chip multicasts to many randomly chosen cores.
+
+Every machine is made up of SpiNN-5 boards in the standard arrangement (see
+:py:func:`rig.geometry.standard_system_dimensions`). Large machines (e.g. the
+1,200-board machine) take a long time to benchmark. Use ``--trace-memory`` to
+record the peak memory allocated during each stage, which makes the stages
+significantly slower.
+"""
+
+import argparse
+
+import datetime
+
+import functools
+
+import json
+
+import platform
+
+import random
+
+import sys
+
+import time
+
+from collections import OrderedDict
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+import numpy as np
+
+from rig.geometry import standard_system_dimensions
+from rig.links import Links
+from rig.machine_control.machine_controller import SystemInfo, ChipInfo
+
+from network_tester import Experiment, Results, to_csv
+from network_tester.commands import Commands
+from network_tester.emulator import EmulatedMachineController
+from network_tester.version import __version__
+
+
+FORMAT_VERSION = 1
+"""The version of the JSON output format."""
+
+
+def synthetic_system_info(num_boards):
+    """Create the SystemInfo of a fully working machine made up of num_boards
+    SpiNN-5 boards.
+
+    A single board is not toroidal. Any multiple of three boards forms a
+    torus.
+    """
+    width, height = standard_system_dimensions(num_boards)
+    if num_boards == 1:
+        # Chips not present on a SpiNN-5 board are cut from the corners of
+        # the 8x8 grid
+        chips = set((x, y) for x in range(width) for y in range(height)
+                    if -3 <= x - y <= 4)
+    else:
+        chips = set((x, y) for x in range(width) for y in range(height))
+
+    chip_infos = {}
+    for x, y in chips:
+        working_links = set()
+        for link in Links:
+            dx, dy = link.to_vector()
+            neighbour = (x + dx, y + dy)
+            if num_boards != 1:
+                neighbour = (neighbour[0] % width, neighbour[1] % height)
+            if neighbour in chips:
+                working_links.add(link)
+        chip_infos[(x, y)] = ChipInfo(working_links=working_links)
+
+    return SystemInfo(width, height, chip_infos)
+
+
+def link_throughput(e, cores_per_chip, **kwargs):
+    """Every core sends to the corresponding core on each neighbouring chip.
+    One group is used for each link direction and for odd and even rows or
+    columns (as in examples/link_throughput.py)."""
+    system_info = e.system_info
+    chip_cores = {(x, y): [e.new_core(x, y) for _ in range(cores_per_chip)]
+                  for x, y in system_info}
+
+    link_flows = {}
+    for x, y, link in system_info.links():
+        dx, dy = link.to_vector()
+        neighbour = ((x + dx) % system_info.width,
+                     (y + dy) % system_info.height)
+        link_flows[(x, y, link)] = [
+            e.new_flow(tx, rx) for tx, rx in zip(
+                chip_cores[(x, y)], chip_cores.get(neighbour, []))]
+
+    e.packets_per_timestep = 0
+    for link, alternate_dimension in [(Links.east, 0), (Links.west, 0),
+                                      (Links.north, 1), (Links.south, 1),
+                                      (Links.north_east, 1),
+                                      (Links.south_west, 1)]:
+        for odd_even in [0, 1]:
+            with e.new_group() as g:
+                g.add_label("group_link", link.name)
+                g.add_label("group_odd_even", odd_even)
+                for x, y in system_info:
+                    if ((x, y)[alternate_dimension] % 2 == odd_even and
+                            (x, y, link) in link_flows):
+                        for flow in link_flows[(x, y, link)]:
+                            flow.packets_per_timestep = 1
+
+    e.record_sent = True
+    e.record_blocked = True
+    e.record_received = True
+    e.record_local_multicast = True
+    e.record_external_multicast = True
+    e.record_dropped_multicast = True
+
+
+def group_sweep(e, cores_per_chip, num_groups=50, **kwargs):
+    """Every core sends to a random core while the probability of sending is
+    swept over many groups."""
+    rng = random.Random(0)
+    cores = [e.new_core(x, y)
+             for x, y in e.system_info
+             for _ in range(cores_per_chip)]
+    for core in cores:
+        e.new_flow(core, rng.choice(cores))
+
+    for probability in np.linspace(0.0, 1.0, num_groups):
+        with e.new_group() as g:
+            e.probability = probability
+            g.add_label("probability", probability)
+
+    e.record_sent = True
+    e.record_received = True
+
+
+def fan_out(e, cores_per_chip, fan_out=64, **kwargs):
+    """The first core on every chip multicasts to many random cores."""
+    rng = random.Random(0)
+    chip_cores = [[e.new_core(x, y) for _ in range(cores_per_chip)]
+                  for x, y in e.system_info]
+    cores = [core for cores in chip_cores for core in cores]
+    for cores_on_chip in chip_cores:
+        e.new_flow(cores_on_chip[0],
+                   rng.sample(cores, min(fan_out, len(cores))))
+
+    e.record_sent = True
+    e.record_received = True
+    e.record_local_multicast = True
+    e.record_external_multicast = True
+
+
+PATTERNS = OrderedDict([
+    ("link_throughput", link_throughput),
+    ("group_sweep", group_sweep),
+    ("fan_out", fan_out),
+])
+"""The traffic patterns available: {name: function(experiment,
+cores_per_chip, **kwargs), ...}."""
+
+
+class StageTimer(object):
+    """Accumulates the time spent (and optionally the peak memory allocated)
+    in each stage of the pipeline.
+
+    Stages may be nested. Each stage's peak memory includes the memory
+    allocated by the stages nested within it.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory and tracemalloc is not None
+        # {name: {"time": seconds, "calls": n, "peak_memory": bytes}, ...}
+        self.stages = OrderedDict()
+        self._stack = []
+
+    def _update_peaks(self):
+        """Attribute the peak memory allocated since the last update to every
+        stage currently running."""
+        if not self.trace_memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for name in self._stack:
+            self.stages[name]["peak_memory"] = max(
+                self.stages[name]["peak_memory"], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager which times a stage."""
+        if name not in self.stages:
+            self.stages[name] = OrderedDict([
+                ("time", 0.0), ("calls", 0),
+                ("peak_memory", 0 if self.trace_memory else None)])
+
+        self._update_peaks()
+        self._stack.append(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stages[name]["time"] += time.time() - start
+            self.stages[name]["calls"] += 1
+            self._update_peaks()
+            self._stack.pop()
+
+    def wrap(self, name, function):
+        """Wrap a function such that every call is timed as a stage."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+@contextmanager
+def instrument(timer):
+    """Context manager which times the stages of the pipeline which take
+    place within Experiment.run."""
+    patches = [(Experiment, "_place_and_route", "place_and_route"),
+               (Experiment, "_get_core_record_lookup",
+                "get_core_record_lookup"),
+               (Experiment, "_construct_core_commands",
+                "construct_core_commands"),
+               (Commands, "pack", "pack"),
+               (EmulatedMachineController, "load_application",
+                "load_application"),
+               (Results, "__init__", "results_init")]
+
+    originals = [(cls, attr, cls.__dict__[attr]) for cls, attr, _ in patches]
+    try:
+        for cls, attr, name in patches:
+            setattr(cls, attr, timer.wrap(name, getattr(cls, attr)))
+        yield
+    finally:
+        for cls, attr, original in originals:
+            setattr(cls, attr, original)
+
+
+def benchmark(pattern, num_boards, cores_per_chip=16, trace_memory=False,
+              **kwargs):
+    """Benchmark the host-side pipeline for a traffic pattern on a machine of
+    the given size.
+
+    Returns
+    -------
+    OrderedDict
+        The parameters of the benchmark, the size of the experiment and the
+        times (and peak memory) of every stage.
+    """
+    mc = EmulatedMachineController(
+        system_info=synthetic_system_info(num_boards), seed=0)
+    e = Experiment(mc)
+    PATTERNS[pattern](e, cores_per_chip, **kwargs)
+
+    # Keep the time spent waiting for the (emulated) machine short
+    e.timestep = 1e-5
+    e.warmup = 0.0
+    e.duration = 1e-4
+    e.cooldown = 0.0
+    e.flush_time = 0.0
+
+    timer = StageTimer(trace_memory)
+    if timer.trace_memory:
+        tracemalloc.start()
+    try:
+        with instrument(timer):
+            with timer.stage("run"):
+                results = e.run(ignore_deadline_errors=True)
+
+        for table in Results.TABLES:
+            with timer.stage(table):
+                data = getattr(results, table)()
+            with timer.stage("to_csv." + table):
+                to_csv(data)
+    finally:
+        if timer.trace_memory:
+            tracemalloc.stop()
+
+    out = OrderedDict()
+    out["pattern"] = pattern
+    out["boards"] = num_boards
+    out["cores_per_chip"] = cores_per_chip
+    out["kwargs"] = kwargs
+    out["chips"] = len(e.system_info)
+    out["cores"] = len(e._cores)
+    out["flows"] = len(e._flows)
+    out["groups"] = len(e._groups)
+    out["stages"] = timer.stages
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS.
+        out["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return out
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the host-side network tester pipeline.")
+    parser.add_argument("--boards", type=int, nargs="+", default=[1, 3, 12],
+                        help="machine sizes (in boards) to benchmark: 1 or a "
+                             "multiple of 3 (default: %(default)s)")
+    parser.add_argument("--patterns", nargs="+", choices=list(PATTERNS),
+                        default=list(PATTERNS),
+                        help="traffic patterns to benchmark (default: all)")
+    parser.add_argument("--cores-per-chip", type=int, default=16,
+                        help="cores used on each chip (default: %(default)s)")
+    parser.add_argument("--groups", type=int, default=50,
+                        help="groups in the group_sweep pattern "
+                             "(default: %(default)s)")
+    parser.add_argument("--fan-out", type=int, default=64,
+                        help="sinks of each flow in the fan_out pattern "
+                             "(default: %(default)s)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record the peak memory of every stage")
+    parser.add_argument("--output", "-o", type=argparse.FileType("w"),
+                        default=sys.stdout,
+                        help="file to write JSON results to "
+                             "(default: stdout)")
+    args = parser.parse_args(args)
+
+    pattern_kwargs = {"group_sweep": {"num_groups": args.groups},
+                      "fan_out": {"fan_out": args.fan_out}}
+
+    out = OrderedDict()
+    out["format_version"] = FORMAT_VERSION
+    out["network_tester_version"] = __version__
+    out["date"] = datetime.datetime.utcnow().isoformat()
+    out["python"] = platform.python_version()
+    out["numpy"] = np.__version__
+    out["platform"] = platform.platform()
+    out["benchmarks"] = []
+    for num_boards in args.boards:
+        for pattern in args.patterns:
+            sys.stderr.write("Benchmarking {} on {} board(s)...\n".format(
+                pattern, num_boards))
+            out["benchmarks"].append(benchmark(
+                pattern, num_boards, args.cores_per_chip, args.trace_memory,
+                **pattern_kwargs.get(pattern, {})))
+
+    json.dump(out, args.output, indent=1)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
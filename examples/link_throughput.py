@@ -26,7 +26,7 @@ from rig.machine_control import MachineController
 from rig.links import Links
 from rig.geometry import spinn5_chip_coord, spinn5_fpga_link
 
-from network_tester import Experiment, to_csv
+from network_tester import Experiment, to_csv, write_csv
 
 
 # Show detailed logging information
@@ -221,7 +221,8 @@ for row in range(len(data)):
     else:
         data[row]["fpga_num"], data[row]["fpga_link_num"] = fpga_link
 
-# Be warned, this CSV is *very* large (74 MB) for a 24-board system...
+# Be warned, this CSV is *very* large (74 MB) for a 24-board system so it is
+# streamed to disk rather than built in memory...
 with open("data.csv", "w") as f:
-    f.write(to_csv(data))
+    write_csv(data, f)
 
@@ -6,4 +6,6 @@ from .results import Results
 
 from .errors import NetworkTesterError
 
-from .results import to_csv
+from .results import to_csv, write_csv, to_objects, load_results
+
+from .columnar import load_columnar
@@ -0,0 +1,290 @@
+"""Columnar binary storage of result tables.
+
+Result tables (see :py:class:`Results`) are stored in a directory with every
+column of every table held in its own ``.npy`` file, allowing individual
+columns to be memory-mapped when the tables are loaded. Columns which would
+contain objects (e.g. 'group', 'core' and 'flow') are dictionary-encoded, as
+in the categorical form of :py:class:`Results` tables, with the objects
+recorded by name in a JSON metadata file alongside details of the groups,
+cores, flows and placements of the experiment.
+
+The layout of the directory is::
+
+    metadata.json
+    TABLE_NAME/
+        0.npy      # The first column of the table
+        1.npy      # The second column of the table
+        ...
+"""
+
+import json
+
+import os
+
+from collections import OrderedDict
+
+import numpy as np
+
+from network_tester.counters import Counters
+
+from rig.links import Links
+
+
+FORMAT_VERSION = 1
+"""The version of the storage format written by :py:func:`save_columnar`."""
+
+
+def save_columnar(path, tables, groups, cores, flows, placements):
+    """Save a set of result tables in the columnar storage format.
+
+    This function is usually called via :py:meth:`Results.save_columnar`.
+
+    Parameters
+    ----------
+    path : str
+        The directory to write to. It is created if it does not exist.
+    tables : {name: :py:class:`numpy.ndarray`, ...}
+        Result tables in categorical form (see :py:class:`Results`).
+    groups : [:py:class:`Group`, ...]
+    cores : [:py:class:`Core`, ...]
+    flows : [:py:class:`Flow`, ...]
+    placements : {:py:class:`Core`: (x, y), ...}
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    metadata = OrderedDict()
+    metadata["format_version"] = FORMAT_VERSION
+    metadata["groups"] = [
+        OrderedDict([("name", _encode_object(group.name)),
+                     ("labels", OrderedDict(
+                         (label, _encode_object(value))
+                         for label, value in group.labels.items()))])
+        for group in groups]
+    metadata["cores"] = [
+        OrderedDict([("name", _encode_object(core.name)),
+                     ("placement", list(placements[core])
+                      if core in placements else None)])
+        for core in cores]
+    metadata["flows"] = [
+        OrderedDict([("name", _encode_object(flow.name)),
+                     ("source", _encode_object(flow.source.name)),
+                     ("sinks", [_encode_object(sink.name)
+                                for sink in flow.sinks])])
+        for flow in flows]
+
+    metadata["tables"] = OrderedDict()
+    for table_name, data in tables.items():
+        table_path = os.path.join(path, table_name)
+        if not os.path.isdir(table_path):
+            os.makedirs(table_path)
+
+        fields = []
+        for column, name in enumerate(data.dtype.names):
+            dtype = data.dtype[name]
+            if dtype.metadata and "categories" in dtype.metadata:
+                categories = [_encode_object(c)
+                              for c in dtype.metadata["categories"]]
+            else:
+                categories = None
+            fields.append(OrderedDict([("name", name),
+                                       ("categories", categories)]))
+            # The categories are stored in the metadata file rather than in
+            # the dtype.
+            np.save(os.path.join(table_path, "{}.npy".format(column)),
+                    np.ascontiguousarray(data[name]).view(
+                        np.dtype(dtype.str)))
+
+        metadata["tables"][table_name] = OrderedDict([
+            ("num_rows", len(data)), ("fields", fields)])
+
+    with open(os.path.join(path, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=1)
+
+
+def load_columnar(path, mmap_mode="r"):
+    """Load a set of result tables saved by :py:meth:`Results.save_columnar`.
+
+    Loading is near-instant since columns are memory-mapped (by default) and
+    only read from disk when accessed.
+
+    Parameters
+    ----------
+    path : str
+        The directory the tables were saved in.
+    mmap_mode : str or None
+        The :py:func:`numpy.load` memory-mapping mode to use when loading
+        columns. If None, columns are read into memory.
+
+    Returns
+    -------
+    :py:class:`ColumnarResults`
+    """
+    with open(os.path.join(path, "metadata.json"), "r") as f:
+        metadata = json.load(f, object_pairs_hook=OrderedDict)
+
+    if metadata["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            "Unsupported columnar storage format version {}.".format(
+                metadata["format_version"]))
+
+    return ColumnarResults(path, metadata, mmap_mode)
+
+
+class ColumnarResults(object):
+    """A set of result tables loaded by :py:func:`load_columnar`.
+
+    Tables are accessed by name, e.g. ``columnar["totals"]``, as
+    :py:class:`ColumnarTable` objects.
+
+    Attributes
+    ----------
+    groups : [{"name": name, "labels": {label: value, ...}}, ...]
+        The experimental groups in the order they were run.
+    cores : [{"name": name, "placement": [x, y]}, ...]
+        The cores in the experiment.
+    flows : [{"name": name, "source": name, "sinks": [name, ...]}, ...]
+        The flows in the experiment.
+    """
+
+    def __init__(self, path, metadata, mmap_mode):
+        """Internal use only. See :py:func:`load_columnar`."""
+        self.groups = metadata["groups"]
+        self.cores = metadata["cores"]
+        self.flows = metadata["flows"]
+        self._tables = OrderedDict(
+            (table_name, ColumnarTable(os.path.join(path, table_name),
+                                       table["num_rows"], table["fields"],
+                                       mmap_mode))
+            for table_name, table in metadata["tables"].items())
+
+    @property
+    def placements(self):
+        """A dictionary {core_name: (x, y), ...} giving the chip each core was
+        placed on."""
+        return {core["name"]: tuple(core["placement"])
+                for core in self.cores
+                if core["placement"] is not None}
+
+    def keys(self):
+        """The names of the tables available."""
+        return list(self._tables)
+
+    def __contains__(self, table_name):
+        return table_name in self._tables
+
+    def __getitem__(self, table_name):
+        return self._tables[table_name]
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__,
+                                ", ".join(self._tables))
+
+
+class ColumnarTable(object):
+    """A single result table loaded by :py:func:`load_columnar`.
+
+    Individual columns are accessed by name, e.g. ``table["sent"]``, and are
+    loaded (or memory-mapped) only when first accessed. Dictionary-encoded
+    columns contain integer codes into the list of categories given by
+    :py:meth:`.categories`. Objects (groups, cores and flows) are represented
+    by their names, router chips by (x, y) tuples, counters by their
+    :py:class:`Counters` value and links by their :py:class:`rig.links.Links`
+    value.
+    """
+
+    def __init__(self, path, num_rows, fields, mmap_mode):
+        """Internal use only. See :py:func:`load_columnar`."""
+        self._path = path
+        self._num_rows = num_rows
+        self._mmap_mode = mmap_mode
+        self._fields = OrderedDict(
+            (field["name"], (column, field["categories"]))
+            for column, field in enumerate(fields))
+        self._columns = {}
+
+    @property
+    def names(self):
+        """The names of the columns in this table."""
+        return tuple(self._fields)
+
+    def categories(self, name):
+        """Get the list of categories of a dictionary-encoded column (or None
+        if the column is not dictionary-encoded)."""
+        categories = self._fields[name][1]
+        if categories is None:
+            return None
+        else:
+            return [_decode_object(c) for c in categories]
+
+    def __len__(self):
+        return self._num_rows
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            column, _ = self._fields[name]
+            self._columns[name] = np.load(
+                os.path.join(self._path, "{}.npy".format(column)),
+                mmap_mode=self._mmap_mode)
+        return self._columns[name]
+
+    def to_array(self):
+        """Assemble the table into a structured array in the categorical form
+        produced by :py:class:`Results` (see :py:func:`to_objects` and
+        :py:func:`to_csv`).
+        """
+        dtype = []
+        for name in self._fields:
+            categories = self.categories(name)
+            if categories is None:
+                dtype.append((name, self[name].dtype))
+            else:
+                dtype.append((name, np.dtype(
+                    self[name].dtype, metadata={"categories": categories})))
+
+        a = np.zeros((self._num_rows, ), dtype=dtype)
+        for name in self._fields:
+            a[name] = self[name]
+        return a
+
+    def __repr__(self):
+        return "<{} {} rows: {}>".format(self.__class__.__name__,
+                                         self._num_rows,
+                                         ", ".join(self._fields))
+
+
+def _encode_object(obj):
+    """Encode an object appearing in a results table in JSON-compatible form.
+
+    Groups, cores and flows are represented by their names, counters and links
+    by their name (tagged to distinguish them from strings) and tuples (e.g.
+    router chip coordinates) by lists.
+    """
+    from network_tester.experiment import Group, Core, Flow
+
+    if isinstance(obj, (Group, Core, Flow)):
+        return _encode_object(obj.name)
+    elif isinstance(obj, Counters):
+        return {"counter": obj.name}
+    elif isinstance(obj, Links):
+        return {"link": obj.name}
+    elif isinstance(obj, tuple):
+        return [_encode_object(o) for o in obj]
+    elif obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    else:
+        return str(obj)
+
+
+def _decode_object(obj):
+    """Decode an object encoded by :py:func:`_encode_object`."""
+    if isinstance(obj, list):
+        return tuple(_decode_object(o) for o in obj)
+    elif isinstance(obj, dict) and "link" in obj:
+        return Links[obj["link"]]
+    elif isinstance(obj, dict):
+        return Counters[obj["counter"]]
+    else:
+        return obj
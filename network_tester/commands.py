@@ -26,6 +26,9 @@ class NT_CMD(IntEnum):
 
     RECORD = 0x10
     RECORD_INTERVAL = 0x11
+    LATENCY_HISTOGRAM = 0x12
+    COMPACT_RECORDING = 0x13
+    AGGREGATE_RECORDING = 0x14
 
     PROBABILITY = 0x20
     BURST_PERIOD = 0x21
@@ -36,10 +39,13 @@ class NT_CMD(IntEnum):
     NO_PAYLOAD = 0x26
     NUM_RETRIES = 0x27
     NUM_PACKETS = 0x28
+    NUM_REPLIES = 0x29
+    REPLY_KEY = 0x2A
 
     CONSUME = 0x30
     NO_CONSUME = 0x31
     SINK_KEY = 0x32
+    ECHO_KEY = 0x33
 
 
 class Commands(object):
@@ -70,6 +76,10 @@ class Commands(object):
         # What is currently being recorded?
         self._currently_recorded = 0
 
+        # The (num_bins, bin_width) of the latency histograms kept by each
+        # sink.
+        self._latency_histogram = (0, None)
+
         # The current burst parameters, one for each source
         self._current_burst_period = None
         self._current_burst_duty = None
@@ -87,6 +97,13 @@ class Commands(object):
         # A list of keys, one for each sink
         self._sink_key = None
 
+        # A list of keys with which each sink echoes arriving packets (or None
+        # if not echoed), one for each sink
+        self._echo_key = None
+
+        # A list of (key, source_num) tuples, one for each reply
+        self._reply_key = None
+
         # A list of bools indicating whether a payload should be included with
         # generated packets, one for each source
         self._payload = None
@@ -220,9 +237,24 @@ class Commands(object):
         self._num_packets = [1] * num_sources
 
         self._sink_key = [0] * num_sinks
+        self._echo_key = [None] * num_sinks
 
         self._commands.extend([NT_CMD.NUM, num_sources | (num_sinks << 16)])
 
+    def num_replies(self, num_replies):
+        """Specify the number of replies (flows of packets echoed back to this
+        core's sources by their sinks) to expect.
+
+        May only be done once.
+        """
+        assert not self._exited
+
+        assert self._reply_key is None
+
+        self._reply_key = [None] * num_replies
+
+        self._commands.extend([NT_CMD.NUM_REPLIES, num_replies])
+
     def router_timeout(self, wait1, wait2=0):
         """Set the router timeouts to use on the current chip.
 
@@ -278,6 +310,9 @@ class Commands(object):
 
         Any counter in :py:class:`.Counters` may be specified. If a counter is
         not specified, it is assumed to be disabled.
+
+        The set of counters is a 64-bit bitmap which is sent as two 32-bit
+        words, the word being set given in bits 15:8 of the command.
         """
         assert not self._exited
 
@@ -285,10 +320,13 @@ class Commands(object):
         for counter in counters:
             recorded |= counter
 
-        # Only set the recording set if it changes
-        if recorded != self._currently_recorded:
-            self._currently_recorded = recorded
-            self._commands.extend([NT_CMD.RECORD, recorded])
+        # Only set each word of the recording set if it changes
+        for word in range(2):
+            old = (self._currently_recorded >> (32 * word)) & 0xFFFFFFFF
+            new = (recorded >> (32 * word)) & 0xFFFFFFFF
+            if new != old:
+                self._commands.extend([NT_CMD.RECORD | (word << 8), new])
+        self._currently_recorded = recorded
 
     def record_interval(self, interval):
         """Set the interval between recording values in seconds. If 0, record
@@ -307,6 +345,57 @@ class Commands(object):
             interval = int(round(interval / self._current_timestep))
             self._commands.extend([NT_CMD.RECORD_INTERVAL, interval])
 
+    def latency_histogram(self, num_bins, bin_width):
+        """Set the shape of the packet latency histograms kept by each sink.
+
+        Parameters
+        ----------
+        num_bins : int
+            The number of bins in each histogram. The final bin counts all
+            packets whose latency exceeds the range of the preceding bins. If
+            0, no histograms are kept.
+        bin_width : float
+            The width of each bin in seconds.
+        """
+        assert not self._exited
+
+        # Only output if changed
+        if self._latency_histogram != (num_bins, bin_width):
+            self._latency_histogram = (num_bins, bin_width)
+
+            # Convert to ns
+            bin_width = int(round(bin_width * 1e9))
+            self._commands.extend([NT_CMD.LATENCY_HISTOGRAM,
+                                   num_bins, bin_width])
+
+    def compact_recording(self, num_tag_words):
+        """Record results in compact form (see :py:func:`.compact_tag_words`).
+
+        Must be issued before any results are recorded.
+
+        Parameters
+        ----------
+        num_tag_words : int
+            The number of words of SDRAM to reserve for width tags, i.e. the
+            sum of :py:func:`.compact_tag_words` for every sample recorded.
+        """
+        assert not self._exited
+
+        self._commands.extend([NT_CMD.COMPACT_RECORDING, num_tag_words])
+
+    def aggregate_recording(self):
+        """Record only the aggregates of each value over each recording run.
+
+        Rather than recording every sample, the sum, minimum, maximum and sum
+        of squares of every value are accumulated on-core and written (as
+        :py:data:`.AGGREGATE_WORDS` words per value) at the end of each run.
+
+        Must be issued before any results are recorded.
+        """
+        assert not self._exited
+
+        self._commands.append(NT_CMD.AGGREGATE_RECORDING)
+
     def probability(self, source_num, probability):
         """Set the generation probability of a particular source."""
         assert not self._exited
@@ -451,6 +540,76 @@ class Commands(object):
             self._sink_key[sink_num] = key
             self._commands.extend([NT_CMD.SINK_KEY | (sink_num << 8), key])
 
+    def echo_key(self, sink_num, key):
+        """Echo packets arriving at a sink back to their source using the top
+        24-bits of the supplied key."""
+        assert not self._exited
+        assert sink_num < self._num_sinks
+
+        # Only output if changed
+        key &= ~0xFF
+        if self._echo_key[sink_num] != key:
+            self._echo_key[sink_num] = key
+            self._commands.extend([NT_CMD.ECHO_KEY | (sink_num << 8), key])
+
+    def reply_key(self, reply_num, key, source_num):
+        """Set the top 24-bits of the key of a reply and the source whose
+        packets it carries back."""
+        assert not self._exited
+        assert reply_num < len(self._reply_key)
+        assert source_num < self._num_sources
+
+        # Only output if changed
+        key &= ~0xFF
+        if self._reply_key[reply_num] != (key, source_num):
+            self._reply_key[reply_num] = (key, source_num)
+            self._commands.extend([NT_CMD.REPLY_KEY, reply_num,
+                                   key, source_num])
+
+
+def compact_tag_words(num_values):
+    """Get the number of words of width tags used when compactly recording a
+    sample of the specified number of values.
+
+    When recording compactly, each value is given a two-bit width tag (0: zero,
+    1: one byte, 2: two bytes, 3: four bytes) and non-zero values are stored
+    using only as many bytes as their tag indicates.
+    """
+    return (num_values + 15) // 16
+
+
+AGGREGATE_WORDS = 6
+"""The number of words recorded for each value when aggregating results: the
+64-bit sum, the 32-bit minimum and maximum and the 64-bit sum of squares (with
+the least-significant word of each 64-bit value first).
+"""
+
+
+def max_num_results(num_sources, num_sinks, num_latency_bins):
+    """Get the number of values the network tester application allocates
+    recording buffers for on a core with the specified number of sources,
+    sinks and latency histogram bins.
+
+    This mirrors the ``MAX_NUM_RESULTS`` macro of the application: the buffers
+    are sized for every value which could be recorded (1 permanent, 4 core, 16
+    router and 3 reinjector counters, 3 counters per source, 5 per sink and
+    every histogram bin) regardless of which values are actually recorded.
+    """
+    return (1 + 4 + 16 + 3 +
+            (3 * num_sources) +
+            (5 * num_sinks) +
+            (num_latency_bins * (num_sources + num_sinks)))
+
+
+SOURCE_WORDS = 11
+"""The number of words of DTCM used by the state of each source."""
+
+SINK_WORDS = 13
+"""The number of words of DTCM used by the state of each sink."""
+
+REPLY_WORDS = 2
+"""The number of words of DTCM used by the state of each reply."""
+
 
 def wait_time_decode(encoded_wait):
     """Decode a SpiNNaker router control register wait time value."""
@@ -7,7 +7,8 @@ class Counters(IntEnum):
     """The list of recordable values.
 
     Each counter's numerical value is equal to the corresponding bit in the
-    NT_CMD_RECORD command.
+    NT_CMD_RECORD command. Bits 63:32 are set by a second NT_CMD_RECORD
+    command (see :py:meth:`.Commands.record`).
     """
     # Always-recorded values (note, these have a unique but non-maskable
     # integer value.
@@ -41,14 +42,38 @@ class Counters(IntEnum):
     blocked = 1 << 25
     retried = 1 << 26
 
+    # Source histograms (one value recorded per histogram bin)
+    round_trip = 1 << 27
+
     # Sink counters
     received = 1 << 28
 
+    # Sink histograms (one value recorded per histogram bin)
+    latency = 1 << 29
+
+    # Core counters
+    slack_min = 1 << 32
+    slack_mean = 1 << 33
+    interrupt_cycles = 1 << 34
+    generation_cycles = 1 << 35
+
+    # Sink sequence number counters
+    sequence_gaps = 1 << 48
+    missing = 1 << 49
+    duplicated = 1 << 50
+    out_of_order = 1 << 51
+
     @property
     def permanent_counter(self):
         """True if this counter is always enabled."""
         return self < 0
 
+    @property
+    def core_counter(self):
+        """True if a counter which measures the activity of the core itself
+        (rather than any particular flow)."""
+        return (1 << 32) <= self <= (1 << 39)
+
     @property
     def router_counter(self):
         """True if a router counter."""
@@ -67,4 +92,11 @@ class Counters(IntEnum):
     @property
     def sink_counter(self):
         """True if a sink counter."""
-        return (1 << 28) <= self <= (1 << 31)
+        return ((1 << 28) <= self <= (1 << 31) or
+                (1 << 48) <= self <= (1 << 63))
+
+    @property
+    def histogram_counter(self):
+        """True if this counter records a histogram (one value per bin)
+        rather than a single value."""
+        return self in (Counters.round_trip, Counters.latency)
@@ -0,0 +1,755 @@
+"""An in-process stand-in for a SpiNNaker machine.
+
+:py:class:`EmulatedMachineController` implements the parts of the
+:py:class:`rig.machine_control.MachineController` interface used by
+:py:meth:`.Experiment.run` without a machine. SDRAM allocations are held in
+memory. The command stream loaded into each core is interpreted in Python,
+and plausible result data is written back into each core's SDRAM
+allocation. This allows the whole host-side pipeline (loading, running,
+reading back and parsing results) to be profiled and benchmarked on machines
+of any size::
+
+    >>> mc = EmulatedMachineController(width=48, height=48)
+    >>> e = Experiment(mc)
+    >>> ...
+    >>> results = e.run()
+
+A fast model of the network is used by default. Every packet a source sends
+is delivered along its flow's route, without contention, and the router
+counters and timing values recorded are derived from the traffic carried.
+Alternatively the commands can be run in the discrete-event
+:py:class:`.Simulator`, which models the network in detail but is far
+slower.
+
+The time taken by each machine operation can be configured to model the
+communication costs of a real machine. Note that :py:meth:`.Experiment.run`
+still waits in real time for the duration of each group, so very short
+durations should be used when benchmarking.
+"""
+
+import os
+
+import time
+
+import random
+
+from collections import Counter
+
+from contextlib import contextmanager
+
+from six import iteritems, itervalues
+
+import numpy as np
+
+from rig.links import Links
+
+from rig.machine_control.machine_controller import \
+    SystemInfo, ChipInfo, SpiNNakerMemoryError, SpiNNakerRouterError
+
+from network_tester.errors import NT_ERR
+
+from network_tester.simulator import \
+    Simulator, decode_commands, _Core, _WORD, \
+    _LOCAL_MULTICAST, _EXTERNAL_MULTICAST, _DROPPED_MULTICAST, \
+    _CPU_FREQUENCY, _SEND_CYCLES, _RECEIVE_CYCLES
+
+
+class EmulatedMachineController(object):
+    """An emulated SpiNNaker machine which may be used in place of a
+    :py:class:`rig.machine_control.MachineController`.
+
+    Typical usage::
+
+        >>> mc = EmulatedMachineController(width=8, height=8,
+        ...                                latencies={"write": (1e-3, 1e-7)})
+        >>> e = Experiment(mc)
+        >>> ...
+        >>> results = e.run()
+        >>> mc.num_operations["write"], mc.num_units["write"]
+
+    Every machine operation is counted and may be given a latency. The
+    operations (and the units their size is given in) are:
+    ``"get_system_info"``, ``"sdram_alloc_as_filelike"`` (bytes allocated),
+    ``"write"`` and ``"read"`` (bytes of SDRAM accessed),
+    ``"load_routing_tables"`` (routing entries), ``"load_application"``
+    (cores), ``"wait_for_cores_to_reach_state"`` and ``"send_signal"``.
+
+    Attributes
+    ----------
+    num_operations : :py:class:`collections.Counter`
+        The number of times each operation has been performed.
+    num_units : :py:class:`collections.Counter`
+        The total size of each type of operation performed.
+    """
+
+    def __init__(self, width=8, height=8, system_info=None, latencies={},
+                 simulate=False, simulator_kwargs={},
+                 hop_latency=200e-9, cpu_frequency=_CPU_FREQUENCY,
+                 send_cycles=_SEND_CYCLES, receive_cycles=_RECEIVE_CYCLES,
+                 seed=None):
+        """Create a new emulated machine.
+
+        Parameters
+        ----------
+        width, height : int
+            The dimensions (in chips) of the machine to emulate when
+            system_info is not given. Every chip and link works.
+        system_info : \
+                :py:class:`rig.machine_control.machine_controller.SystemInfo`
+            The machine to emulate. The largest free SDRAM and routing table
+            blocks of each chip limit the allocations which may be made.
+        latencies : {operation: (seconds, seconds_per_unit), ...}
+            The time taken by each operation (see above): a fixed time per
+            call plus a time per unit of size. Operations not listed take no
+            time.
+        simulate : bool
+            If True, run the loaded commands in the discrete-event
+            :py:class:`.Simulator` rather than the fast model.
+        simulator_kwargs : dict
+            Additional arguments for :py:class:`.Simulator` when simulate is
+            True.
+        hop_latency : float
+            Fast model only: the time (in seconds) taken for a packet to pass
+            through each router on its route.
+        cpu_frequency : float
+            Fast model only: the CPU clock frequency in Hz.
+        send_cycles : int
+            Fast model only: the number of CPU cycles spent sending each
+            packet.
+        receive_cycles : int
+            Fast model only: the number of CPU cycles spent handling each
+            arriving packet.
+        seed : int or None
+            Seed for the random number generators of the emulated cores
+            (used until the commands set a seed). If None, a random seed is
+            used.
+        """
+        if system_info is None:
+            system_info = SystemInfo(width, height, {
+                (x, y): ChipInfo() for x in range(width)
+                for y in range(height)})
+        self._system_info = system_info
+        self._latencies = latencies
+        self._simulate = simulate
+        self._simulator_kwargs = simulator_kwargs
+        self._model_kwargs = {"hop_latency": hop_latency,
+                              "cpu_frequency": cpu_frequency,
+                              "send_cycles": send_cycles,
+                              "receive_cycles": receive_cycles}
+        self._rng = random.Random(seed)
+
+        self.num_operations = Counter()
+        self.num_units = Counter()
+
+        self._stop()
+
+    def _stop(self):
+        """Free all resources used by the running application (as the "stop"
+        signal)."""
+        # {(x, y): bytes, ...}
+        self._sdram_used = {}
+        # {(x, y, tag): bytearray, ...}
+        self._sdram_tags = {}
+        # {(x, y): [RoutingTableEntry, ...], ...}
+        self._routing_tables = {}
+        # {(x, y, p): binary, ...}
+        self._applications = {}
+        # {(x, y, p): num_barriers, ...} for network tester cores
+        self._cores_num_barriers = {}
+        self._num_barriers_released = 0
+
+    def _operation(self, operation, num_units=0):
+        """Count an operation and wait for its latency to elapse."""
+        self.num_operations[operation] += 1
+        self.num_units[operation] += num_units
+        if operation in self._latencies:
+            per_call, per_unit = self._latencies[operation]
+            delay = per_call + per_unit * num_units
+            if delay > 0.0:
+                time.sleep(delay)
+
+    def get_system_info(self, x=255, y=255):
+        """Get the :py:class:`~rig.machine_control.machine_controller.\
+SystemInfo` describing the emulated machine."""
+        self._operation("get_system_info")
+        return self._system_info
+
+    @contextmanager
+    def application(self, app_id):
+        """Context manager which frees all SDRAM, routing tables and cores
+        used by the application on exit."""
+        try:
+            yield
+        finally:
+            self._stop()
+
+    def sdram_alloc_as_filelike(self, size, tag=0, x=0, y=0, app_id=None,
+                                clear=False):
+        """Allocate a block of (zeroed) SDRAM on a chip and return a
+        file-like object with which to access it.
+
+        Raises
+        ------
+        rig.machine_control.machine_controller.SpiNNakerMemoryError
+            If the chip does not have enough free SDRAM or the tag is already
+            in use.
+        """
+        self._operation("sdram_alloc_as_filelike", size)
+
+        if tag != 0 and (x, y, tag) in self._sdram_tags:
+            raise SpiNNakerMemoryError(size, x, y, tag, True)
+
+        used = self._sdram_used.get((x, y), 0)
+        if ((x, y) not in self._system_info or
+                used + size >
+                self._system_info[(x, y)].largest_free_sdram_block):
+            raise SpiNNakerMemoryError(size, x, y, tag)
+        self._sdram_used[(x, y)] = used + size
+
+        data = bytearray(size)
+        if tag != 0:
+            self._sdram_tags[(x, y, tag)] = data
+        return _MemoryIO(self, data, 0x60000000 + used)
+
+    def load_routing_tables(self, routing_tables, app_id=None):
+        """Load routing tables into the routers of the machine.
+
+        Raises
+        ------
+        rig.machine_control.machine_controller.SpiNNakerRouterError
+            If a chip does not have enough free routing entries.
+        """
+        self._operation("load_routing_tables",
+                        sum(len(t) for t in itervalues(routing_tables)))
+
+        for (x, y), table in iteritems(routing_tables):
+            if ((x, y) not in self._system_info or
+                    len(table) >
+                    self._system_info[(x, y)].largest_free_rtr_mc_block):
+                raise SpiNNakerRouterError(len(table), x, y)
+            self._routing_tables[(x, y)] = table
+
+    def load_application(self, application_map, **kwargs):
+        """Load and start applications.
+
+        Cores loaded with the network tester application immediately run
+        the commands in the SDRAM allocation tagged with their core number.
+        Cores loaded with any other application are only recorded.
+
+        Parameters
+        ----------
+        application_map : {binary: {(x, y): set([p, ...]), ...}, ...}
+        """
+        cores = set((x, y, p)
+                    for binary, targets in iteritems(application_map)
+                    for (x, y), processors in iteritems(targets)
+                    for p in processors)
+        self._operation("load_application", len(cores))
+
+        # {(x, y, p): bytes, ...}
+        cores_commands = {}
+        for binary, targets in iteritems(application_map):
+            for (x, y), processors in iteritems(targets):
+                for p in processors:
+                    self._applications[(x, y, p)] = binary
+                    if (os.path.basename(binary) == "network_tester.aplx" and
+                            (x, y, p) in self._sdram_tags):
+                        cores_commands[(x, y, p)] = \
+                            bytes(self._sdram_tags[(x, y, p)])
+
+        if cores_commands:
+            self._run_cores(cores_commands)
+
+    def _run_cores(self, cores_commands):
+        """Run the supplied network tester command streams and write the
+        results of each core into its SDRAM allocation."""
+        if self._simulate:
+            sim = Simulator(self._system_info, self._routing_tables,
+                            cores_commands, seed=self._rng.getrandbits(32),
+                            **self._simulator_kwargs)
+            cores_result_data = sim.run()
+            cores = sim._cores
+        else:
+            emulation = _Emulation(self._system_info, self._routing_tables,
+                                   cores_commands, self._rng.getrandbits(32),
+                                   **self._model_kwargs)
+            cores_result_data = emulation.run()
+            cores = emulation.cores
+
+        for (x, y, p), result_data in iteritems(cores_result_data):
+            sdram = self._sdram_tags[(x, y, p)]
+            num_bytes = min(len(result_data), len(sdram))
+            sdram[:num_bytes] = result_data[:num_bytes]
+            self._cores_num_barriers[(x, y, p)] = cores[(x, y, p)].num_barriers
+
+    def wait_for_cores_to_reach_state(self, state, count, app_id=None,
+                                      poll_interval=0.1, timeout=None):
+        """Get the number of network tester cores in the given state.
+
+        Cores are in the "sync0" or "sync1" state while waiting at a
+        synchronisation barrier (which alternate, starting with "sync0") and
+        in the "exit" state once they have passed all of their barriers.
+        """
+        self._operation("wait_for_cores_to_reach_state")
+
+        state = getattr(state, "name", state)
+        barrier = self._num_barriers_released
+        if state == ("sync0" if barrier % 2 == 0 else "sync1"):
+            return sum(num_barriers > barrier for num_barriers
+                       in itervalues(self._cores_num_barriers))
+        elif state == "exit":
+            return sum(num_barriers <= barrier for num_barriers
+                       in itervalues(self._cores_num_barriers))
+        else:
+            return 0
+
+    def send_signal(self, signal, app_id=None):
+        """Send a signal to the application: "sync0" and "sync1" release the
+        cores waiting at a barrier and "stop" stops the application."""
+        self._operation("send_signal")
+
+        signal = getattr(signal, "name", signal)
+        if signal in ("sync0", "sync1"):
+            self._num_barriers_released += 1
+        elif signal == "stop":
+            self._stop()
+
+
+class _MemoryIO(object):
+    """A file-like view of an emulated SDRAM allocation (as
+    :py:class:`rig.machine_control.machine_controller.MemoryIO`)."""
+
+    def __init__(self, mc, data, address):
+        self._mc = mc
+        self._data = data
+        self._offset = 0
+        self.address = address
+
+    def read(self, n_bytes=-1):
+        remaining = len(self._data) - self._offset
+        if n_bytes < 0 or n_bytes > remaining:
+            n_bytes = max(remaining, 0)
+        self._mc._operation("read", n_bytes)
+
+        data = bytes(self._data[self._offset:self._offset + n_bytes])
+        self._offset += n_bytes
+        return data
+
+    def write(self, data):
+        n_bytes = max(min(len(data), len(self._data) - self._offset), 0)
+        self._mc._operation("write", n_bytes)
+
+        self._data[self._offset:self._offset + n_bytes] = data[:n_bytes]
+        self._offset += n_bytes
+        return n_bytes
+
+    def tell(self):
+        return self._offset
+
+    def seek(self, n_bytes, from_what=os.SEEK_SET):
+        if from_what == os.SEEK_SET:
+            self._offset = n_bytes
+        elif from_what == os.SEEK_CUR:
+            self._offset += n_bytes
+        elif from_what == os.SEEK_END:
+            self._offset = len(self._data) + n_bytes
+        else:  # pragma: no cover
+            raise ValueError(from_what)
+
+
+class _Emulation(object):
+    """The fast model of the network used by
+    :py:class:`EmulatedMachineController`.
+
+    Each core's commands are interpreted without modelling time. Each
+    recorded run is represented by the number of packets each source sends
+    in each sample, drawn from the distribution the source's parameters
+    describe. These are delivered along the route of every source's key
+    (with echoed packets following) and the counters of every core are then
+    replayed through the network tester's own recording code.
+    """
+
+    def __init__(self, system_info, routing_tables, cores_commands, seed,
+                 hop_latency, cpu_frequency, send_cycles, receive_cycles):
+        self.system_info = system_info
+        self.cpu_frequency = cpu_frequency
+        self.hop_latency = hop_latency * 1e9  # ns
+        self.send_cycles = send_cycles
+        self.receive_cycles = receive_cycles
+
+        # {(x, y): [(key, mask, (route, ...)), ...], ...}
+        self.tables = {
+            xy: [(entry.key, entry.mask,
+                  tuple(sorted(int(r) for r in entry.route)))
+                 for entry in table]
+            for xy, table in iteritems(routing_tables)}
+
+        rng = random.Random(seed)
+        self.cores = {
+            (x, y, p): _EmulatedCore(self, _RouterState(), p,
+                                     decode_commands(commands),
+                                     rng.getrandbits(32))
+            for (x, y, p), commands in iteritems(cores_commands)}
+
+        # {(key, (x, y)): ([((x, y, p), hops), ...],
+        #                  {(x, y): [local, external, dropped], ...}), ...}
+        self.routes = {}
+
+        # {(num_steps, record_interval_steps): (sample_steps, sample_starts),
+        #  ...}
+        self.sample_cache = {}
+
+        # The router counter values accumulated for each chip in each
+        # recorded run: {((x, y), run_num): np.array(16, num_samples), ...}
+        self.router_counters = {}
+
+    def run(self):
+        """Run the emulation, returning the result data of every core (as
+        :py:meth:`.Simulator.run`)."""
+        for core in itervalues(self.cores):
+            for _ in core.program:
+                pass
+            core.exited = True
+
+        # Deliver the packets sent by every source and then any packets
+        # echoed back by their sinks.
+        echoes = []
+        for (x, y, p), core in iteritems(self.cores):
+            for run_num, run in enumerate(core.runs):
+                for key, payload, sent in run.sources:
+                    for sink_xy, sink_core, hops in self.transmit(
+                            key, (x, y), run_num, sent):
+                        echo = sink_core.receive(run_num, key, payload, sent,
+                                                 hops)
+                        if echo is not None:
+                            echoes.append((sink_xy, ) + echo)
+        for xy, echo_key, run_num, sent, hops in echoes:
+            for _, source_core, reply_hops in self.transmit(
+                    echo_key, xy, run_num, sent):
+                source_core.receive(run_num, echo_key, True, sent,
+                                    hops + reply_hops)
+
+        for (x, y, p), core in iteritems(self.cores):
+            core.replay([self.router_counters.get(((x, y), run_num))
+                         for run_num in range(len(core.runs))])
+
+        return {xyp: core.result_data()
+                for xyp, core in iteritems(self.cores)}
+
+    def transmit(self, key, xy, run_num, sent):
+        """Send packets with the given key from a chip, accumulating the
+        router counters of every chip they pass through.
+
+        Parameters
+        ----------
+        sent : :py:class:`numpy.ndarray`
+            The number of packets sent in each sample of the run.
+
+        Returns
+        -------
+        [((x, y), :py:class:`_EmulatedCore`, hops), ...]
+            The cores the packets are delivered to, the chip they are on and
+            the number of links traversed to reach them.
+        """
+        destinations, chips = self.route(key, xy)
+        for chip, (local, external, dropped) in iteritems(chips):
+            counters = self.router_counters.get((chip, run_num))
+            if counters is None:
+                counters = np.zeros((16, len(sent)), dtype=np.int64)
+                self.router_counters[(chip, run_num)] = counters
+            elif counters.shape[1] != len(sent):
+                continue
+            for counter, count in ((_LOCAL_MULTICAST, local),
+                                   (_EXTERNAL_MULTICAST, external),
+                                   (_DROPPED_MULTICAST, dropped)):
+                if count:
+                    counters[counter] += sent * count
+
+        return [(xyp[:2], self.cores[xyp], hops)
+                for xyp, hops in destinations if xyp in self.cores]
+
+    def route(self, key, xy):
+        """Trace the route taken by packets with the given key sent from a
+        chip.
+
+        Returns
+        -------
+        destinations : [((x, y, p), hops), ...]
+            The cores the packets are delivered to and the number of links
+            traversed to reach them.
+        chips : {(x, y): [local, external, dropped], ...}
+            For each chip passed through, the number of times each packet
+            arrives from a core, arrives from a link and is dropped.
+        """
+        try:
+            return self.routes[(key, xy)]
+        except KeyError:
+            pass
+
+        destinations = []
+        chips = {}
+        visited = set()
+        # [((x, y), input link or None, hops), ...]
+        to_visit = [(xy, None, 0)]
+        while to_visit:
+            chip, link, hops = to_visit.pop()
+            if (chip, link) in visited:
+                continue
+            visited.add((chip, link))
+
+            counts = chips.setdefault(chip, [0, 0, 0])
+            counts[0 if link is None else 1] += 1
+
+            for entry_key, mask, routes in self.tables.get(chip, []):
+                if key & mask == entry_key:
+                    break
+            else:
+                if link is None:
+                    counts[2] += 1
+                    continue
+                else:
+                    # Default route
+                    routes = ((link + 3) % 6, )
+
+            dropped = False
+            for route in routes:
+                if route >= 6:
+                    destinations.append((chip + (route - 6, ), hops))
+                    continue
+
+                neighbour = self.neighbour(chip, Links(route))
+                if neighbour is None:
+                    dropped = True
+                else:
+                    to_visit.append((neighbour, (route + 3) % 6, hops + 1))
+            counts[2] += dropped
+
+        self.routes[(key, xy)] = (destinations, chips)
+        return destinations, chips
+
+    def samples(self, num_steps, record_interval_steps):
+        """Get the number of timesteps in each sample of a recorded run and
+        the timestep each starts at (as arrays)."""
+        try:
+            return self.sample_cache[(num_steps, record_interval_steps)]
+        except KeyError:
+            pass
+
+        if record_interval_steps > 0:
+            sample_steps = np.array(
+                [record_interval_steps] * (num_steps // record_interval_steps),
+                dtype=np.int64)
+        else:
+            sample_steps = np.array([num_steps], dtype=np.int64)
+        sample_starts = np.cumsum(sample_steps) - sample_steps
+
+        self.sample_cache[(num_steps, record_interval_steps)] = \
+            (sample_steps, sample_starts)
+        return sample_steps, sample_starts
+
+    def neighbour(self, xy, link):
+        """Get the chip at the other end of a working link (or None)."""
+        if xy not in self.system_info:
+            return None
+        if link not in self.system_info[xy].working_links:
+            return None
+        dx, dy = link.to_vector()
+        neighbour = ((xy[0] + dx) % self.system_info.width,
+                     (xy[1] + dy) % self.system_info.height)
+        return neighbour if neighbour in self.system_info else None
+
+
+class _RouterState(object):
+    """The router counters seen by a core in the fast model."""
+
+    def __init__(self):
+        self.counters = [0] * 16
+        self.reinjector_counters = [0] * 3
+        self.reinject = False
+
+    def set_router_timeout(self, control):
+        pass
+
+    def restore_router_timeout(self):
+        pass
+
+
+class _Run(object):
+    """The traffic of a recorded run of a core in the fast model."""
+
+    def __init__(self, core, sample_steps, sources):
+        self.to_record = core.to_record
+        self.timestep = core.timestep
+        # The number of timesteps in each sample
+        self.sample_steps = sample_steps
+        # [(key, payload, np.array(num_samples)), ...]
+        self.sources = sources
+
+        num_samples = len(sample_steps)
+        num_bins = core.num_latency_bins
+        self.received = np.zeros((len(core.sinks), num_samples),
+                                 dtype=np.int64)
+        self.latency = np.zeros((len(core.sinks) * num_bins, num_samples),
+                                dtype=np.int64)
+        self.round_trip = np.zeros((len(core.sources) * num_bins,
+                                    num_samples), dtype=np.int64)
+        # The number of packets handled by the core in each sample
+        self.handled = np.zeros(num_samples, dtype=np.int64)
+
+
+class _EmulatedCore(_Core):
+    """A core in the fast model.
+
+    Runs are not executed step-by-step: instead the number of packets sent
+    in each sample is drawn and recorded in :py:attr:`runs` to be delivered
+    and replayed by :py:class:`_Emulation`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_EmulatedCore, self).__init__(*args, **kwargs)
+        # [_Run, ...]
+        self.runs = []
+        # Created (from the core's random number generator) when first used
+        self.np_rng = None
+
+    def run(self, num_steps, enable_recording):
+        if not enable_recording:
+            for source in self.sources:
+                if source.burst_period != 0:
+                    source.burst_phase = ((source.burst_phase + num_steps) %
+                                          source.burst_period)
+            return ()
+
+        sample_steps, sample_starts = self.sim.samples(
+            num_steps, self.record_interval_steps)
+
+        sources = []
+        for source in self.sources:
+            # The number of timesteps in each sample the source is active
+            if source.burst_period != 0:
+                active = (
+                    _num_bursting_steps(source, sample_starts + sample_steps) -
+                    _num_bursting_steps(source, sample_starts))
+                source.burst_phase = ((source.burst_phase + num_steps) %
+                                      source.burst_period)
+            else:
+                active = sample_steps
+
+            attempts = active * source.num_packets
+            if source.probability == _WORD:
+                sent = attempts
+            elif source.probability == 0:
+                sent = np.zeros_like(attempts)
+            else:
+                if self.np_rng is None:
+                    self.np_rng = np.random.RandomState(
+                        self.rng.getrandbits(32))
+                sent = self.np_rng.binomial(
+                    attempts, source.probability / float(1 << 32)
+                ).astype(np.int64)
+            sources.append((source.key, source.payload, sent))
+
+        self.runs.append(_Run(self, sample_steps, sources))
+        return ()
+
+    def receive(self, run_num, key, payload, arrived, hops):
+        """Receive the packets sent by a source in a recorded run.
+
+        Parameters
+        ----------
+        arrived : :py:class:`numpy.ndarray`
+            The number of packets arriving in each sample.
+        hops : int
+            The number of links traversed by the packets.
+
+        Returns
+        -------
+        (echo_key, run_num, arrived, hops) or None
+            If the packets are echoed back, the packets to send.
+        """
+        if run_num >= len(self.runs):
+            return None
+        run = self.runs[run_num]
+        if run.handled.shape != arrived.shape:
+            return None
+
+        latency_bin = self.latency_bin((hops + 1) * self.sim.hop_latency)
+        sink_num = self.find_sink(key)
+        source_num = self.find_reply(key)
+        if sink_num is not None and sink_num < len(run.received):
+            run.received[sink_num] += arrived
+            run.handled += arrived
+            if payload:
+                if self.num_latency_bins:
+                    run.latency[(sink_num * self.num_latency_bins) +
+                                latency_bin] += arrived
+                if self.sinks[sink_num].echo:
+                    return (self.sinks[sink_num].echo_key, run_num,
+                            arrived, hops)
+        elif payload and source_num is not None:
+            run.handled += arrived
+            if self.num_latency_bins and source_num < len(self.sources):
+                run.round_trip[(source_num * self.num_latency_bins) +
+                               latency_bin] += arrived
+        elif arrived.any():
+            self.error |= NT_ERR.UNEXPECTED_PACKET
+        return None
+
+    def replay(self, runs_router_counters):
+        """Record the counter values of every sample of every recorded run.
+
+        Parameters
+        ----------
+        runs_router_counters : [np.array(16, num_samples) or None, ...]
+            The router counters of the core's chip in each recorded run.
+        """
+        sim = self.sim
+        for run, router_counters in zip(self.runs, runs_router_counters):
+            self.to_record = run.to_record
+            timestep_ticks = self.ticks(run.timestep)
+
+            self.record(True, 0)
+            for sample, steps in enumerate(run.sample_steps):
+                num_sent = 0
+                for source, (_, _, sent) in zip(self.sources, run.sources):
+                    source.sent += int(sent[sample])
+                    num_sent += int(sent[sample])
+                for sink, received in zip(self.sinks, run.received):
+                    sink.arrived += int(received[sample])
+                for num, value in enumerate(run.latency[:, sample]):
+                    self.latency_histograms[num] += int(value)
+                for num, value in enumerate(run.round_trip[:, sample]):
+                    self.round_trip_histograms[num] += int(value)
+                if router_counters is not None:
+                    for num, value in enumerate(router_counters[:, sample]):
+                        self.router.counters[num] += int(value)
+
+                generation_cycles = num_sent * sim.send_cycles
+                interrupt_cycles = (int(run.handled[sample]) *
+                                    sim.receive_cycles)
+                self.generation_ticks += generation_cycles
+                self.interrupt_ticks += interrupt_cycles
+
+                # Time not spent sending or receiving packets is slack
+                if steps:
+                    slack = max(timestep_ticks -
+                                ((generation_cycles + interrupt_cycles) //
+                                 int(steps)), 0)
+                    self.slack_min = min(self.slack_min, slack)
+                    self.slack_total += slack * int(steps)
+                    self.slack_num_steps += int(steps)
+
+                self.record(False, 0)
+
+            if self.aggregate_recording:
+                self.write_aggregates()
+
+
+def _num_bursting_steps(source, num_steps):
+    """Count the timesteps for which a bursting source is active during the
+    first num_steps timesteps of a run (an array)."""
+    steps = num_steps + (source.burst_phase % source.burst_period)
+    duty = min(source.burst_duty, source.burst_period)
+    return (((steps // source.burst_period) * duty) +
+            np.minimum(steps % source.burst_period, duty) -
+            min(source.burst_phase % source.burst_period, duty))
@@ -61,10 +61,13 @@ class NetworkTesterError(Exception):
     results : :py:class:`network_tester.results.Results`
         The experimental results recorded. These results should be treated with
         caution.
+    profile : :py:class:`network_tester.run_profile.RunProfile` or None
+        The time taken by each phase of the experimental run.
     """
 
     def __init__(self, results):
         self.results = results
+        self.profile = getattr(results, "profile", None)
 
         errors = self.results.errors
 
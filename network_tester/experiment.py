@@ -2,16 +2,24 @@
 
 import pkg_resources
 
+import os
+
 import time
 
 import logging
 
+import math
+
+import struct
+
 import warnings
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict, namedtuple
 
 from six import iteritems, itervalues, integer_types
 
+import numpy as np
+
 from rig.place_and_route import Cores
 
 from rig.machine_control import MachineController
@@ -31,14 +39,24 @@ from rig.routing_table import \
 from rig.place_and_route.constraints import \
     LocationConstraint
 
-from network_tester.commands import Commands
+from network_tester.commands import \
+    Commands, compact_tag_words, max_num_results, AGGREGATE_WORDS, \
+    SOURCE_WORDS, SINK_WORDS, REPLY_WORDS
 
-from network_tester.results import Results
+from network_tester.results import \
+    Results, link_incidence, _sum_columns, _object_array
 
 from network_tester.counters import Counters
 
 from network_tester.errors import NetworkTesterError
 
+from network_tester.run_profile import \
+    RunProfile, Phase, CostModel, scp_operations
+
+from network_tester.simulator import \
+    _LINK_BANDWIDTH, _ROUTER_FREQUENCY, _CPU_FREQUENCY, \
+    _SEND_CYCLES, _RECEIVE_CYCLES, _PACKET_BITS, _PAYLOAD_PACKET_BITS
+
 
 """
 This logger is used to report the progress of the Experiment.
@@ -46,6 +64,43 @@ This logger is used to report the progress of the Experiment.
 logger = logging.getLogger(__name__)
 
 
+LoadPrediction = namedtuple("LoadPrediction", "links routers cores")
+"""The loads predicted by :py:meth:`Experiment.predict_load`."""
+
+
+DurationPrediction = namedtuple("DurationPrediction",
+                                "load run readback total profile")
+"""The wall-clock times predicted by :py:meth:`Experiment.predict_duration`.
+"""
+
+
+_Load = namedtuple("_Load",
+                   "nt_cores routing_tables "
+                   "nt_application_map reinjector_application_map "
+                   "cores_records partitions")
+"""For internal use. The data loaded onto the machine by
+:py:meth:`Experiment.run` (see :py:meth:`Experiment._prepare_load`)."""
+
+
+_Partition = namedtuple("_Partition",
+                        "groups cores_commands "
+                        "cores_tag_size cores_result_size cores_dtcm_size")
+"""For internal use. The groups run by one machine load of an experiment and
+the commands, result sizes and estimated DTCM use of every core (see
+:py:meth:`Experiment._build_partition`)."""
+
+
+# The number of bytes used to describe each routing table entry when loading
+# routing tables.
+_ROUTING_ENTRY_BYTES = 16
+
+
+# The amount of DTCM (in bytes) available to each core for its commands and
+# the buffers allocated for every source, sink and recorded value. DTCM is 64
+# KB but is shared with the application's stack and static data.
+_DTCM_HEAP_SIZE = 48 * 1024
+
+
 class Experiment(object):
     """Defines a network experiment to be run on a SpiNNaker machine.
 
@@ -120,6 +175,12 @@ class Experiment(object):
         # is preserved in result listings)
         self._flows = []
 
+        # The flows which carry packets echoed back from each sink of each
+        # echo flow to that flow's source. Created immediately before
+        # placement.
+        # {(flow, sink_core): _ReplyFlow, ...}
+        self._reply_flows = OrderedDict()
+
         # A set of cores added (when required) immediately before placement for
         # the purposes of packet reinjection, one per core. These cores are
         # represented by a _ReinjectionCore.
@@ -169,6 +230,23 @@ class Experiment(object):
             if not counter.permanent_counter:
                 self._values["record_{}".format(counter.name)] = False
 
+        # The shape of recorded histograms is also global-only since it
+        # determines the layout of the recorded results.
+        self._values["latency_bins"] = 16
+        self._values["latency_bin_width"] = 1e-6
+
+        # The encoding used for recorded results is also global-only.
+        self._values["compact_recording"] = False
+        self._values["aggregate_recording"] = False
+
+    def __getstate__(self):
+        """Experiments are pickled (e.g. as part of a saved
+        :py:class:`Results`) without their machine controller. An unpickled
+        experiment may be inspected but not run."""
+        state = self.__dict__.copy()
+        state["_mc"] = None
+        return state
+
     def new_core(self, chip_x=None, chip_y=None, name=None):
         """Create a new :py:class:`Core`.
 
@@ -240,7 +318,7 @@ class Experiment(object):
             (0, 2, 0)
         )
 
-    def new_flow(self, source, sinks, weight=1.0, name=None):
+    def new_flow(self, source, sinks, weight=1.0, name=None, echo=False):
         """Create a new flow.
 
         A flow of SpiNNaker packets from one source core to many sink cores.
@@ -285,6 +363,14 @@ class Experiment(object):
             *Optional.* A name for the flow. If not specified the flow will be
             given a number as its name. This name will be used in results
             tables.
+        echo : bool
+            *Optional.* If True, every sink of this flow immediately sends each
+            packet it receives back to the flow's source which can then record
+            the round-trip time of each packet (see
+            :py:attr:`~Experiment.record_round_trip`). The packets sent back
+            to the source are routed in the same way as any other flow and
+            share the network with the experiment's traffic. Packets in echo
+            flows always carry a payload.
 
         Returns
         -------
@@ -293,7 +379,7 @@ class Experiment(object):
         """
         if name is None:
             name = len(self._flows)
-        f = Flow(self, name, source, sinks, weight)
+        f = Flow(self, name, source, sinks, weight, echo=echo)
 
         self._flows.append(f)
         return f
@@ -353,7 +439,8 @@ class Experiment(object):
             place=place, place_kwargs={},
             allocate=allocate, allocate_kwargs={},
             route=route, route_kwargs={},
-            before_load=None, before_group=None, before_read_results=None):
+            before_load=None, before_group=None, before_read_results=None,
+            results_file=None):
         """Run the experiment on SpiNNaker and return the results.
 
         Before the experiment is started, any cores whose location was not
@@ -371,6 +458,14 @@ class Experiment(object):
         machine and each experimental group is executed in turn. Results are
         recorded by the machine and are read back at the end of the experiment.
 
+        Before anything is loaded, the SDRAM required on each chip (to hold
+        the commands and recorded results of every core on the chip) and the
+        size of the commands of each core (which must fit in DTCM) are
+        checked. If the experiment does not fit within the resources of the
+        machine, the groups are automatically split between several machine
+        loads, each running a consecutive run of groups, and the results of
+        every load are combined into a single :py:class:`Results`.
+
         .. warning::
             Though a global synchronisation barrier is used between the
             execution of each group, the timers in each core may drift out of
@@ -446,7 +541,19 @@ class Experiment(object):
             have run and before the results are read back from the machine. It
             is called with the :py:class:`Experiment` object as its argument.
             The function may block to postpone the reading of results as
-            required.
+            required. If the experiment is split across several machine loads,
+            this function is called before the results of each load are read
+            back.
+        results_file : str or None
+            If not None, results are processed out-of-core: the recorded data
+            is streamed into a file with this name as it is read back from the
+            machine rather than being held in memory and the
+            :py:class:`Results` returned work on memory-mapped views of this
+            file. An additional file, named ``results_file + ".samples.npy"``,
+            is created to hold the recorded values in the form used to produce
+            result tables. This allows recordings larger than the available
+            memory to be analysed. Both files must be kept for as long as the
+            returned :py:class:`Results` are in use.
 
         Returns
         -------
@@ -467,35 +574,445 @@ class Experiment(object):
             Any results recorded during the run will be included in the
             ``results`` attribute of the exception. See the :py:class:`Results`
             object for details.
+        ValueError
+            If both :py:attr:`compact_recording` and
+            :py:attr:`aggregate_recording` are enabled or if the experiment
+            does not fit on the machine even when each group is run in a
+            separate machine load.
         """
+        if (self._get_option_value("compact_recording") and
+                self._get_option_value("aggregate_recording")):
+            raise ValueError("compact_recording and aggregate_recording "
+                             "cannot be used together.")
+
         # Sensible default: Create a single experimental group if none defined.
         if create_group_if_none_exist and len(self._groups) == 0:
             self.new_group()
 
+        profile = RunProfile()
+
         # Place and route the cores, adding router recording cores and packet
         # reinjection cores.
         self._place_and_route(
             constraints,
             place, place_kwargs,
             allocate, allocate_kwargs,
-            route, route_kwargs
+            route, route_kwargs,
+            profile
         )
 
+        load = self._prepare_load(profile)
+        if len(load.partitions) > 1:
+            logger.info(
+                "Splitting the experiment into {} machine loads...".format(
+                    len(load.partitions)))
+
+        # Call the user-defined pre-load callback...
+        if before_load is not None:
+            before_load(self)
+
+        # When the experiment is split across several machine loads, results
+        # streamed to a file are first written to a temporary file and then
+        # stitched together.
+        stream_file = results_file
+        if results_file is not None and len(load.partitions) > 1:
+            stream_file = results_file + ".partial"
+
+        # The result data (or extents in the stream file) read back from
+        # every core during each machine load.
+        # {core: [data_or_extent, ...], ...}
+        cores_result_chunks = {core: [] for core in load.nt_cores}
+
+        # Actually load and run the experiment on the machine.
+        if stream_file is not None:
+            f = open(stream_file, "wb")
+        try:
+            first_group_num = 0
+            for partition in load.partitions:
+                partition_result_chunks = self._run_partition(
+                    app_id, load, partition, first_group_num, profile,
+                    before_group, before_read_results,
+                    f if stream_file is not None else None)
+                for core, chunk in iteritems(partition_result_chunks):
+                    cores_result_chunks[core].append(chunk)
+                first_group_num += len(partition.groups)
+        finally:
+            if stream_file is not None:
+                f.close()
+
+        # Process read results
+        with profile.phase("results"):
+            tag_sizes = None
+            if self._get_option_value("compact_recording"):
+                tag_sizes = {
+                    core: [partition.cores_tag_size[core]
+                           for partition in load.partitions]
+                    for core in load.nt_cores}
+
+            samples_file = None
+            if results_file is None:
+                cores_result_data = {}
+                for core, chunks in iteritems(cores_result_chunks):
+                    parts = _stitch_result_data(
+                        chunks, tag_sizes and tag_sizes[core])
+                    cores_result_data[core] = (
+                        parts[0] if len(parts) == 1 else b"".join(parts))
+            else:
+                if stream_file != results_file:
+                    cores_result_extents = _stitch_results_file(
+                        stream_file, results_file, cores_result_chunks,
+                        tag_sizes)
+                    os.remove(stream_file)
+                else:
+                    cores_result_extents = {
+                        core: chunks[0]
+                        for core, chunks in iteritems(cores_result_chunks)}
+                cores_result_data = _map_results_file(results_file,
+                                                      cores_result_extents)
+                samples_file = results_file + ".samples.npy"
+            results = Results(self, self._cores, self._flows,
+                              load.cores_records,
+                              self._router_recording_cores,
+                              self._placements, self._routes,
+                              cores_result_data, self._groups, samples_file,
+                              profile)
+        if any(not e.is_deadline if ignore_deadline_errors else True
+               for e in results.errors):
+            logger.error(
+                "Experiment completed with errors: {}".format(results.errors))
+            raise NetworkTesterError(results)
+        else:
+            logger.info("Experiment completed successfully")
+            return results
+
+    def predict_load(self, **kwargs):
+        """Predict the load the experiment will place on the machine without
+        running it.
+
+        The expected traffic of every flow in each group is computed from
+        the :py:attr:`~Flow.probability`,
+        :py:attr:`~Flow.packets_per_timestep`, burst parameters (e.g.
+        :py:attr:`~Flow.burst_duty`) and :py:attr:`timestep` options and
+        attributed to the links and routers along the flow's route. This may
+        be used to identify groups which will saturate links or cores before
+        using any machine time. Packets are assumed never to be dropped or
+        blocked and echoed packets (see :py:meth:`.new_flow`) are included.
+
+        Every table includes a 'utilisation' field giving the fraction of the
+        capacity of each link, router or core the expected traffic requires
+        (using the same link bandwidth, router clock and packet handling
+        costs as :py:class:`.Simulator`). Groups with any utilisation above
+        1.0 are overloaded and can be expected to drop packets or miss
+        timesteps, e.g.::
+
+            >>> links, routers, cores = e.predict_load()
+            >>> overloaded = set(links[links["utilisation"] > 1.0]["group"])
+
+        If the experiment has not already been placed and routed (by
+        :py:meth:`.run` or a previous call to this method), this is done
+        first and requires a connection to the machine. Keyword arguments
+        (e.g. ``place`` and ``route_kwargs``) are passed on to the
+        place-and-route process as in :py:meth:`.run`.
+
+        Returns
+        -------
+        (links, routers, cores)
+            A named tuple of Numpy structured arrays, each with a 'group'
+            field giving the :py:class:`Group` (or None if no groups are
+            defined) of each row:
+
+            links
+                One row per group for every link used by any flow with fields
+                'x', 'y' and 'link' (a :py:class:`rig.links.Links`)
+                identifying the link, 'packets_per_second', the expected
+                number of packets to pass over the link each second, and
+                'utilisation', the fraction of the link's bandwidth they
+                occupy.
+            routers
+                One row per group for every chip any flow is routed through
+                with fields 'x', 'y', 'packets_per_second', the expected
+                number of packets to be routed by the chip's router each
+                second, and 'utilisation', the fraction of the router's
+                clock cycles spent admitting them.
+            cores
+                One row per group for every core with fields 'core',
+                'packets_per_timestep', the expected number of packets to be
+                generated by the core each timestep, 'sent' and 'received',
+                the expected number of packets (including echoed packets) to
+                be sent and received by the core each second, and
+                'utilisation', the fraction of the core's time spent sending
+                and receiving them.
+        """
+        if self._routes is None:
+            self._place_and_route(**kwargs)
+
+        groups = self._groups or [None]
+        reply_flows = list(itervalues(self._reply_flows))
+        flows = self._flows + reply_flows
+
+        # The expected number of packets generated each timestep by each flow
+        # (the first axis) during each group (the second axis).
+        per_timestep = np.zeros((len(self._flows), len(groups)))
+        timesteps = np.zeros(len(groups))
+
+        # The number of bits each packet of each flow occupies on a link.
+        # Echo flows and their echoed packets always carry a payload.
+        packet_bits = np.full((len(flows), len(groups)),
+                              float(_PAYLOAD_PACKET_BITS))
+
+        for group_num, group in enumerate(groups):
+            timesteps[group_num] = self._get_option_value("timestep", group)
+            for flow_num, flow in enumerate(self._flows):
+                if not (flow.echo or
+                        self._get_option_value("use_payload", group, flow)):
+                    packet_bits[flow_num, group_num] = _PACKET_BITS
+                burst_period = self._get_option_value(
+                    "burst_period", group, flow)
+                burst_duty = self._get_option_value("burst_duty", group, flow)
+                duty = (min(max(burst_duty, 0.0), 1.0)
+                        if burst_period != 0.0 else 1.0)
+                per_timestep[flow_num, group_num] = (
+                    self._get_option_value("probability", group, flow) *
+                    self._get_option_value("packets_per_timestep",
+                                           group, flow) *
+                    duty)
+
+        # Every sink of an echo flow replies to every packet it receives
+        flow_nums = {flow: num for num, flow in enumerate(self._flows)}
+        per_second = (per_timestep / timesteps)
+        per_second = np.vstack(
+            [per_second] +
+            [per_second[flow_nums[f.flow]][np.newaxis] for f in reply_flows])
+
+        # Attribute the traffic of each flow to each link and router on its
+        # route.
+        links, entry_flows, entry_links = link_incidence(flows, self._routes)
+        chip_entries = [(flow_num, xy)
+                        for flow_num, flow in enumerate(flows)
+                        if flow in self._routes
+                        for _, xy, _ in self._routes[flow].traverse()]
+        chips = sorted(set(xy for flow_num, xy in chip_entries))
+        chip_nums = {xy: num for num, xy in enumerate(chips)}
+        link_loads = _sum_columns(per_second[entry_flows].T, entry_links,
+                                  len(links))
+        link_bits = _sum_columns((per_second * packet_bits)[entry_flows].T,
+                                 entry_links, len(links))
+        router_loads = _sum_columns(
+            per_second[[flow_num for flow_num, xy in chip_entries]].T,
+            np.array([chip_nums[xy] for flow_num, xy in chip_entries],
+                     dtype=int),
+            len(chips))
+
+        # Sum the traffic sent and received by each core
+        core_nums = {core: num for num, core in enumerate(self._cores)}
+        sources = np.array([core_nums[f.source] for f in flows], dtype=int)
+        sink_flows = [flow_num for flow_num, flow in enumerate(flows)
+                      for sink in flow.sinks]
+        sink_cores = [core_nums[sink] for flow in flows
+                      for sink in flow.sinks]
+        core_per_timestep = _sum_columns(
+            per_timestep.T, sources[:len(self._flows)], len(self._cores))
+        core_sent = _sum_columns(per_second.T, sources, len(self._cores))
+        core_received = _sum_columns(
+            per_second[sink_flows].T,
+            np.array(sink_cores, dtype=int), len(self._cores))
+
+        link_table = np.zeros(len(groups) * len(links), dtype=[
+            ("group", object), ("x", np.uint), ("y", np.uint),
+            ("link", object), ("packets_per_second", np.double),
+            ("utilisation", np.double)])
+        link_table["group"] = np.repeat(_object_array(groups), len(links))
+        link_table["x"] = np.tile([x for (x, y), link in links], len(groups))
+        link_table["y"] = np.tile([y for (x, y), link in links], len(groups))
+        link_table["link"] = np.tile(_object_array(
+            [link for xy, link in links]), len(groups))
+        link_table["packets_per_second"] = link_loads.ravel()
+        link_table["utilisation"] = link_bits.ravel() / _LINK_BANDWIDTH
+
+        router_table = np.zeros(len(groups) * len(chips), dtype=[
+            ("group", object), ("x", np.uint), ("y", np.uint),
+            ("packets_per_second", np.double), ("utilisation", np.double)])
+        router_table["group"] = np.repeat(_object_array(groups), len(chips))
+        router_table["x"] = np.tile([x for x, y in chips], len(groups))
+        router_table["y"] = np.tile([y for x, y in chips], len(groups))
+        router_table["packets_per_second"] = router_loads.ravel()
+        router_table["utilisation"] = router_loads.ravel() / _ROUTER_FREQUENCY
+
+        core_table = np.zeros(len(groups) * len(self._cores), dtype=[
+            ("group", object), ("core", object),
+            ("packets_per_timestep", np.double),
+            ("sent", np.double), ("received", np.double),
+            ("utilisation", np.double)])
+        core_table["group"] = np.repeat(_object_array(groups),
+                                        len(self._cores))
+        core_table["core"] = np.tile(_object_array(self._cores),
+                                     len(groups))
+        core_table["packets_per_timestep"] = core_per_timestep.ravel()
+        core_table["sent"] = core_sent.ravel()
+        core_table["received"] = core_received.ravel()
+        core_table["utilisation"] = (
+            (core_sent.ravel() * _SEND_CYCLES) +
+            (core_received.ravel() * _RECEIVE_CYCLES)) / _CPU_FREQUENCY
+
+        return LoadPrediction(link_table, router_table, core_table)
+
+    def predict_duration(self, cost_model=None, slot=None, **kwargs):
+        """Predict the wall-clock time :py:meth:`.run` will take without
+        running the experiment.
+
+        As well as the time each group runs for (i.e. its
+        :py:attr:`~Experiment.warmup`, :py:attr:`~Experiment.duration`,
+        :py:attr:`~Experiment.cooldown` and :py:attr:`~Experiment.flush_time`),
+        the time taken by each phase of the run (see :py:class:`.RunProfile`)
+        is predicted from the size of the commands, routing tables,
+        applications and results loaded and read back, and the number of
+        cores, chips and groups, using the costs given by a
+        :py:class:`.CostModel`. Experiments which must be split across several
+        machine loads (see :py:meth:`.run`) include the time taken to load
+        and read back every load. When compact recording is used, the time
+        taken to read back results is an upper bound since less data may be
+        recorded.
+
+        If the experiment has not already been placed and routed, this is
+        done first, as in :py:meth:`.predict_load`, and keyword arguments are
+        passed on to the place-and-route process.
+
+        Parameters
+        ----------
+        cost_model : :py:class:`.CostModel` or None
+            The cost of each phase. Models calibrated (see
+            :py:meth:`.CostModel.calibrate`) using the profiles of previous
+            runs on the same machine give the best predictions. If None, the
+            default costs are used.
+        slot : float or None
+            If given, the (wall-clock) time (in seconds) available to run the
+            experiment. A :py:exc:`RuntimeWarning` is produced if the
+            experiment is predicted to take longer than this.
+
+        Returns
+        -------
+        (load, run, readback, total, profile)
+            A named tuple giving the predicted time (in seconds) taken to
+            place, route and load the experiment, to run every group, to read
+            back and process the results and in total. The profile is a
+            :py:class:`.RunProfile` containing the predicted phases of the
+            run.
+        """
+        if self._routes is None:
+            self._place_and_route(**kwargs)
+        if cost_model is None:
+            cost_model = CostModel()
+
+        load = self._prepare_load(RunProfile())
+        compact_recording = self._get_option_value("compact_recording")
+
+        # The phases of the run: [(name, group, num_bytes, num_operations,
+        # run_time), ...]
+        phases = [(name, None, 0, 0, 0.0)
+                  for name in ("placement", "allocation", "routing",
+                               "table_generation", "minimisation",
+                               "command_build")]
+        routing_table_counts = list(
+            _routing_table_load_counts(load.routing_tables))
+        application_counts = (
+            list(_application_load_counts(load.reinjector_application_map)) +
+            list(_application_load_counts(load.nt_application_map)))
+        for partition in load.partitions:
+            commands = list(itervalues(partition.cores_commands))
+            result_sizes = list(itervalues(partition.cores_result_size))
+            phases.append(("sdram_allocation", None, 0, len(load.nt_cores),
+                           0.0))
+            phases.append(("upload", None,
+                           sum(c.size for c in commands),
+                           sum(scp_operations(c.size) for c in commands),
+                           0.0))
+            for name, counts in (("routing_table_load", routing_table_counts),
+                                 ("application_load", application_counts)):
+                phases.append((name, None,
+                               sum(b for b, o in counts),
+                               sum(o for b, o in counts),
+                               0.0))
+            for group in partition.groups:
+                phases.append(("barrier", group, 0, 1, 0.0))
+                phases.append(("run", group, 0, 1, sum(
+                    self._get_option_value(option, group)
+                    for option in ("warmup", "duration", "cooldown",
+                                   "flush_time"))))
+            phases.append(("exit", None, 0, 1, 0.0))
+            phases.append(("readback", None,
+                           sum(result_sizes),
+                           sum(scp_operations(size) + int(compact_recording)
+                               for size in result_sizes),
+                           0.0))
+        phases.append(("results", None, 0, 0, 0.0))
+
+        profile = RunProfile()
+        start = 0.0
+        for name, group, num_bytes, num_operations, run_time in phases:
+            duration = run_time + cost_model.cost(name, num_bytes,
+                                                  num_operations)
+            profile.phases.append(Phase(name, group, start, duration,
+                                        num_bytes, num_operations))
+            start += duration
+
+        totals = {"load": 0.0, "run": 0.0, "readback": 0.0}
+        for phase in profile.phases:
+            if phase.name in ("barrier", "run", "exit"):
+                totals["run"] += phase.duration
+            elif phase.name in ("readback", "results"):
+                totals["readback"] += phase.duration
+            else:
+                totals["load"] += phase.duration
+        prediction = DurationPrediction(totals["load"], totals["run"],
+                                        totals["readback"], start, profile)
+
+        if slot is not None and prediction.total > slot:
+            warnings.warn(
+                "The experiment is predicted to take {:.2f} seconds ({:.2f} "
+                "loading, {:.2f} running, {:.2f} reading back results), "
+                "overrunning its {:.2f} second slot.".format(
+                    prediction.total, prediction.load, prediction.run,
+                    prediction.readback, slot),
+                RuntimeWarning)
+
+        return prediction
+
+    def _prepare_load(self, profile):
+        """For internal use. Generate the routing tables, application maps
+        and commands to be loaded onto the machine for the (placed and routed)
+        experiment along with the size of the results recorded by each core.
+
+        Parameters
+        ----------
+        profile : :py:class:`.RunProfile`
+            The time taken by routing table generation, minimisation and
+            command generation is recorded in this profile.
+
+        Returns
+        -------
+        :py:class:`_Load`
+        """
         # Get a set of all cores running the network tester binary
         nt_cores = set(self._cores).union(self._router_recording_cores)
 
-        # Assign a unique routing key to each flow
+        # Assign a unique routing key to each flow (including the flows which
+        # carry echoed packets back to their source)
         flow_keys = {flow: num << 8
-                     for num, flow in enumerate(self._flows)}
+                     for num, flow in enumerate(
+                         self._flows + list(itervalues(self._reply_flows)))}
 
         # Build routing tables from the generated routes
-        routing_tables = routing_tree_to_tables(
-            self._routes,
-            {flow: (key, 0xFFFFFF00) for flow, key in iteritems(flow_keys)})
+        with profile.phase("table_generation"):
+            routing_tables = routing_tree_to_tables(
+                self._routes,
+                {flow: (key, 0xFFFFFF00)
+                 for flow, key in iteritems(flow_keys)})
 
         # Minimise the routing tables, if required
-        target_lengths = build_routing_table_target_lengths(self.system_info)
-        routing_tables = minimise_tables(routing_tables, target_lengths)
+        with profile.phase("minimisation"):
+            target_lengths = build_routing_table_target_lengths(
+                self.system_info)
+            routing_tables = minimise_tables(routing_tables, target_lengths)
 
         network_tester_binary = pkg_resources.resource_filename(
             "network_tester", "binaries/network_tester.aplx")
@@ -510,102 +1027,313 @@ class Experiment(object):
             {core: reinjector_binary for core in self._reinjection_cores},
             self._placements, self._allocations)
 
-        # Get the set of source and sink flows for each core. Also sets an
-        # explicit ordering of the sources/sinks within each.
-        # {core: [source_or_sink, ...], ...}
-        cores_source_flows = {c: [] for c in nt_cores}
-        cores_sink_flows = {c: [] for c in nt_cores}
-        for flow in self._flows:
-            cores_source_flows[flow.source].append(flow)
-            for sink in flow.sinks:
-                cores_sink_flows[sink].append(flow)
-
-        # Sort all sink lists by key to allow binary-searching in the
-        # network_tester application
-        for sink_flows in itervalues(cores_sink_flows):
-            sink_flows.sort(key=(lambda f: flow_keys[f]))
-
-        cores_records = self._get_core_record_lookup(
-            nt_cores, cores_source_flows, cores_sink_flows)
-
-        # Fill out the set of commands for each core
-        logger.info("Generating SpiNNaker configuration data...")
+        with profile.phase("command_build"):
+            # Get the set of source and sink flows for each core. Also sets an
+            # explicit ordering of the sources/sinks within each.
+            # {core: [source_or_sink, ...], ...}
+            cores_source_flows = {c: [] for c in nt_cores}
+            cores_sink_flows = {c: [] for c in nt_cores}
+            for flow in self._flows:
+                cores_source_flows[flow.source].append(flow)
+                for sink in flow.sinks:
+                    cores_sink_flows[sink].append(flow)
+
+            # Get the set of reply flows arriving at each core.
+            # {core: [reply_flow, ...], ...}
+            cores_reply_flows = {c: [] for c in nt_cores}
+            for reply_flow in itervalues(self._reply_flows):
+                cores_reply_flows[reply_flow.flow.source].append(reply_flow)
+
+            # Sort all sink and reply lists by key to allow binary-searching in
+            # the network_tester application
+            for sink_flows in itervalues(cores_sink_flows):
+                sink_flows.sort(key=(lambda f: flow_keys[f]))
+            for reply_flows in itervalues(cores_reply_flows):
+                reply_flows.sort(key=(lambda f: flow_keys[f]))
+
+            cores_records = self._get_core_record_lookup(
+                nt_cores, cores_source_flows, cores_sink_flows)
+
+            # Fill out the set of commands for each core, splitting the
+            # groups between as few machine loads as will fit within the
+            # machine's resources.
+            logger.info("Generating SpiNNaker configuration data...")
+            partitions = self._partition_groups(
+                lambda groups: self._build_partition(
+                    groups, nt_cores, cores_source_flows, cores_sink_flows,
+                    cores_reply_flows, flow_keys, cores_records))
+
+        return _Load(nt_cores, routing_tables,
+                     nt_application_map, reinjector_application_map,
+                     cores_records, partitions)
+
+    def _build_partition(self, groups, nt_cores, cores_source_flows,
+                         cores_sink_flows, cores_reply_flows, flow_keys,
+                         cores_records):
+        """For internal use. Generate the commands loaded onto every core to
+        run the given groups in a single machine load along with the size of
+        the results recorded by each core.
+
+        Returns
+        -------
+        :py:class:`_Partition`
+        """
         cores_commands = {
             core: self._construct_core_commands(
                 core=core,
                 source_flows=cores_source_flows[core],
                 sink_flows=cores_sink_flows[core],
+                reply_flows=cores_reply_flows[core],
                 flow_keys=flow_keys,
                 records=[cntr for obj, cntr in cores_records[core]],
-                router_access_core=core in self._router_recording_cores)
+                router_access_core=core in self._router_recording_cores,
+                groups=groups)
             for core in nt_cores
         }
 
         # The data size for the results from each core
-        total_num_samples = sum(g.num_samples for g in self._groups)
-        cores_result_size = {
+        total_num_samples = sum(g.num_samples for g in groups)
+        compact_recording = self._get_option_value("compact_recording")
+        cores_tag_size = {
             core: (
-                # The error flag (one word)
-                1 +
-                # One word per recorded value per sample.
-                (total_num_samples * len(cores_records[core]))
+                # The number of data bytes recorded (one word) and the width
+                # tags for every sample.
+                1 + (total_num_samples *
+                     compact_tag_words(len(cores_records[core])))
+                if compact_recording else 0
             ) * 4
             for core in nt_cores}
+        if self._get_option_value("aggregate_recording"):
+            cores_result_size = {
+                core: (
+                    # The error flag (one word)
+                    1 +
+                    # The aggregates of every recorded value for each group
+                    (len(groups) * AGGREGATE_WORDS *
+                     len(cores_records[core]))
+                ) * 4
+                for core in nt_cores}
+        else:
+            cores_result_size = {
+                core: (
+                    # The error flag (one word)
+                    1 +
+                    # One word per recorded value per sample (at most).
+                    (total_num_samples * len(cores_records[core]))
+                ) * 4 + cores_tag_size[core]
+                for core in nt_cores}
+
+        # The DTCM used by each core (see network_tester.c): the commands are
+        # copied into DTCM alongside the state of every source, sink and
+        # reply, the latency and round-trip histograms of every sink and
+        # source and buffers for the last and current value (along with their
+        # width tags and, when aggregating, their aggregates) of every value
+        # which *could* be recorded, whether or not it is.
+        aggregate_recording = self._get_option_value("aggregate_recording")
+        cores_dtcm_size = {}
+        for core in nt_cores:
+            num_sources = len(cores_source_flows[core])
+            num_sinks = len(cores_sink_flows[core])
+            counters = set(cntr for obj, cntr in cores_records[core])
+            if Counters.latency in counters or Counters.round_trip in counters:
+                num_latency_bins = self._get_option_value("latency_bins")
+            else:
+                num_latency_bins = 0
+            num_results = max_num_results(num_sources, num_sinks,
+                                          num_latency_bins)
+            cores_dtcm_size[core] = cores_commands[core].size + 4 * (
+                (num_sources * SOURCE_WORDS) +
+                (num_sinks * SINK_WORDS) +
+                (len(cores_reply_flows[core]) * REPLY_WORDS) +
+                (num_latency_bins * (num_sources + num_sinks)) +
+                (num_results * (2 + (AGGREGATE_WORDS
+                                     if aggregate_recording else 0))) +
+                compact_tag_words(num_results))
+
+        return _Partition(groups, cores_commands,
+                          cores_tag_size, cores_result_size, cores_dtcm_size)
+
+    def _partition_groups(self, build_partition):
+        """For internal use. Split the experimental groups into as few
+        machine loads as fit within the resources of the machine.
+
+        Groups are run in order, each machine load running a consecutive run
+        of groups.
 
-        # Call the user-defined pre-load callback...
-        if before_load is not None:
-            before_load(self)
+        Parameters
+        ----------
+        build_partition : function
+            Called with a list of groups, returns the
+            :py:class:`_Partition` for a machine load running those groups.
 
-        cores_result_data = {}
+        Returns
+        -------
+        [:py:class:`_Partition`, ...]
 
-        # Actually load and run the experiment on the machine.
+        Raises
+        ------
+        ValueError
+            If the experiment does not fit on the machine even when each
+            group is run in a separate machine load.
+        """
+        groups = self._groups
+        num_loads = 1
+        while True:
+            load_size = max(1, -(-len(groups) // num_loads))
+            partitions = [build_partition(groups[i:i + load_size])
+                          for i in range(0, len(groups), load_size)]
+            if not partitions:
+                partitions = [build_partition([])]
+
+            overruns = [overrun
+                        for partition in partitions
+                        for overrun in self._get_overruns(partition)]
+            if not overruns:
+                return partitions
+            usage, description = max(overruns)
+            if load_size == 1:
+                raise ValueError(
+                    "The experiment does not fit on the machine, even when "
+                    "running one group at a time: {}.".format(description))
+
+            # Guess the number of loads required assuming the resources used
+            # are proportional to the number of groups in each load.
+            num_loads = min(len(groups),
+                            max(num_loads + 1,
+                                int(math.ceil(num_loads * usage))))
+
+    def _get_overruns(self, partition):
+        """For internal use. Find the resources of the machine a machine
+        load would overrun.
+
+        Returns
+        -------
+        [(usage, description), ...]
+            For every resource overrun, the amount of the resource required as
+            a multiple of the amount available and a human-readable
+            description.
+        """
+        overruns = []
+
+        # The commands and result buffers of each core must fit in DTCM
+        for core, size in iteritems(partition.cores_dtcm_size):
+            if size > _DTCM_HEAP_SIZE:
+                overruns.append((
+                    size / float(_DTCM_HEAP_SIZE),
+                    "{} requires an estimated {} bytes of DTCM ({} bytes of "
+                    "commands) but only {} bytes are available".format(
+                        core, size, partition.cores_commands[core].size,
+                        _DTCM_HEAP_SIZE)))
+
+        # A block of SDRAM large enough for the commands and results of each
+        # core is allocated on its chip.
+        chips_sdram = defaultdict(int)
+        for core, commands in iteritems(partition.cores_commands):
+            chips_sdram[self._placements[core]] += max(
+                commands.size, partition.cores_result_size[core])
+        for (x, y), size in sorted(iteritems(chips_sdram)):
+            available = self.system_info[(x, y)].largest_free_sdram_block
+            if size > available:
+                overruns.append((
+                    size / float(max(available, 1)),
+                    "chip ({}, {}) requires {} bytes of SDRAM but only {} "
+                    "bytes are available".format(x, y, size, available)))
+
+        return overruns
+
+    def _run_partition(self, app_id, load, partition, first_group_num,
+                       profile, before_group, before_read_results, f=None):
+        """For internal use. Load, run and read back the results of one
+        machine load of the experiment (see :py:meth:`.run`).
+
+        Parameters
+        ----------
+        app_id : int
+        load : :py:class:`_Load`
+        partition : :py:class:`_Partition`
+            The groups to run and the commands to load.
+        first_group_num : int
+            The number of the first group in the partition (used for logging).
+        profile : :py:class:`.RunProfile`
+        before_group : function or None
+        before_read_results : function or None
+            User-defined callbacks (see :py:meth:`.run`).
+        f : file or None
+            If not None, the result data is streamed into this file.
+
+        Returns
+        -------
+        {:py:class:`Core`: data or (offset, num_bytes), ...}
+            The result data read back from each core or, if streamed into a
+            file, the extent of the data in the file.
+        """
+        cores_result_chunks = {}
         with self._mc.application(app_id):
             # Allocate SDRAM. This is enough to fit the commands and also any
             # recored results.
             cores_sdram = {}
             logger.info("Allocating SDRAM...")
-            for core in nt_cores:
-                size = max(
-                    # Size of commands (with length prefix)
-                    cores_commands[core].size,
-                    # Size of results (plus the flags)
-                    cores_result_size[core],
-                )
-                x, y = self._placements[core]
-                p = self._allocations[core][Cores].start
-                cores_sdram[core] = self._mc.sdram_alloc_as_filelike(
-                    size, x=x, y=y, tag=p)
+            with profile.phase("sdram_allocation"):
+                for core in load.nt_cores:
+                    size = max(
+                        # Size of commands (with length prefix)
+                        partition.cores_commands[core].size,
+                        # Size of results (plus the flags)
+                        partition.cores_result_size[core],
+                    )
+                    x, y = self._placements[core]
+                    p = self._allocations[core][Cores].start
+                    cores_sdram[core] = self._mc.sdram_alloc_as_filelike(
+                        size, x=x, y=y, tag=p)
+                    profile.count()
 
             # Load each core's commands
             logger.info("Loading {} bytes of commands...".format(
-                sum(c.size for c in itervalues(cores_commands))))
-            for core, sdram in iteritems(cores_sdram):
-                sdram.write(cores_commands[core].pack())
+                sum(c.size for c in itervalues(partition.cores_commands))))
+            with profile.phase("upload"):
+                for core, sdram in iteritems(cores_sdram):
+                    data = partition.cores_commands[core].pack()
+                    sdram.write(data)
+                    profile.count(len(data), scp_operations(len(data)))
 
             # Load routing tables
             logger.info("Loading routing tables...")
-            self._mc.load_routing_tables(routing_tables)
-
-            # Load the packet-reinjection application if used. This must be
-            # completed before the main application since it creates a tagged
-            # memory allocation.
-            if reinjector_application_map:
-                logger.info("Loading packet-reinjection application...")
-                self._mc.load_application(reinjector_application_map)
-
-            # Load the application
-            logger.info("Loading network tester application "
-                        "on to {} cores...".format(len(nt_cores)))
-            self._mc.load_application(nt_application_map)
+            with profile.phase("routing_table_load"):
+                self._mc.load_routing_tables(load.routing_tables)
+                for counts in _routing_table_load_counts(load.routing_tables):
+                    profile.count(*counts)
+
+            with profile.phase("application_load"):
+                # Load the packet-reinjection application if used. This must
+                # be completed before the main application since it creates a
+                # tagged memory allocation.
+                if load.reinjector_application_map:
+                    logger.info("Loading packet-reinjection application...")
+                    self._mc.load_application(
+                        load.reinjector_application_map)
+                    for counts in _application_load_counts(
+                            load.reinjector_application_map):
+                        profile.count(*counts)
+
+                # Load the application
+                logger.info("Loading network tester application "
+                            "on to {} cores...".format(len(load.nt_cores)))
+                self._mc.load_application(load.nt_application_map)
+                for counts in _application_load_counts(
+                        load.nt_application_map):
+                    profile.count(*counts)
 
             # Run through each experimental group
             next_barrier = "sync0"
-            for group_num, group in enumerate(self._groups):
+            for group_num, group in enumerate(partition.groups,
+                                              first_group_num):
                 # Reach the barrier before the run starts
                 logger.info("Waiting for barrier...")
-                num_at_barrier = self._mc.wait_for_cores_to_reach_state(
-                    next_barrier, len(nt_cores), timeout=10.0)
-                assert num_at_barrier == len(nt_cores), \
+                with profile.phase("barrier", group):
+                    num_at_barrier = self._mc.wait_for_cores_to_reach_state(
+                        next_barrier, len(load.nt_cores), timeout=10.0)
+                    profile.count()
+                assert num_at_barrier == len(load.nt_cores), \
                     "Not all cores reached the barrier " \
                     "before {}.".format(group)
 
@@ -613,10 +1341,6 @@ class Experiment(object):
                 if before_group is not None:
                     before_group(self, group)
 
-                # Start the group running
-                self._mc.send_signal(next_barrier)
-                next_barrier = "sync1" if next_barrier == "sync0" else "sync0"
-
                 # Give the run time to complete
                 warmup = self._get_option_value("warmup", group)
                 duration = self._get_option_value("duration", group)
@@ -624,17 +1348,26 @@ class Experiment(object):
                 flush_time = self._get_option_value("flush_time", group)
                 total_time = warmup + duration + cooldown + flush_time
 
-                logger.info(
-                    "Running group {} ({} of {}) for {} seconds...".format(
-                        group.name, group_num + 1, len(self._groups),
-                        total_time))
-                time.sleep(total_time)
+                with profile.phase("run", group):
+                    # Start the group running
+                    self._mc.send_signal(next_barrier)
+                    profile.count()
+                    next_barrier = ("sync1" if next_barrier == "sync0"
+                                    else "sync0")
+
+                    logger.info(
+                        "Running group {} ({} of {}) for {} seconds...".format(
+                            group.name, group_num + 1, len(self._groups),
+                            total_time))
+                    time.sleep(total_time)
 
             # Wait for all cores to exit after their final run
             logger.info("Waiting for barrier...")
-            num_at_barrier = self._mc.wait_for_cores_to_reach_state(
-                "exit", len(nt_cores), timeout=10.0)
-            assert num_at_barrier == len(nt_cores), \
+            with profile.phase("exit"):
+                num_at_barrier = self._mc.wait_for_cores_to_reach_state(
+                    "exit", len(load.nt_cores), timeout=10.0)
+                profile.count()
+            assert num_at_barrier == len(load.nt_cores), \
                 "Not all cores reached the final barrier."
 
             # Run the user-defined pre-result collection callback
@@ -642,32 +1375,45 @@ class Experiment(object):
                 before_read_results(self)
 
             # Read recorded data back
-            logger.info("Reading back {} bytes of results...".format(
-                sum(itervalues(cores_result_size))))
-            for core, sdram in iteritems(cores_sdram):
-                sdram.seek(0)
-                cores_result_data[core] = \
-                    sdram.read(cores_result_size[core])
-
-        # Process read results
-        results = Results(self, self._cores, self._flows, cores_records,
-                          self._router_recording_cores,
-                          self._placements, self._routes,
-                          cores_result_data, self._groups)
-        if any(not e.is_deadline if ignore_deadline_errors else True
-               for e in results.errors):
-            logger.error(
-                "Experiment completed with errors: {}".format(results.errors))
-            raise NetworkTesterError(results)
-        else:
-            logger.info("Experiment completed successfully")
-            return results
+            compact_recording = self._get_option_value("compact_recording")
+            if compact_recording:
+                logger.info("Reading back compacted results...")
+            else:
+                logger.info("Reading back {} bytes of results...".format(
+                    sum(itervalues(partition.cores_result_size))))
+            with profile.phase("readback"):
+                for core, sdram in iteritems(cores_sdram):
+                    sdram.seek(0)
+                    if compact_recording:
+                        # Read the header first to determine how much
+                        # compacted data was actually recorded.
+                        header = sdram.read(8)
+                        profile.count(len(header))
+                        num_bytes = struct.unpack("<I", header[4:8])[0]
+                        num_bytes += partition.cores_tag_size[core] - 4
+                    else:
+                        header = b""
+                        num_bytes = partition.cores_result_size[core]
+
+                    if f is None:
+                        cores_result_chunks[core] = \
+                            header + sdram.read(num_bytes)
+                    else:
+                        # Stream the data into the results file
+                        cores_result_chunks[core] = (
+                            f.tell(), len(header) + num_bytes)
+                        f.write(header)
+                        _copy_to_file(sdram, f, num_bytes)
+                    profile.count(num_bytes, scp_operations(num_bytes))
+
+        return cores_result_chunks
 
     def _place_and_route(self,
                          constraints=None,
                          place=place, place_kwargs={},
                          allocate=allocate, allocate_kwargs={},
-                         route=route, route_kwargs={}):
+                         route=route, route_kwargs={},
+                         profile=None):
         """Place and route the cores and flows in the current experiment.
 
         If extra control is required over placement and routing of cores and
@@ -708,12 +1454,25 @@ class Experiment(object):
         route_kwargs : dict
             Additional algorithm-specific keyword arguments to supply to the
             router.
+        profile : :py:class:`.RunProfile` or None
+            If given, the time taken by placement, allocation and routing is
+            recorded.
         """
+        if profile is None:
+            profile = RunProfile()
+
         # Each traffic generator consumes a core and a negligible amount of
         # memory.
         vertices_resources = {core: {Cores: 1} for core in
                               self._cores}
 
+        # Add a flow from each sink of every echo flow back to its source
+        self._reply_flows = OrderedDict(
+            ((flow, sink), _ReplyFlow(flow, sink))
+            for flow in self._flows if flow.echo
+            for sink in flow.sinks)
+        nets = self._flows + list(itervalues(self._reply_flows))
+
         # Generate a Machine object and reserve all in-use cores
         machine = build_machine(self.system_info)
         core_constraints = build_core_constraints(self.system_info)
@@ -739,11 +1498,12 @@ class Experiment(object):
 
         # Perform placement as required
         logger.info("Placing cores...")
-        self._placements = place(vertices_resources=vertices_resources,
-                                 nets=self._flows,
-                                 machine=machine,
-                                 constraints=constraints,
-                                 **place_kwargs)
+        with profile.phase("placement"):
+            self._placements = place(vertices_resources=vertices_resources,
+                                     nets=nets,
+                                     machine=machine,
+                                     constraints=constraints,
+                                     **place_kwargs)
 
         # Add router-recording cores to any chips which don't have any cores on
         # them.
@@ -777,22 +1537,25 @@ class Experiment(object):
 
         # Perform allocation
         logger.info("Allocating cores...")
-        self._allocations = allocate(vertices_resources=vertices_resources,
-                                     nets=self._flows,
-                                     machine=machine,
-                                     constraints=constraints,
-                                     placements=self._placements,
-                                     **allocate_kwargs)
+        with profile.phase("allocation"):
+            self._allocations = allocate(
+                vertices_resources=vertices_resources,
+                nets=nets,
+                machine=machine,
+                constraints=constraints,
+                placements=self._placements,
+                **allocate_kwargs)
 
         # Perform routing
         logger.info("Routing flows...")
-        self._routes = route(vertices_resources=vertices_resources,
-                             nets=self._flows,
-                             machine=machine,
-                             constraints=constraints,
-                             placements=self._placements,
-                             allocations=self._allocations,
-                             **allocate_kwargs)
+        with profile.phase("routing"):
+            self._routes = route(vertices_resources=vertices_resources,
+                                 nets=nets,
+                                 machine=machine,
+                                 constraints=constraints,
+                                 placements=self._placements,
+                                 allocations=self._allocations,
+                                 **allocate_kwargs)
 
     def place_and_route(self, *args, **kwargs):
         """Warn users of old code of API incompatibility."""
@@ -875,7 +1638,9 @@ class Experiment(object):
             raise AttributeError("Routes not available until "
                                  "after calling Experiment.run()")
         else:
-            return self._routes
+            # Filter out flows which were not created by the user.
+            return {flow: tree for flow, tree in iteritems(self._routes)
+                    if flow in self._flows}
 
     @routes.setter
     def routes(self, *args, **kwargs):
@@ -944,7 +1709,8 @@ class Experiment(object):
         return build_machine(self._system_info)
 
     def _construct_core_commands(self, core, source_flows, sink_flows,
-                                 flow_keys, records, router_access_core):
+                                 reply_flows, flow_keys, records,
+                                 router_access_core, groups=None):
         """For internal use. Produce the Commands for a particular core.
 
         Parameters
@@ -955,6 +1721,8 @@ class Experiment(object):
             The flows which are sourced at this core.
         sink_flows : [:py:class:`.Flow`, ...]
             The flows which are sunk at this core.
+        reply_flows : [:py:class:`._ReplyFlow`, ...]
+            The flows which carry packets echoed back to this core's sources.
         flow_keys : {:py:class:`.Flow`: key, ...}
             A mapping from flow to routing key.
         records : [counter, ...]
@@ -962,7 +1730,12 @@ class Experiment(object):
         router_access_core : bool
             Should this core be used to configure router/reinjector
             parameters.
+        groups : [:py:class:`.Group`, ...] or None
+            The groups to run. If None, all groups are run.
         """
+        if groups is None:
+            groups = self._groups
+
         commands = Commands()
 
         # Set up the sources and sinks for the core
@@ -972,8 +1745,36 @@ class Experiment(object):
         for sink_num, sink_flow in enumerate(sink_flows):
             commands.sink_key(sink_num, flow_keys[sink_flow])
 
+        # Set up echoing of packets back to their source
+        for sink_num, sink_flow in enumerate(sink_flows):
+            if sink_flow.echo:
+                commands.echo_key(
+                    sink_num, flow_keys[self._reply_flows[(sink_flow, core)]])
+        if reply_flows:
+            commands.num_replies(len(reply_flows))
+            for reply_num, reply_flow in enumerate(reply_flows):
+                commands.reply_key(reply_num, flow_keys[reply_flow],
+                                   source_flows.index(reply_flow.flow))
+
+        # Record compactly, if required, reserving space for the width tags of
+        # every sample
+        if self._get_option_value("compact_recording"):
+            commands.compact_recording(
+                sum(g.num_samples for g in groups) *
+                compact_tag_words(len(records)))
+
+        # Aggregate results on-core, if required
+        if self._get_option_value("aggregate_recording"):
+            commands.aggregate_recording()
+
+        # Set up latency and round-trip histograms, if recorded
+        if Counters.latency in records or Counters.round_trip in records:
+            commands.latency_histogram(
+                self._get_option_value("latency_bins"),
+                self._get_option_value("latency_bin_width"))
+
         # Generate commands for each experimental group
-        for group in self._groups:
+        for group in groups:
             # Set general parameters for the group
             commands.seed(self._get_option_value("seed", group))
             commands.timestep(self._get_option_value("timestep", group))
@@ -999,6 +1800,7 @@ class Experiment(object):
                                            group, source_flow))
                 commands.payload(
                     source_num,
+                    source_flow.echo or
                     self._get_option_value("use_payload",
                                            group,
                                            source_flow))
@@ -1071,8 +1873,11 @@ class Experiment(object):
             For router counters, object will be a tuple (x, y) indicating which
             chip that counter is responsible for.
 
+            For permanent and core counters, object will be the core itself.
+
             For non-router counters, object will be the Flow associated with
-            the counter.
+            the counter. Histogram counters appear once per bin, in bin
+            order.
         """
         # Get the set of recorded counters for each core
         # {core: [counter, ...]}
@@ -1081,6 +1886,13 @@ class Experiment(object):
             # Start with the permanently-recorded set of counters
             records = [(core, c) for c in Counters if c.permanent_counter]
 
+            # Add any core counters
+            for counter in Counters:
+                if (counter.core_counter and
+                        self._get_option_value(
+                            "record_{}".format(counter.name))):
+                    records.append((core, counter))
+
             # Add any router-counters if this core is recording them
             if core in self._router_recording_cores:
                 xy = self._placements[core]
@@ -1091,21 +1903,28 @@ class Experiment(object):
                                 "record_{}".format(counter.name))):
                         records.append((xy, counter))
 
-            # Add any source counters
+            # Add any source counters (histograms record one value per bin)
+            num_bins = self._get_option_value("latency_bins")
             for counter in Counters:
                 if (counter.source_counter and
                         self._get_option_value(
                             "record_{}".format(counter.name))):
                     for flow in cores_source_flows[core]:
-                        records.append((flow, counter))
+                        if counter.histogram_counter:
+                            records.extend([(flow, counter)] * num_bins)
+                        else:
+                            records.append((flow, counter))
 
-            # Add any sink counters
+            # Add any sink counters (histograms record one value per bin)
             for counter in Counters:
                 if (counter.sink_counter and
                         self._get_option_value(
                             "record_{}".format(counter.name))):
                     for flow in cores_sink_flows[core]:
-                        records.append((flow, counter))
+                        if counter.histogram_counter:
+                            records.extend([(flow, counter)] * num_bins)
+                        else:
+                            records.append((flow, counter))
 
             cores_records[core] = records
 
@@ -1191,6 +2010,11 @@ class Experiment(object):
     record_counter14 = _Option("record_counter14")
     record_counter15 = _Option("record_counter15")
 
+    record_slack_min = _Option("record_slack_min")
+    record_slack_mean = _Option("record_slack_mean")
+    record_interrupt_cycles = _Option("record_interrupt_cycles")
+    record_generation_cycles = _Option("record_generation_cycles")
+
     record_reinjected = _Option("record_reinjected")
     record_reinject_overflow = _Option("record_reinject_overflow")
     record_reinject_missed = _Option("record_reinject_missed")
@@ -1198,7 +2022,19 @@ class Experiment(object):
     record_sent = _Option("record_sent")
     record_blocked = _Option("record_blocked")
     record_retried = _Option("record_retried")
+    record_round_trip = _Option("record_round_trip")
     record_received = _Option("record_received")
+    record_latency = _Option("record_latency")
+    record_sequence_gaps = _Option("record_sequence_gaps")
+    record_missing = _Option("record_missing")
+    record_duplicated = _Option("record_duplicated")
+    record_out_of_order = _Option("record_out_of_order")
+
+    latency_bins = _Option("latency_bins")
+    latency_bin_width = _Option("latency_bin_width")
+
+    compact_recording = _Option("compact_recording")
+    aggregate_recording = _Option("aggregate_recording")
 
     record_interval = _Option("record_interval")
 
@@ -1286,9 +2122,11 @@ class Flow(RigNet):
     """
 
     def __init__(self, experiment, name, *args, **kwargs):
+        echo = kwargs.pop("echo", False)
         super(Flow, self).__init__(*args, **kwargs)
         self._experiment = experiment
         self.name = name
+        self.echo = echo
 
     class _Option(object):
         """A descriptor which provides access to the experiment's _values
@@ -1319,6 +2157,15 @@ class Flow(RigNet):
         return "<{} {}>".format(self.__class__.__name__, repr(self.name))
 
 
+class _ReplyFlow(RigNet):
+    """A flow which carries the packets echoed by one sink of an echo
+    :py:class:`.Flow` back to the flow's source."""
+
+    def __init__(self, flow, sink):
+        super(_ReplyFlow, self).__init__(sink, flow.source, flow.weight)
+        self.flow = flow
+
+
 class Group(object):
     """An experimental group, created by :py:meth:`Experiment.new_group`."""
 
@@ -1383,6 +2230,140 @@ class Group(object):
             return run_steps // interval_steps
 
 
+def _copy_to_file(src, dst, num_bytes, chunk_size=1024 * 1024):
+    """Copy num_bytes from one file-like object to another, chunk_size bytes
+    at a time."""
+    while num_bytes > 0:
+        data = src.read(min(num_bytes, chunk_size))
+        if not data:
+            break
+        dst.write(data)
+        num_bytes -= len(data)
+
+
+def _stitch_result_data(chunks, tag_sizes=None):
+    """Combine the result data read back from a core by several machine loads
+    (see :py:meth:`Experiment.run`) into the form recorded by a single load.
+
+    Parameters
+    ----------
+    chunks : [bytes, ...]
+        The result data read back by each load, in order.
+    tag_sizes : [int, ...] or None
+        If results were recorded compactly, the size (in bytes) of the
+        header word and width tags recorded by each load.
+
+    Returns
+    -------
+    [bytes, ...]
+        The parts which, when concatenated, give the combined result data.
+    """
+    if len(chunks) == 1:
+        return list(chunks)
+
+    # The error flags reported during every load
+    error = 0
+    for chunk in chunks:
+        error |= struct.unpack("<I", chunk[0:4])[0]
+    parts = [struct.pack("<I", error)]
+
+    if tag_sizes is None:
+        # The samples (or aggregates) of each group follow one another
+        parts.extend(chunk[4:] for chunk in chunks)
+    else:
+        # The number of bytes of values, the width tags of every sample and
+        # then the values.
+        num_bytes = [struct.unpack("<I", chunk[4:8])[0] for chunk in chunks]
+        parts.append(struct.pack("<I", sum(num_bytes)))
+        parts.extend(chunk[8:4 + tag_size]
+                     for chunk, tag_size in zip(chunks, tag_sizes))
+        parts.extend(chunk[4 + tag_size:4 + tag_size + n]
+                     for chunk, tag_size, n in zip(chunks, tag_sizes,
+                                                   num_bytes))
+    return parts
+
+
+def _stitch_results_file(src_filename, dst_filename, cores_result_chunks,
+                         cores_tag_sizes=None):
+    """Combine the result data streamed into a file by several machine loads
+    (see :py:meth:`Experiment.run`) into a new file.
+
+    Parameters
+    ----------
+    src_filename : str
+    dst_filename : str
+    cores_result_chunks : {:py:class:`Core`: [(offset, num_bytes), ...], ...}
+        The extent of the data read back from each core by each load.
+    cores_tag_sizes : {:py:class:`Core`: [int, ...], ...} or None
+        If results were recorded compactly, the size of the header word and
+        width tags recorded by each core during each load.
+
+    Returns
+    -------
+    {:py:class:`Core`: (offset, num_bytes), ...}
+        The extent of the combined data of each core in the new file.
+    """
+    cores_result_extents = {}
+    if not cores_result_chunks:
+        open(dst_filename, "wb").close()
+        return cores_result_extents
+
+    src = np.memmap(src_filename, dtype=np.uint8, mode="r")
+    try:
+        with open(dst_filename, "wb") as f:
+            for core, extents in iteritems(cores_result_chunks):
+                chunks = [src[offset:offset + num_bytes]
+                          for offset, num_bytes in extents]
+                offset = f.tell()
+                for part in _stitch_result_data(
+                        chunks, cores_tag_sizes and cores_tag_sizes[core]):
+                    f.write(part)
+                cores_result_extents[core] = (offset, f.tell() - offset)
+    finally:
+        del src
+    return cores_result_extents
+
+
+def _routing_table_load_counts(routing_tables):
+    """Generate the (num_bytes, num_operations) used to load each routing
+    table: the entries are written to SDRAM and then loaded into the router
+    (see :py:meth:`rig.machine_control.MachineController.load_routing_tables`).
+    """
+    for table in itervalues(routing_tables):
+        num_bytes = len(table) * _ROUTING_ENTRY_BYTES
+        yield (num_bytes, scp_operations(num_bytes) + 2)
+
+
+def _application_load_counts(application_map):
+    """Generate the (num_bytes, num_operations) used to load each binary of
+    an application: each binary is sent to its target chips (see
+    :py:meth:`rig.machine_control.MachineController.load_application`) and
+    every chip's cores are then started."""
+    for binary, targets in iteritems(application_map):
+        num_bytes = os.path.getsize(binary) if os.path.isfile(binary) else 0
+        yield (num_bytes, scp_operations(num_bytes) + len(targets))
+
+
+def _map_results_file(filename, cores_result_extents):
+    """Memory-map the result data for each core streamed into a file by
+    :py:meth:`Experiment.run`.
+
+    Parameters
+    ----------
+    filename : str
+    cores_result_extents : {:py:class:`Core`: (offset, num_bytes), ...}
+
+    Returns
+    -------
+    {:py:class:`Core`: :py:class:`numpy.ndarray`, ...}
+    """
+    if not cores_result_extents:
+        return {}
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    return {core: data[offset:offset + num_bytes]
+            for core, (offset, num_bytes) in iteritems(cores_result_extents)}
+
+
 class APIChangedError(AttributeError):
     """
     Exception thrown when an old (removed) API is used.
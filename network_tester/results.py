@@ -3,7 +3,15 @@ SpiNNaker."""
 
 import struct
 
-from six import iteritems, itervalues
+import pickle
+
+import functools
+
+import inspect
+
+from collections import OrderedDict
+
+from six import StringIO, iteritems, itervalues
 
 import numpy as np
 
@@ -11,14 +19,57 @@ from numpy.lib.recfunctions import flatten_descr
 
 from network_tester.counters import Counters
 
+from network_tester.commands import compact_tag_words, AGGREGATE_WORDS
+
 from network_tester.errors import NT_ERR
 
+from network_tester.columnar import save_columnar
+
 from rig.place_and_route.routing_tree import RoutingTree
 
+from rig.links import Links
+
 
 # A little-endian unsigned 32-bit value type
 uint32_le = np.dtype("uint32").newbyteorder("<")
 
+RESULTS_FORMAT_VERSION = 2
+"""The version of the file format written by :py:meth:`Results.save`. Files
+written in all earlier versions may also be loaded."""
+
+# The index of each counter, used to identify counters in the columns of the
+# sample matrix
+_COUNTER_NUMS = {counter: num for num, counter in enumerate(Counters)}
+
+
+def _memoised(method):
+    """Decorator for :py:class:`Results` methods which produce result tables.
+
+    Tables are cached, keyed by the method and its arguments, and returned as
+    read-only views. See :py:meth:`Results.clear_cache`.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        call_args = inspect.getcallargs(method, self, *args, **kwargs)
+        del call_args["self"]
+        key = (method.__name__, tuple(sorted(call_args.items())))
+
+        table = self._table_cache.pop(key, None)
+        if table is None:
+            table = method(self, *args, **kwargs)
+            table.flags.writeable = False
+        self._table_cache[key] = table
+
+        # Evict the least-recently used tables until within budget (tables
+        # larger than the whole budget are never retained).
+        while (sum(t.nbytes for t in itervalues(self._table_cache)) >
+               self.cache_size):
+            self._table_cache.popitem(last=False)
+
+        return table.view()
+
+    return wrapper
+
 
 class Results(object):
     """The results of an experiment, returned by :py:meth:`Experiment.run`.
@@ -39,13 +90,48 @@ class Results(object):
         The time that the value was recorded. Given in seconds since the start
         of the group's execution (not including any warmup time).
 
+    When :py:attr:`Experiment.aggregate_recording` is enabled, individual
+    samples are not recorded and the methods of this class (except
+    :py:meth:`.counter_statistics`) give a single sample for each group
+    containing the sum of the values recorded during that group. The 'time'
+    field of these samples gives the duration of the group.
+
+    Every method accepts a ``categorical`` argument. If True, the resulting
+    array is produced in a more compact form which is also faster to filter
+    and copy: fields which would otherwise contain objects (e.g. 'group',
+    'core', 'flow' and label fields) instead contain integer codes and
+    counter fields use unsigned integers rather than floating point values.
+    The objects corresponding to each code of such a field are given by the
+    'categories' entry of the field's dtype metadata, e.g.::
+
+        >>> totals = results.totals(categorical=True)
+        >>> groups = totals.dtype["group"].metadata["categories"]
+        >>> group = groups[totals["group"][0]]
+
+    The :py:func:`to_objects` function converts a categorical array into the
+    usual object form on demand.
+
+    The arrays produced by these methods are cached (up to a total of
+    :py:attr:`.cache_size` bytes, discarding the least recently used first)
+    so that repeated calls are cheap. Since the same array may be returned
+    more than once, the arrays are read-only: use
+    :py:meth:`numpy.ndarray.copy` to obtain a modifiable copy.
+    :py:meth:`.clear_cache` empties the cache.
+
     A utility function, :py:func:`to_csv`, is also provided which can produce
     R-compatible CSV files from the output of methods in this class.
+
+    Attributes
+    ----------
+    profile : :py:class:`.RunProfile` or None
+        The time taken by each phase of the :py:meth:`Experiment.run` which
+        produced the results.
     """
 
     def __init__(self, experiment, cores, flows, cores_records,
                  router_recording_cores, placements, routes,
-                 cores_result_data, groups):
+                 cores_result_data, groups, samples_file=None,
+                 profile=None):
         """Internal use only. Create a new results container.
 
         Parameters
@@ -75,9 +161,17 @@ class Results(object):
                   ...}
             The route generated for each flow.
         cores_result_data : {:py:class:`Core`: bytes, ...}
-            The raw result data read back from each core.
+            The raw result data read back from each core. This may also be a
+            (memory-mapped) :py:class:`numpy.ndarray` of bytes.
         groups : [:py:class:`Group`, ...]
             The list of experimental groups.
+        samples_file : str or None
+            If not None, the results are processed out-of-core: raw recorded
+            values are used in-place (rather than copied into memory) and the
+            sample matrix (see :py:meth:`._index_columns`) is written to a
+            memory-mapped file with this name.
+        profile : :py:class:`.RunProfile` or None
+            The timing of the run which produced the results.
         """
         self._experiment = experiment
         self._cores = cores
@@ -88,32 +182,61 @@ class Results(object):
         self._routes = routes
         self._cores_result_data = cores_result_data
         self._groups = groups
+        self._samples_file = samples_file
+        self.profile = profile
 
-        # Determine the full list of counters recorded throughout the system
+        # Result tables produced so far, least recently used first (see
+        # _memoised)
+        self._table_cache = OrderedDict()
+
+        # Determine the full list of counters recorded throughout the system.
+        # Histogram counters are listed separately since they are not
+        # presented in the same tables as other counters.
         recorded = set()
         for counters in itervalues(self._cores_records):
             recorded.update(counter for obj, counter in counters)
-        self._recorded = sorted(recorded)
-
-        # Unpack the errors and data tables from each core
+        self._recorded = sorted(c for c in recorded
+                                if not c.histogram_counter)
+        self._recorded_histograms = sorted(c for c in recorded
+                                           if c.histogram_counter)
+
+        # Count the number of samples in the datasets. When aggregating, a
+        # single (summed) sample is recorded for each group.
+        self._compact_recording = self._experiment._get_option_value(
+            "compact_recording")
+        self._aggregate_recording = self._experiment._get_option_value(
+            "aggregate_recording")
+        self._group_num_samples = np.array(
+            [g.num_samples for g in self._groups], dtype=int)
+        if self._aggregate_recording:
+            self._num_samples = len(self._groups)
+        else:
+            self._num_samples = int(np.sum(self._group_num_samples))
+
+        # Unpack the errors reported by each core. The recorded values are
+        # only decoded when first used (see _get_core_results) and the
+        # aggregates for each group, (sums, minimums, maximums,
+        # sums_of_squares), are either decoded alongside them (when
+        # aggregating) or computed on demand by _get_core_aggregates.
         self._cores_errors = {}
         self._cores_results = {}
+        self._cores_aggregates = {}
         self.errors = set()
         for core, data in iteritems(self._cores_result_data):
-            # Unpack error status
             errors = NT_ERR.from_int(struct.unpack("<I", data[0:4])[0])
             self._cores_errors[core] = errors
             self.errors.update(errors)
 
-            # Unpack the data
-            results = np.frombuffer(data[4:], dtype=uint32_le).astype(np.uint)
-            num_columns = len(self._cores_records[core])
-            if num_columns > 0:
-                results.shape = (len(results) // num_columns, num_columns)
-            self._cores_results[core] = results
+        # The columns of the sample matrix are indexed, on demand, by
+        # _index_columns.
+        self._column_counter = None
+        self._samples = None
 
-        # Count the number of samples in the datasets
-        self._num_samples = sum(g.num_samples for g in self._groups)
+        # The incidence of flows (and the flows carrying echoed packets back
+        # from each (flow, sink) pair) on links, built on demand by
+        # _get_link_incidence.
+        self._link_incidence = None
+        self._reply_pairs = []
 
         # A full set of group-defined labels
         labels = []
@@ -122,88 +245,546 @@ class Results(object):
                 if label not in labels:
                     labels.append(label)
 
-        # Create the standard set of columns
-        self._common = np.zeros((self._num_samples, ),
-                                dtype=[(label, object)
-                                       for label in labels] +
-                                      [("group", object),
-                                       ("time", np.double)])
-        row = 0
+        # Create the standard set of columns for every sample and also for
+        # every group as a whole (whose time is the duration of the group).
+        common_dtype = ([(label, object) for label in labels] +
+                        [("group", object), ("time", np.double)])
+        self._common = np.zeros((self._num_samples, ), dtype=common_dtype)
+        self._group_common = np.zeros((len(self._groups), ),
+                                      dtype=common_dtype)
+        sample_periods = np.zeros((len(self._groups), ), dtype=np.double)
         for group_num, group in enumerate(self._groups):
             # Work out the sampling interval for the group
             with group:
+                duration = self._experiment.duration
                 sample_period = self._experiment.record_interval
                 if sample_period == 0.0:
-                    sample_period = self._experiment.duration
+                    sample_period = duration
+            sample_periods[group_num] = sample_period
 
             # Populate the columns
-            for sample_num in range(group.num_samples):
-                for label in labels:
-                    self._common[row][label] = group.labels.get(label)
-                self._common[row]["group"] = group
-                self._common[row]["time"] = (sample_num + 1) * sample_period
-                row += 1
-
-    def _make_result_array(self, column_names, rows_per_sample=1):
+            for label in labels:
+                self._group_common[group_num][label] = group.labels.get(label)
+            self._group_common[group_num]["group"] = group
+            self._group_common[group_num]["time"] = duration
+
+        if self._aggregate_recording:
+            self._common[:] = self._group_common
+            self._sample_groups = np.arange(len(self._groups))
+        else:
+            # Repeat each group's columns for each of its samples, numbering
+            # the samples within each group to determine their times.
+            sample_groups = np.repeat(np.arange(len(self._groups)),
+                                      self._group_num_samples)
+            self._sample_groups = sample_groups
+            group_starts = (np.cumsum(self._group_num_samples) -
+                            self._group_num_samples)
+            sample_nums = (np.arange(self._num_samples) -
+                           group_starts[sample_groups])
+            for column in labels + ["group"]:
+                self._common[column] = \
+                    self._group_common[column][sample_groups]
+            self._common["time"] = ((sample_nums + 1) *
+                                    sample_periods[sample_groups])
+
+        # For categorical output, the categories of each of the common object
+        # columns and the code of each group's value in each.
+        self._common_categories = {"group": list(self._groups)}
+        self._group_common_codes = {"group": np.arange(len(self._groups))}
+        for label in labels:
+            categories = []
+            codes = []
+            for group in self._groups:
+                value = group.labels.get(label)
+                if value not in categories:
+                    categories.append(value)
+                codes.append(categories.index(value))
+            self._common_categories[label] = categories
+            self._group_common_codes[label] = np.array(codes, dtype=int)
+
+    def _make_result_array(self, column_names, rows_per_sample=1,
+                           per_group=False, categorical=False, samples=None):
         """Make a structured array with a row for every sample, all standard
         group/time columns and then the specified set of additional columns for
         counter values. Counter columns are initialised with zeros.
 
         Parameters
         ----------
-        column_name : [name or (name, type), ...]
+        column_name : [name or (name, type) or (name, object, categories), \
+                       ...]
+            Columns given by name alone are counter columns. Object columns
+            given with a list of categories are encoded as integer codes into
+            that list when producing categorical output and should be
+            populated using :py:meth:`._set_objects`.
         rows_per_sample : int
             The number of rows in the output to reserve for each sample
             recorded.
+        per_group : bool
+            If True, produce rows for every group rather than every sample.
+        categorical : bool
+            If True, produce categorical output (see :py:class:`Results`).
+        samples : array or None
+            If not None, only produce rows for the samples with the given
+            indices.
         """
-        column_names = [(name, np.double) if isinstance(name, str) else name
-                        for name in column_names]
-
-        a = np.zeros((self._num_samples * rows_per_sample, ),
-                     dtype=(list(flatten_descr(self._common.dtype)) +
-                            column_names))
+        counter_type = np.uint if categorical else np.double
+        columns = []
+        for name in column_names:
+            if isinstance(name, str):
+                columns.append((name, counter_type))
+            elif len(name) == 3:
+                name, _, categories = name
+                columns.append((name, _categorical_dtype(categories)
+                                if categorical else object))
+            else:
+                columns.append(name)
+
+        common = self._group_common if per_group else self._common
+        sample_groups = self._sample_groups
+        if samples is not None:
+            common = common[samples]
+            sample_groups = sample_groups[samples]
+        common_columns = list(flatten_descr(common.dtype))
+        if categorical:
+            common_columns = [
+                (name, _categorical_dtype(self._common_categories[name])
+                 if name in self._common_categories else dtype)
+                for name, dtype in common_columns]
+        a = np.zeros((len(common) * rows_per_sample, ),
+                     dtype=common_columns + columns)
 
         # Copy common columns across
-        for common_column in self._common.dtype.names:
-            for row in range(rows_per_sample):
-                a[row::rows_per_sample][common_column] = \
-                    self._common[common_column]
+        for common_column in common.dtype.names:
+            if categorical and common_column in self._common_categories:
+                codes = self._group_common_codes[common_column]
+                if not per_group:
+                    codes = codes[sample_groups]
+                a[common_column] = np.repeat(codes, rows_per_sample)
+            else:
+                a[common_column] = np.repeat(common[common_column],
+                                             rows_per_sample)
 
         return a
 
-    def totals(self):
+    def _set_objects(self, a, column, objects):
+        """Populate an object column of an array produced by
+        :py:meth:`._make_result_array`.
+
+        Parameters
+        ----------
+        a : :py:class:`numpy.ndarray`
+        column : str
+        objects : [object, ...]
+            The object for each of the rows of every sample (i.e.
+            rows_per_sample objects).
+        """
+        if not objects:
+            return
+        num_samples = len(a) // len(objects)
+
+        metadata = a.dtype[column].metadata
+        if metadata and "categories" in metadata:
+            codes = {obj: code
+                     for code, obj in enumerate(metadata["categories"])}
+            a[column] = np.tile([codes[obj] for obj in objects], num_samples)
+        else:
+            a[column] = np.tile(_object_array(objects), num_samples)
+
+    def _get_core_results(self, core):
+        """Get the values recorded by a core, decoding them on first use.
+
+        Where possible (i.e. when not compacted or aggregated and on
+        little-endian hosts), the values are a read-only view of the raw
+        result data rather than a copy. Once decoded, the raw result data of
+        the core is no longer retained.
+
+        Returns
+        -------
+        :py:class:`numpy.ndarray`
+            A (num_samples, num_values) array. When aggregating, this gives
+            the sum of each value over each group.
+        """
+        if core in self._cores_results:
+            return self._cores_results[core]
+
+        data = self._cores_result_data.pop(core)
+        num_columns = len(self._cores_records[core])
+        if self._aggregate_recording:
+            aggregates = decode_aggregates(memoryview(data)[4:],
+                                           len(self._groups), num_columns)
+            self._cores_aggregates[core] = aggregates
+            results = aggregates[0]
+        elif self._compact_recording:
+            results = decode_compact(memoryview(data)[4:], self._num_samples,
+                                     num_columns)
+        else:
+            results = np.frombuffer(data, dtype=uint32_le, offset=4)
+            # Values are only copied if they must be byte-swapped (which is
+            # unnecessary when out-of-core since they are read on demand).
+            if not uint32_le.isnative and self._samples_file is None:
+                results = results.astype(np.uint32)
+            if num_columns > 0:
+                results = results.reshape((len(results) // num_columns,
+                                           num_columns))
+        self._cores_results[core] = results
+        return results
+
+    def _index_columns(self):
+        """Build the sample matrix and column index arrays used to produce
+        the result tables (if not already built).
+
+        The sample matrix has a row for every sample and a column for every
+        value recorded by every core. The matrix is not normally constructed
+        in full: :py:meth:`._sample_columns` produces just the columns needed,
+        decoding only the cores which recorded them. For each column, the
+        following arrays give:
+
+        ``_column_counter``
+            The index of the counter recorded (see ``_COUNTER_NUMS``).
+        ``_column_core``
+            The index of the recording core in ``_cores`` (or -1 for cores
+            added to record router counters).
+        ``_column_flow``
+            The index of the counter's flow in ``_flows`` (or -1 if not a flow
+            counter).
+        ``_column_pair``
+            The index of the counter's source/sink pair in ``_pairs`` (or -1
+            if not a sink counter).
+
+        ``_column_source``
+            The index of the core which recorded the value in
+            ``_source_cores``.
+        ``_column_offset``
+            The column of the value in the core's recorded values.
+
+        ``_pairs`` lists every (flow, sink_core) pair in the order used by
+        :py:meth:`.flow_counters`.
+
+        ``_histogram_offsets`` maps each (core, flow, counter) histogram to
+        the column, in the core's recorded values, of its first bin (the
+        remaining bins following in consecutive columns).
+
+        When processing results out-of-core, the complete sample matrix,
+        ``_samples``, is built as a memory-mapped ``.npy`` file and so only
+        the columns used by a particular table are read into memory.
+        """
+        if self._column_counter is not None:
+            return
+
+        core_nums = {core: num for num, core in enumerate(self._cores)}
+        flow_nums = {flow: num for num, flow in enumerate(self._flows)}
+        self._pairs = [(flow, sink_core)
+                       for flow in self._flows
+                       for sink_core in flow.sinks]
+        pair_nums = {pair: num for num, pair in enumerate(self._pairs)}
+
+        self._source_cores = []
+        column_counter = []
+        column_core = []
+        column_flow = []
+        column_pair = []
+        column_source = []
+        column_offset = []
+        self._histogram_offsets = {}
+        for core, records in iteritems(self._cores_records):
+            if core not in self._cores_errors or not records:
+                continue
+            core_num = core_nums.get(core, -1)
+            column_source.extend([len(self._source_cores)] * len(records))
+            column_offset.extend(range(len(records)))
+            self._source_cores.append(core)
+            for offset, (obj, counter) in enumerate(records):
+                if counter.histogram_counter:
+                    self._histogram_offsets.setdefault(
+                        (core, obj, counter), offset)
+                column_counter.append(_COUNTER_NUMS[counter])
+                column_core.append(core_num)
+                column_flow.append(flow_nums.get(obj, -1)
+                                   if (counter.source_counter or
+                                       counter.sink_counter)
+                                   else -1)
+                column_pair.append(pair_nums.get((obj, core), -1)
+                                   if counter.sink_counter else -1)
+
+        self._column_counter = np.array(column_counter, dtype=int)
+        self._column_core = np.array(column_core, dtype=int)
+        self._column_flow = np.array(column_flow, dtype=int)
+        self._column_pair = np.array(column_pair, dtype=int)
+        self._column_source = np.array(column_source, dtype=int)
+        self._column_offset = np.array(column_offset, dtype=int)
+
+        if self._samples_file is not None and self._source_cores:
+            samples = [self._get_core_results(core)
+                       for core in self._source_cores]
+            self._samples = np.lib.format.open_memmap(
+                self._samples_file, mode="w+",
+                dtype=np.result_type(*samples),
+                shape=(self._num_samples,
+                       sum(s.shape[1] for s in samples)))
+            column = 0
+            for core_samples in samples:
+                self._samples[:, column:column + core_samples.shape[1]] = \
+                    core_samples
+                column += core_samples.shape[1]
+            self._samples.flush()
+
+    def _sample_columns(self, selected, samples=None):
+        """Get a subset of the columns of the sample matrix.
+
+        Parameters
+        ----------
+        selected : array
+            A boolean mask selecting the columns required.
+        samples : array or None
+            If not None, the indices of the samples (rows) required.
+
+        Returns
+        -------
+        :py:class:`numpy.ndarray`
+            A (num_samples, num_selected) array.
+        """
+        columns = np.flatnonzero(selected)
+        if self._samples is not None:
+            if samples is None:
+                return self._samples[:, columns]
+            else:
+                return self._samples[np.ix_(samples, columns)]
+
+        num_samples = self._num_samples if samples is None else len(samples)
+        values = np.zeros((num_samples, len(columns)), dtype=np.uint)
+
+        # Columns are ordered by core so copy each core's run of columns
+        sources = self._column_source[columns]
+        starts = np.flatnonzero(np.concatenate(
+            ([True], sources[1:] != sources[:-1])))[:len(columns)]
+        ends = np.append(starts[1:], len(columns))
+        for start, end in zip(starts, ends):
+            core = self._source_cores[sources[start]]
+            offsets = self._column_offset[columns[start:end]]
+            if samples is None:
+                values[:, start:end] = self._get_core_results(core)[
+                    :, offsets]
+            else:
+                values[:, start:end] = self._get_core_results(core)[
+                    np.ix_(samples, offsets)]
+        return values
+
+    def _column_objects(self, selected):
+        """Get the recording core and object recorded (as listed in
+        ``_cores_records``) for a subset of the columns of the sample matrix.
+
+        Parameters
+        ----------
+        selected : array
+            A boolean mask selecting the columns required.
+
+        Returns
+        -------
+        [(:py:class:`Core`, object), ...]
+        """
+        return [(self._source_cores[source],
+                 self._cores_records[self._source_cores[source]][offset][0])
+                for source, offset in zip(self._column_source[selected],
+                                          self._column_offset[selected])]
+
+    def _counter_columns(self, counter, column_rows):
+        """Select the sample matrix columns recording a particular counter
+        which have a non-negative entry in column_rows."""
+        return ((self._column_counter == _COUNTER_NUMS[counter]) &
+                (column_rows >= 0))
+
+    def _sum_counter(self, counter, column_rows, num_rows):
+        """Sum the sample matrix columns recording a particular counter into
+        a set of rows.
+
+        Parameters
+        ----------
+        counter : :py:class:`Counters`
+        column_rows : array
+            For every column, the row it should be summed into. Columns with a
+            negative row are ignored.
+        num_rows : int
+
+        Returns
+        -------
+        array
+            A (num_samples * num_rows) array with num_rows consecutive
+            entries for each sample.
+        """
+        selected = self._counter_columns(counter, column_rows)
+        return _sum_columns(self._sample_columns(selected),
+                            column_rows[selected], num_rows).ravel()
+
+    def _get_core_aggregates(self, core):
+        """Get the aggregates of every value recorded by a core over each
+        group.
+
+        Returns
+        -------
+        (sums, minimums, maximums, sums_of_squares)
+            Each a (num_groups, num_values) array. The minimum and maximum of
+            values in groups without any samples are undefined.
+        """
+        # When aggregating, the aggregates are decoded with the results
+        results = self._get_core_results(core)
+        if core in self._cores_aggregates:
+            return self._cores_aggregates[core]
+
+        # Compute the aggregates from the individual samples recorded
+        ends = np.cumsum(self._group_num_samples)
+        starts = ends - self._group_num_samples
+        shape = (len(self._groups), len(self._cores_records[core]))
+        aggregates = tuple(np.zeros(shape, dtype=np.uint) for _ in range(4))
+        for group_num, (start, end) in enumerate(zip(starts, ends)):
+            if start == end:
+                continue
+            samples = results[start:end].astype(np.uint)
+            aggregates[0][group_num] = np.sum(samples, axis=0)
+            aggregates[1][group_num] = np.min(samples, axis=0)
+            aggregates[2][group_num] = np.max(samples, axis=0)
+            aggregates[3][group_num] = np.sum(samples * samples, axis=0)
+        self._cores_aggregates[core] = aggregates
+
+        return aggregates
+
+    @_memoised
+    def counter_statistics(self, categorical=False):
+        """Gives summary statistics for every counter value recorded over the
+        course of each group.
+
+        The statistics are computed from the recorded samples or, when
+        :py:attr:`Experiment.aggregate_recording` is enabled, from the
+        aggregates accumulated on-core. Histogram counters (e.g.
+        :py:attr:`~Experiment.record_latency`) are not included.
+
+        The output of this method has one row per recorded counter value for
+        each group (rather than each sample). The 'time' field gives the
+        duration of the group. In addition to the standard fields, the output
+        of this method has:
+
+        'core'
+            The :py:class:`Core` object which recorded the counter.
+        'object'
+            The object the counter is associated with: a :py:class:`Flow` for
+            source and sink counters, an (x, y) tuple for router and
+            reinjector counters or the :py:class:`Core` itself for core and
+            permanent counters (e.g. 'deadlines_missed').
+        'counter'
+            The :py:class:`Counters` value.
+        'num_samples'
+            The number of samples the statistics were computed from.
+        'sum'
+            The sum of the recorded samples.
+        'mean'
+            The mean of the recorded samples (NaN if no samples were
+            recorded).
+        'variance'
+            The (population) variance of the recorded samples (NaN if no
+            samples were recorded).
+        'min'
+            The smallest sample recorded (NaN if no samples were recorded).
+        'max'
+            The largest sample recorded (NaN if no samples were recorded).
+        """
+        # List the cores in the order given followed by any extra cores added
+        # to record router counters (in chip order).
+        cores = list(self._cores) + [
+            core for xy, core in
+            sorted((self._placements[c][::-1], c)
+                   for c in self._router_recording_cores
+                   if c not in self._cores)]
+        columns = [(core, result_column, obj, counter)
+                   for core in cores
+                   for result_column, (obj, counter)
+                   in enumerate(self._cores_records[core])
+                   if not counter.histogram_counter]
+
+        num_rows = len(columns)
+        objects = list(OrderedDict((obj, None)
+                                   for core, result_column, obj, counter
+                                   in columns))
+        stats = self._make_result_array([("core", object, cores),
+                                         ("object", object, objects),
+                                         ("counter", object, list(Counters)),
+                                         ("num_samples", np.uint),
+                                         "sum",
+                                         ("mean", np.double),
+                                         ("variance", np.double),
+                                         ("min", np.double),
+                                         ("max", np.double)],
+                                        rows_per_sample=num_rows,
+                                        per_group=True,
+                                        categorical=categorical)
+        self._set_objects(stats, "core", [c[0] for c in columns])
+        self._set_objects(stats, "object", [c[2] for c in columns])
+        self._set_objects(stats, "counter", [c[3] for c in columns])
+
+        n = self._group_num_samples.astype(np.double)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for row, (core, result_column, obj, counter) in \
+                    enumerate(columns):
+                sums, minimums, maximums, sums_of_squares = \
+                    (a[:, result_column]
+                     for a in self._get_core_aggregates(core))
+                mean = sums / n
+                variance = np.maximum((sums_of_squares / n) - (mean * mean),
+                                      0.0)
+
+                rows = stats[row::num_rows]
+                rows["num_samples"] = self._group_num_samples
+                rows["sum"] = sums
+                rows["mean"] = mean
+                rows["variance"] = np.where(n > 0, variance, np.nan)
+                rows["min"] = np.where(n > 0, minimums, np.nan)
+                rows["max"] = np.where(n > 0, maximums, np.nan)
+
+        return stats
+
+    @_memoised
+    def totals(self, categorical=False):
         """Gives the total counts for all recorded metrics.
 
         The output of this method has a field for each recorded metric in
-        addition to the standard fields.
+        addition to the standard fields. Core timing metrics (e.g.
+        :py:attr:`~Experiment.record_slack_min`) are not included since they
+        cannot be meaningfully summed across cores; see
+        :py:meth:`.core_totals`.
 
         If the number of sent packets is recorded, an additional column,
         'ideal_received', is added which contains total number of packets which
         would be received if all sent packets arrived at every sink.
         """
         record_sent = Counters.sent in self._recorded
+        counters = [c for c in self._recorded if not c.core_counter]
         totals = self._make_result_array(
-            [c.name for c in self._recorded] +
-            (["ideal_received"] if record_sent else []))
-
-        for core, records in iteritems(self._cores_records):
-            results = self._cores_results[core]
-            for result_column, (obj, counter) in enumerate(records):
-                totals[counter.name] += results[:, result_column]
-
-                if counter == Counters.sent:
-                    totals["ideal_received"] += \
-                        results[:, result_column] * len(obj.sinks)
+            [c.name for c in counters] +
+            (["ideal_received"] if record_sent else []),
+            categorical=categorical)
+
+        self._index_columns()
+        all_columns = np.zeros(len(self._column_counter), dtype=int)
+        for counter in counters:
+            totals[counter.name] = self._sum_counter(counter, all_columns, 1)
+
+        if record_sent:
+            fan_outs = np.array([len(flow.sinks) for flow in self._flows],
+                                dtype=np.uint)
+            sent = self._counter_columns(Counters.sent, self._column_flow)
+            totals["ideal_received"] = self._sample_columns(sent).dot(
+                fan_outs[self._column_flow[sent]])
 
         return totals
 
-    def core_totals(self):
+    @_memoised
+    def core_totals(self, categorical=False):
         """Gives the counter totals for each core giving the summed metrics
         of all flows sourced/sunk there.
 
         In addition to the standard fields, the output of this method has a
         'core' field containing the :py:class:`Core` object associated with
-        each result along with a field for each recorded core-specific metric.
+        each result along with a field for each recorded core-specific metric
+        (including the core's timing metrics, e.g.
+        :py:attr:`~Experiment.record_slack_min`).
 
         If the number of sent and received packets is recorded, an additional
         column, 'ideal_received', is added which contains total number of
@@ -214,35 +795,40 @@ class Results(object):
                                  Counters.received in self._recorded)
 
         num_cores = len(self._cores)
-        totals = self._make_result_array([("core", object)] +
-                                         [c.name for c in self._recorded
-                                          if c.source_counter or
-                                          c.sink_counter] +
+        counters = [c for c in self._recorded
+                    if c.core_counter or c.source_counter or c.sink_counter]
+        totals = self._make_result_array([("core", object, self._cores)] +
+                                         [c.name for c in counters] +
                                          (["ideal_received"] if
                                           record_sent_receieved else []),
-                                         rows_per_sample=num_cores)
-
-        for core_num, core in enumerate(self._cores):
-            records = self._cores_records[core]
-            results = self._cores_results[core]
-            totals[core_num::num_cores]["core"] = core
-            for result_column, (obj, counter) in enumerate(records):
-                if counter.source_counter or counter.sink_counter:
-                    totals[core_num::num_cores][counter.name] += \
-                        results[:, result_column]
-
-                    if Counters.received == counter and record_sent_receieved:
-                        src_records = self._cores_records[obj.source]
-                        src_results = self._cores_results[obj.source]
-                        src_sent_column = src_records.index(
-                            (obj, Counters.sent))
-
-                        totals[core_num::num_cores]["ideal_received"] += \
-                            src_results[:, src_sent_column]
+                                         rows_per_sample=num_cores,
+                                         categorical=categorical)
+        self._set_objects(totals, "core", self._cores)
+
+        self._index_columns()
+        for counter in counters:
+            totals[counter.name] = self._sum_counter(
+                counter, self._column_core, num_cores)
+
+        if record_sent_receieved:
+            # The number of packets sent by the source of each flow
+            sent = self._counter_columns(Counters.sent, self._column_flow)
+            flow_sent = _sum_columns(self._sample_columns(sent),
+                                     self._column_flow[sent],
+                                     len(self._flows))
+
+            # Sum, for each core, the packets sent by the sources of the flows
+            # it receives
+            received = self._counter_columns(Counters.received,
+                                             self._column_core)
+            totals["ideal_received"] = _sum_columns(
+                flow_sent[:, self._column_flow[received]],
+                self._column_core[received], num_cores).ravel()
 
         return totals
 
-    def flow_totals(self):
+    @_memoised
+    def flow_totals(self, categorical=False):
         """Gives the counter totals for each flow, summing source and sink
         specific metrics.
 
@@ -256,27 +842,26 @@ class Results(object):
             ..
         """
         num_flows = len(self._flows)
-        totals = self._make_result_array([("flow", object),
+        counters = [c for c in self._recorded
+                    if c.source_counter or c.sink_counter]
+        totals = self._make_result_array([("flow", object, self._flows),
                                           ("fan_out", np.uint)] +
-                                         [c.name for c in self._recorded
-                                          if c.source_counter or
-                                          c.sink_counter],
-                                         rows_per_sample=num_flows)
-
-        for flow_num, flow in enumerate(self._flows):
-            totals[flow_num::num_flows]["flow"] = flow
-            totals[flow_num::num_flows]["fan_out"] = len(flow.sinks)
-            for core, records in iteritems(self._cores_records):
-                results = self._cores_results[core]
-                for result_column, (obj, counter) in enumerate(records):
-                    if obj is flow and (counter.source_counter or
-                                        counter.sink_counter):
-                        totals[flow_num::num_flows][counter.name] += \
-                            results[:, result_column]
+                                         [c.name for c in counters],
+                                         rows_per_sample=num_flows,
+                                         categorical=categorical)
+        self._set_objects(totals, "flow", self._flows)
+        totals["fan_out"] = np.tile([len(f.sinks) for f in self._flows],
+                                    self._num_samples)
+
+        self._index_columns()
+        for counter in counters:
+            totals[counter.name] = self._sum_counter(
+                counter, self._column_flow, num_flows)
 
         return totals
 
-    def flow_counters(self):
+    @_memoised
+    def flow_counters(self, categorical=False):
         """Gives the complete counter values for every flow in the system,
         listing the counts for every source/sink pair individually.
 
@@ -296,16 +881,19 @@ class Results(object):
         A field for each recorded flow-specific metric.
             ..
         """
-        num_sinks = sum(len(f.sinks) for f in self._flows)
-        counts = self._make_result_array([("flow", object),
+        self._index_columns()
+        num_sinks = len(self._pairs)
+        counters = [c for c in self._recorded
+                    if c.source_counter or c.sink_counter]
+        counts = self._make_result_array([("flow", object, self._flows),
                                           ("fan_out", np.uint),
-                                          ("source_core", object),
-                                          ("sink_core", object),
+                                          ("source_core", object,
+                                           self._cores),
+                                          ("sink_core", object, self._cores),
                                           ("num_hops", np.uint)] +
-                                         [c.name for c in self._recorded
-                                          if c.source_counter or
-                                          c.sink_counter],
-                                         rows_per_sample=num_sinks)
+                                         [c.name for c in counters],
+                                         rows_per_sample=num_sinks,
+                                         categorical=categorical)
 
         # Construct a lookup from (flow, sink) to number of hops.
         sink_hops = {}
@@ -322,40 +910,186 @@ class Results(object):
         for flow, route in iteritems(self._routes):
             route_length(flow, route)
 
-        pair_num = 0
-        for flow in self._flows:
-            source_core = flow.source
-            source_records = self._cores_records[source_core]
-            source_results = self._cores_results[source_core]
-
-            for sink_core in flow.sinks:
-                counts[pair_num::num_sinks]["flow"] = flow
-                counts[pair_num::num_sinks]["fan_out"] = len(flow.sinks)
-                counts[pair_num::num_sinks]["source_core"] = source_core
-                counts[pair_num::num_sinks]["sink_core"] = sink_core
-                counts[pair_num::num_sinks]["num_hops"] = \
-                    sink_hops[(flow, sink_core)]
-
-                for source_result_column, (obj, counter) \
-                        in enumerate(source_records):
-                    if obj is flow and counter.source_counter:
-                        counts[pair_num::num_sinks][counter.name] += \
-                            source_results[:, source_result_column]
-
-                sink_records = self._cores_records[sink_core]
-                sink_results = self._cores_results[sink_core]
-
-                for sink_result_column, (obj, counter) \
-                        in enumerate(sink_records):
-                    if obj is flow and counter.sink_counter:
-                        counts[pair_num::num_sinks][counter.name] += \
-                            sink_results[:, sink_result_column]
-
-                pair_num += 1
+        pair_flows = [flow for flow, sink_core in self._pairs]
+        self._set_objects(counts, "flow", pair_flows)
+        counts["fan_out"] = np.tile([len(f.sinks) for f in pair_flows],
+                                    self._num_samples)
+        self._set_objects(counts, "source_core",
+                          [flow.source for flow in pair_flows])
+        self._set_objects(counts, "sink_core",
+                          [sink_core for flow, sink_core in self._pairs])
+        counts["num_hops"] = np.tile([sink_hops[pair] for pair in self._pairs],
+                                     self._num_samples)
+
+        # Source counters are repeated for every sink of a flow while sink
+        # counters are specific to each source/sink pair.
+        flow_nums = {flow: num for num, flow in enumerate(self._flows)}
+        pair_flow_nums = np.array([flow_nums[flow] for flow in pair_flows],
+                                  dtype=int)
+        for counter in counters:
+            if counter.source_counter:
+                selected = self._counter_columns(counter, self._column_flow)
+                flow_sums = _sum_columns(self._sample_columns(selected),
+                                         self._column_flow[selected],
+                                         len(self._flows))
+                counts[counter.name] = flow_sums[:, pair_flow_nums].ravel()
+            else:
+                counts[counter.name] = self._sum_counter(
+                    counter, self._column_pair, num_sinks)
 
         return counts
 
-    def router_counters(self):
+    @_memoised
+    def latency_histograms(self, categorical=False):
+        """Gives the histogram of packet latencies observed by every sink of
+        every flow in the system.
+
+        Latency histograms are recorded when
+        :py:attr:`Experiment.record_latency` is enabled. Only packets carrying
+        a payload (see :py:attr:`Flow.use_payload`) contribute to the
+        histograms.
+
+        The output of this method has one row per histogram bin for each
+        source/sink pair. In addition to the standard fields, the output of
+        this method has:
+
+        'flow'
+            The :py:class:`Flow` object associated with each result.
+        'source_core'
+            The source :py:class:`Core` object.
+        'sink_core'
+            The sink :py:class:`Core` object.
+        'bin'
+            The bin number, starting from zero.
+        'latency'
+            The lower bound (in seconds) of the latencies counted by the bin.
+            The final bin counts all packets whose latency was at least this
+            value.
+        'count'
+            The number of packets whose latency fell within the bin.
+        """
+        num_bins = self._experiment._get_option_value("latency_bins")
+        bin_width = self._experiment._get_option_value("latency_bin_width")
+
+        if Counters.latency in self._recorded_histograms:
+            pairs = [(flow, sink_core)
+                     for flow in self._flows
+                     for sink_core in flow.sinks]
+        else:
+            pairs = []
+
+        num_rows = len(pairs) * num_bins
+        histograms = self._make_result_array([("flow", object, self._flows),
+                                              ("source_core", object,
+                                               self._cores),
+                                              ("sink_core", object,
+                                               self._cores),
+                                              ("bin", np.uint),
+                                              ("latency", np.double),
+                                              "count"],
+                                             rows_per_sample=num_rows,
+                                             categorical=categorical)
+        if not pairs:
+            return histograms
+
+        self._set_objects(histograms, "flow",
+                          [flow for flow, sink_core in pairs
+                           for _ in range(num_bins)])
+        self._set_objects(histograms, "source_core",
+                          [flow.source for flow, sink_core in pairs
+                           for _ in range(num_bins)])
+        self._set_objects(histograms, "sink_core",
+                          [sink_core for flow, sink_core in pairs
+                           for _ in range(num_bins)])
+        histograms["bin"] = np.tile(np.arange(num_bins),
+                                    len(pairs) * self._num_samples)
+        histograms["latency"] = histograms["bin"] * bin_width
+
+        # Histogram bins are recorded in consecutive columns
+        self._index_columns()
+        counts = []
+        for flow, sink_core in pairs:
+            first_column = self._histogram_offsets[
+                (sink_core, flow, Counters.latency)]
+            counts.append(self._get_core_results(sink_core)[
+                :, first_column:first_column + num_bins])
+        histograms["count"] = np.hstack(counts).ravel()
+
+        return histograms
+
+    @_memoised
+    def round_trip_histograms(self, categorical=False):
+        """Gives the histogram of packet round-trip times observed by the
+        source of every echo flow in the system.
+
+        Round-trip histograms are recorded when
+        :py:attr:`Experiment.record_round_trip` is enabled and only flows
+        created with ``echo=True`` (see :py:meth:`Experiment.new_flow`) are
+        listed. Since the departure and return of each packet are both timed
+        by the source core, these histograms do not depend on the alignment of
+        different cores' clocks. Packets echoed back by every sink of a flow
+        are counted in the same histogram.
+
+        The output of this method has one row per histogram bin for each echo
+        flow. In addition to the standard fields, the output of this method
+        has:
+
+        'flow'
+            The :py:class:`Flow` object associated with each result.
+        'source_core'
+            The source :py:class:`Core` object.
+        'bin'
+            The bin number, starting from zero.
+        'round_trip'
+            The lower bound (in seconds) of the round-trip times counted by
+            the bin. The final bin counts all packets whose round-trip time
+            was at least this value.
+        'count'
+            The number of packets whose round-trip time fell within the bin.
+        """
+        num_bins = self._experiment._get_option_value("latency_bins")
+        bin_width = self._experiment._get_option_value("latency_bin_width")
+
+        if Counters.round_trip in self._recorded_histograms:
+            flows = [flow for flow in self._flows if flow.echo]
+        else:
+            flows = []
+
+        num_rows = len(flows) * num_bins
+        histograms = self._make_result_array([("flow", object, self._flows),
+                                              ("source_core", object,
+                                               self._cores),
+                                              ("bin", np.uint),
+                                              ("round_trip", np.double),
+                                              "count"],
+                                             rows_per_sample=num_rows,
+                                             categorical=categorical)
+        if not flows:
+            return histograms
+
+        self._set_objects(histograms, "flow",
+                          [flow for flow in flows for _ in range(num_bins)])
+        self._set_objects(histograms, "source_core",
+                          [flow.source for flow in flows
+                           for _ in range(num_bins)])
+        histograms["bin"] = np.tile(np.arange(num_bins),
+                                    len(flows) * self._num_samples)
+        histograms["round_trip"] = histograms["bin"] * bin_width
+
+        # Histogram bins are recorded in consecutive columns
+        self._index_columns()
+        counts = []
+        for flow in flows:
+            first_column = self._histogram_offsets[
+                (flow.source, flow, Counters.round_trip)]
+            counts.append(self._get_core_results(flow.source)[
+                :, first_column:first_column + num_bins])
+        histograms["count"] = np.hstack(counts).ravel()
+
+        return histograms
+
+    @_memoised
+    def router_counters(self, categorical=False):
         """Gives the router and reinjector counter values for every chip in the
         system.
 
@@ -373,13 +1107,13 @@ class Results(object):
         totals = self._make_result_array(
             ["x", "y"] + [c.name for c in self._recorded
                           if c.router_counter or c.reinjector_counter],
-            rows_per_sample=num_chips)
+            rows_per_sample=num_chips, categorical=categorical)
 
         for chip_num, ((y, x), core) in \
                 enumerate(sorted((self._placements[c][::-1], c)
                                  for c in self._router_recording_cores)):
             records = self._cores_records[core]
-            results = self._cores_results[core]
+            results = self._get_core_results(core)
             totals[chip_num::num_chips]["x"] = x
             totals[chip_num::num_chips]["y"] = y
             for result_column, (obj, counter) in enumerate(records):
@@ -389,21 +1123,625 @@ class Results(object):
 
         return totals
 
+    @_memoised
+    def link_loads(self, categorical=False):
+        """Gives the number of packets which passed over every link used by
+        the flows in the system.
+
+        The load on each link is computed from the routes of each flow and
+        the number of packets sent by each flow (and so requires
+        :py:attr:`Experiment.record_sent` to be enabled, otherwise the output
+        has no rows). Packets are assumed to traverse every link of their
+        flow's route: packets dropped in the network are not accounted for.
+
+        Packets echoed back to the source of an echo flow (see
+        :py:meth:`Experiment.new_flow`) are included: each sink is assumed to
+        echo every packet it received (requiring
+        :py:attr:`Experiment.record_received` to be enabled, otherwise echoed
+        packets are not counted) along the route back to the flow's source.
+
+        The output of this method has one row per link used by any flow. In
+        addition to the standard fields, the output of this method has:
+
+        'x'
+            The X-coordinate of the chip the link leaves.
+        'y'
+            The Y-coordinate of the chip the link leaves.
+        'link'
+            The :py:class:`rig.links.Links` direction of the link.
+        'packets'
+            The number of packets sent over the link.
+        """
+        if Counters.sent in self._recorded:
+            links, entry_flows, entry_links = self._get_link_incidence()
+        else:
+            links, entry_flows, entry_links = [], [], []
+
+        num_links = len(links)
+        loads = self._make_result_array(["x", "y",
+                                         ("link", object, list(Links)),
+                                         "packets"],
+                                        rows_per_sample=num_links,
+                                        categorical=categorical)
+        if not links:
+            return loads
+
+        loads["x"] = np.tile([x for (x, y), link in links], self._num_samples)
+        loads["y"] = np.tile([y for (x, y), link in links], self._num_samples)
+        self._set_objects(loads, "link", [link for xy, link in links])
+
+        # The packets sent by each flow (and echoed by each sink of an echo
+        # flow) are summed into every link it uses
+        self._index_columns()
+        flow_packets = self._sum_counter(
+            Counters.sent, self._column_flow,
+            len(self._flows)).reshape((self._num_samples, len(self._flows)))
+        if self._reply_pairs:
+            pair_nums = {pair: num for num, pair in enumerate(self._pairs)}
+            pair_received = self._sum_counter(
+                Counters.received, self._column_pair,
+                len(self._pairs)).reshape((self._num_samples,
+                                           len(self._pairs)))
+            flow_packets = np.hstack([
+                flow_packets,
+                pair_received[:, [pair_nums[pair]
+                                  for pair in self._reply_pairs]]])
+        loads["packets"] = _sum_columns(flow_packets[:, entry_flows],
+                                        entry_links, num_links).ravel()
+
+        return loads
+
+    def _get_link_incidence(self):
+        """Get the (sparse) incidence of flows on links (if not already built).
+
+        The flows are those in ``_flows`` followed by the flows which carry
+        echoed packets back from each (flow, sink_core) pair listed in
+        ``_reply_pairs``. See :py:func:`link_incidence`.
+        """
+        if self._link_incidence is None:
+            reply_flows = [
+                (pair, reply_flow)
+                for pair, reply_flow in iteritems(
+                    self._experiment._reply_flows)
+                if reply_flow in self._routes]
+            self._reply_pairs = [pair for pair, reply_flow in reply_flows]
+            self._link_incidence = link_incidence(
+                list(self._flows) +
+                [reply_flow for pair, reply_flow in reply_flows],
+                self._routes)
+        return self._link_incidence
+
+    def router_counters_tensor(self, counters=None):
+        """Gives the router and reinjector counter values for every chip in the
+        system as a dense array.
+
+        Unlike :py:meth:`.router_counters`, which gives a row for each chip,
+        this method produces an array which may be indexed by chip
+        coordinates, e.g. for plotting heatmaps of the machine.
+
+        Parameters
+        ----------
+        counters : [:py:class:`Counters`, ...] or None
+            The counters to include (in the order given). If None, all
+            recorded router- and reinjector-specific counters are included in
+            the order they appear in the output of :py:meth:`.router_counters`.
+
+        Returns
+        -------
+        :py:class:`numpy.ndarray`
+            A (num_samples, num_counters, height, width) array where the
+            value of counter ``c`` for the chip at (x, y) in sample ``s`` is
+            given by ``array[s, c, y, x]``. The array covers all chips up to
+            the largest coordinates of any chip whose router counters were
+            recorded. The values for chips whose counters were not recorded
+            are NaN.
+        """
+        if counters is None:
+            counters = [c for c in self._recorded
+                        if c.router_counter or c.reinjector_counter]
+
+        chips = [self._placements[c] for c in self._router_recording_cores]
+        width = max(x for x, y in chips) + 1 if chips else 0
+        height = max(y for x, y in chips) + 1 if chips else 0
+        tensor = np.full((self._num_samples, len(counters), height, width),
+                         np.nan)
+
+        self._index_columns()
+        for counter_num, counter in enumerate(counters):
+            selected = self._column_counter == _COUNTER_NUMS[counter]
+            chips = np.array([obj for core, obj
+                              in self._column_objects(selected)],
+                             dtype=int).reshape((-1, 2))
+            tensor[:, counter_num, chips[:, 1], chips[:, 0]] = \
+                self._sample_columns(selected)
+
+        return tensor
+
+    def flow_totals_tensor(self, counters=None):
+        """Gives the counter totals for each flow as a dense array.
+
+        The values are the same as those given by :py:meth:`.flow_totals`
+        but are produced directly as an array, without the standard fields.
+
+        Parameters
+        ----------
+        counters : [:py:class:`Counters`, ...] or None
+            The counters to include (in the order given). If None, all
+            recorded flow-specific counters are included in the order they
+            appear in the output of :py:meth:`.flow_totals`.
+
+        Returns
+        -------
+        :py:class:`numpy.ndarray`
+            A (num_samples, num_counters, num_flows) array. Flows are given
+            in the order they were created.
+        """
+        if counters is None:
+            counters = [c for c in self._recorded
+                        if c.source_counter or c.sink_counter]
+
+        num_flows = len(self._flows)
+        tensor = np.zeros((self._num_samples, len(counters), num_flows),
+                          dtype=np.double)
+
+        self._index_columns()
+        for counter_num, counter in enumerate(counters):
+            tensor[:, counter_num, :] = self._sum_counter(
+                counter, self._column_flow, num_flows).reshape(
+                    (self._num_samples, num_flows))
+
+        return tensor
+
+    def query(self, counter, groups=None, cores=None, flows=None, chips=None,
+              time=None, categorical=False):
+        """Get the values of a single counter recorded by a subset of the
+        system over a subset of the experiment.
+
+        Unlike the other methods of this class, which produce complete
+        tables, this method gathers just the requested values making it
+        suitable for interactively examining results of very large
+        experiments.
+
+        The output of this method has one row per recorded value of the
+        counter (e.g. one for each sink of each flow when querying
+        :py:attr:`~Counters.received`) for each selected sample. In addition
+        to the standard fields, the output of this method has:
+
+        'core'
+            The :py:class:`Core` object which recorded the value.
+        'object'
+            The :py:class:`Flow` object for flow counters, the (x, y)
+            coordinates of the chip for router and reinjector counters or the
+            :py:class:`Core` for other counters.
+        'value'
+            The recorded value.
+
+        Parameters
+        ----------
+        counter : :py:class:`Counters` or str
+            The counter (or name of the counter) to get the values of.
+            Histogram counters (e.g. :py:attr:`~Counters.latency`) are not
+            supported.
+        groups : [:py:class:`Group`, ...] or None
+            If not None, only include samples recorded during these groups.
+        cores : [:py:class:`Core`, ...] or None
+            If not None, only include values recorded by these cores.
+        flows : [:py:class:`Flow`, ...] or None
+            If not None, only include values recorded for these flows.
+        chips : [(x, y), ...] or None
+            If not None, only include values recorded on these chips.
+        time : (start, end) or None
+            If not None, only include samples whose 'time' falls within this
+            (inclusive) range.
+        categorical : bool
+            If True, produce categorical output (see :py:class:`Results`).
+
+        Raises
+        ------
+        ValueError
+            If a histogram counter is given.
+        """
+        if not isinstance(counter, Counters):
+            counter = Counters[counter]
+        if counter.histogram_counter:
+            raise ValueError(
+                "Histogram counters cannot be queried, "
+                "use latency_histograms or round_trip_histograms.")
+
+        # Select the columns of the sample matrix
+        self._index_columns()
+        selected = self._column_counter == _COUNTER_NUMS[counter]
+        if cores is not None:
+            cores = set(cores)
+            selected &= np.in1d(self._column_source, [
+                source for source, core in enumerate(self._source_cores)
+                if core in cores])
+        if chips is not None:
+            chips = set(chips)
+            selected &= np.in1d(self._column_source, [
+                source for source, core in enumerate(self._source_cores)
+                if self._placements.get(core) in chips])
+        if flows is not None:
+            flows = set(flows)
+            selected &= np.in1d(self._column_flow, [
+                flow_num for flow_num, flow in enumerate(self._flows)
+                if flow in flows])
+        columns = self._column_objects(selected)
+
+        # Select the samples
+        included = np.ones(self._num_samples, dtype=bool)
+        if groups is not None:
+            groups = set(groups)
+            included &= np.in1d(self._sample_groups, [
+                group_num for group_num, group in enumerate(self._groups)
+                if group in groups])
+        if time is not None:
+            start, end = time
+            included &= ((self._common["time"] >= start) &
+                         (self._common["time"] <= end))
+        samples = np.flatnonzero(included)
+
+        core_categories = list(OrderedDict((c[0], None) for c in columns))
+        object_categories = list(OrderedDict((c[1], None) for c in columns))
+        values = self._make_result_array([("core", object, core_categories),
+                                          ("object", object,
+                                           object_categories),
+                                          "value"],
+                                         rows_per_sample=len(columns),
+                                         categorical=categorical,
+                                         samples=samples)
+        self._set_objects(values, "core", [c[0] for c in columns])
+        self._set_objects(values, "object", [c[1] for c in columns])
+        values["value"] = self._sample_columns(selected, samples).ravel()
+
+        return values
+
+    cache_size = 256 * 1024 * 1024
+    """The maximum total size (in bytes) of the result tables cached. This
+    may be changed for an individual :py:class:`Results` object or for all
+    of them. Zero disables caching."""
+
+    def clear_cache(self):
+        """Discard all cached result tables.
+
+        Arrays already returned remain valid.
+        """
+        self._table_cache.clear()
+
+    TABLES = ("totals", "core_totals", "flow_totals", "flow_counters",
+              "latency_histograms", "round_trip_histograms",
+              "router_counters", "link_loads", "counter_statistics")
+    """The names of the methods of this class which produce result tables."""
+
+    def save_columnar(self, path, tables=TABLES):
+        """Save result tables in a compact columnar binary format.
+
+        Each column of each table is saved in categorical form (see above) in
+        a separate ``.npy`` file within the directory given. Metadata giving
+        the categories of every dictionary-encoded column (with groups,
+        cores and flows represented by name) along with the labels of every
+        group and the placement of every core is saved alongside. The tables
+        may be reloaded (without needing the original :py:class:`Experiment`)
+        using :py:func:`load_columnar`.
+
+        Parameters
+        ----------
+        path : str
+            The directory to save the tables in.
+        tables : [name, ...]
+            The names of the tables (i.e. methods of this class) to save.
+            Defaults to all tables.
+        """
+        save_columnar(path,
+                      OrderedDict((table, getattr(self, table)(
+                          categorical=True)) for table in tables),
+                      self._groups, self._cores, self._flows,
+                      self._placements)
+
+    def save(self, filename):
+        """Save the raw results to a file.
+
+        The raw data read back from the machine is saved along with the
+        experiment's parameters, placements and routes such that an identical
+        :py:class:`Results` object can be reconstructed later (e.g. on another
+        computer without access to the machine) using
+        :py:func:`load_results`.
+
+        Parameters
+        ----------
+        filename : str
+        """
+        with open(filename, "wb") as f:
+            pickle.dump(RESULTS_FORMAT_VERSION, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    def __getstate__(self):
+        # Only the raw data is pickled, everything else is reconstructed. The
+        # raw data of cores already decoded is no longer available and so
+        # just their error status is pickled along with the decoded values.
+        cores_result_data = {
+            core: (data.tobytes() if isinstance(data, np.ndarray) else data)
+            for core, data in iteritems(self._cores_result_data)}
+        cores_decoded = {}
+        for core, results in iteritems(self._cores_results):
+            cores_result_data[core] = struct.pack(
+                "<I", sum(self._cores_errors[core]))
+            if self._aggregate_recording:
+                cores_decoded[core] = self._cores_aggregates[core]
+            else:
+                cores_decoded[core] = results
+        return {"experiment": self._experiment,
+                "cores": self._cores,
+                "flows": self._flows,
+                "cores_records": self._cores_records,
+                "router_recording_cores": self._router_recording_cores,
+                "placements": self._placements,
+                "routes": self._routes,
+                "cores_result_data": cores_result_data,
+                "groups": self._groups,
+                "profile": self.profile,
+                "cores_decoded": cores_decoded}
+
+    def __setstate__(self, state):
+        cores_decoded = state.pop("cores_decoded", {})
+        self.__init__(**state)
+        for core, decoded in iteritems(cores_decoded):
+            del self._cores_result_data[core]
+            if self._aggregate_recording:
+                self._cores_aggregates[core] = decoded
+                decoded = decoded[0]
+            self._cores_results[core] = decoded
+
     def __repr__(self):
         return "<{}{}>".format(self.__class__.__name__,
                                " (errors occurred during experiment)"
                                if self.errors else "")
 
 
+def load_results(filename):
+    """Load raw results saved by :py:meth:`Results.save`.
+
+    No connection to a SpiNNaker machine is required. The
+    :py:class:`Experiment` associated with the loaded results may be inspected
+    but may not be run.
+
+    .. warning::
+        Saved results are stored using Python's :py:mod:`pickle` module and so
+        only files from trusted sources should be loaded.
+
+    Parameters
+    ----------
+    filename : str
+
+    Returns
+    -------
+    :py:class:`Results`
+    """
+    with open(filename, "rb") as f:
+        format_version = pickle.load(f)
+        if not 1 <= format_version <= RESULTS_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported results file format version {}.".format(
+                    format_version))
+
+        return pickle.load(f)
+
+
+def link_incidence(flows, routes):
+    """Determine the links used by a set of flows.
+
+    The result is a sparse flow-by-link incidence matrix in coordinate form.
+
+    Parameters
+    ----------
+    flows : [:py:class:`Flow`, ...]
+    routes : {:py:class:`Flow`: \
+              :py:class:`rig.place_and_route.routing_tree.RoutingTree`, \
+              ...}
+
+    Returns
+    -------
+    links : [((x, y), :py:class:`rig.links.Links`), ...]
+        Every link used by any flow, sorted by chip and link.
+    entry_flows : :py:class:`numpy.ndarray`
+        The index (into flows) of the flow of each non-zero entry.
+    entry_links : :py:class:`numpy.ndarray`
+        The index (into links) of the link of each non-zero entry.
+    """
+    entries = []
+    for flow_num, flow in enumerate(flows):
+        route = routes.get(flow)
+        if route is None:
+            continue
+        for _, xy, directions in route.traverse():
+            entries.extend((flow_num, (xy, Links(direction)))
+                           for direction in directions
+                           if direction.is_link)
+
+    links = sorted(set(link for flow_num, link in entries))
+    link_nums = {link: num for num, link in enumerate(links)}
+    entry_flows = np.array([flow_num for flow_num, link in entries],
+                           dtype=int)
+    entry_links = np.array([link_nums[link] for flow_num, link in entries],
+                           dtype=int)
+    return links, entry_flows, entry_links
+
+
+def _sum_columns(values, column_ids, num_ids):
+    """Sum together the columns of a 2D array which share the same ID.
+
+    Parameters
+    ----------
+    values : :py:class:`numpy.ndarray`
+        A (num_samples, num_columns) array.
+    column_ids : :py:class:`numpy.ndarray`
+        The ID (from 0 to num_ids - 1) of each column.
+    num_ids : int
+
+    Returns
+    -------
+    :py:class:`numpy.ndarray`
+        A (num_samples, num_ids) array giving the sum of the columns with each
+        ID.
+    """
+    # Narrower integer types (e.g. values used in-place from raw result data)
+    # are summed as full-width integers to avoid overflow.
+    sums = np.zeros((values.shape[0], num_ids),
+                    dtype=np.promote_types(values.dtype, np.uint))
+    if values.shape[1] == 0:
+        return sums
+
+    # Sort the columns by ID and sum each run of columns with the same ID
+    order = np.argsort(column_ids, kind="mergesort")
+    column_ids = column_ids[order]
+    starts = np.flatnonzero(np.concatenate(
+        ([True], column_ids[1:] != column_ids[:-1])))
+    sums[:, column_ids[starts]] = np.add.reduceat(values[:, order], starts,
+                                                  axis=1, dtype=sums.dtype)
+    return sums
+
+
+def _object_array(objects):
+    """Produce a 1D object array containing the supplied objects (which may
+    include tuples)."""
+    a = np.empty((len(objects), ), dtype=object)
+    for i, obj in enumerate(objects):
+        a[i] = obj
+    return a
+
+
+def _categorical_dtype(categories):
+    """Get the dtype of a categorical field whose values are codes into the
+    supplied list of categories."""
+    return np.dtype(np.uint32, metadata={"categories": list(categories)})
+
+
+def decode_compact(data, num_samples, num_values):
+    """Decode a set of compactly recorded samples.
+
+    Parameters
+    ----------
+    data : bytes
+        The compactly recorded data: a 32-bit word giving the number of bytes
+        of value data, the width tags for every sample and then the value data
+        (see :py:meth:`.Commands.compact_recording`).
+    num_samples : int
+        The number of samples recorded.
+    num_values : int
+        The number of values in each sample.
+
+    Returns
+    -------
+    :py:class:`numpy.ndarray`
+        A (num_samples, num_values) array of the decoded values.
+    """
+    if num_values == 0:
+        return np.zeros((num_samples, 0), dtype=np.uint)
+
+    num_bytes = struct.unpack("<I", data[0:4])[0]
+    num_tag_words = compact_tag_words(num_values)
+    tags_end = 4 + (num_samples * num_tag_words * 4)
+    tags = np.frombuffer(data[4:tags_end], dtype=uint32_le)
+    tags = tags.reshape((num_samples, num_tag_words))
+
+    # Width (in bytes) of every value
+    value_nums = np.arange(num_values)
+    widths = np.array([0, 1, 2, 4])[
+        (tags[:, value_nums // 16] >> ((value_nums % 16) * 2)) & 0x3]
+
+    # Offset of every value in the data, each sample being padded to a whole
+    # number of words.
+    value_ends = np.cumsum(widths, axis=1)
+    sample_sizes = ((value_ends[:, -1:] + 3) // 4) * 4
+    sample_offsets = np.cumsum(sample_sizes) - sample_sizes[:, 0]
+    offsets = sample_offsets[:, np.newaxis] + value_ends - widths
+
+    # Assemble the little-endian values from their bytes (padding the data
+    # such that zero-width values at the end of the data may be safely
+    # looked up).
+    values_data = np.frombuffer(data[tags_end:tags_end + num_bytes],
+                                dtype=np.uint8)
+    values_data = np.concatenate([values_data, np.zeros(4, dtype=np.uint8)])
+    values = np.zeros((num_samples, num_values), dtype=np.uint)
+    for byte in range(4):
+        present = widths > byte
+        values[present] |= \
+            values_data[offsets[present] + byte].astype(np.uint) << (8 * byte)
+
+    return values
+
+
+def decode_aggregates(data, num_groups, num_values):
+    """Decode a set of aggregated results.
+
+    Parameters
+    ----------
+    data : bytes
+        The aggregated data: :py:data:`.AGGREGATE_WORDS` words for each value
+        for each group (see :py:meth:`.Commands.aggregate_recording`).
+    num_groups : int
+        The number of groups recorded.
+    num_values : int
+        The number of values recorded.
+
+    Returns
+    -------
+    (sums, minimums, maximums, sums_of_squares)
+        Each a (num_groups, num_values) :py:class:`numpy.ndarray`.
+    """
+    num_words = num_groups * num_values * AGGREGATE_WORDS
+    words = np.frombuffer(data[:num_words * 4], dtype=uint32_le)
+    words = words.astype(np.uint).reshape(
+        (num_groups, num_values, AGGREGATE_WORDS))
+
+    return (words[:, :, 0] | (words[:, :, 1] << 32),
+            words[:, :, 2],
+            words[:, :, 3],
+            words[:, :, 4] | (words[:, :, 5] << 32))
+
+
+def to_objects(data):
+    """Convert a structured array produced by :py:class:`Results` in
+    categorical form (see :py:class:`Results`) into the usual form where
+    categorical fields contain the objects themselves.
+
+    Arrays which are not in categorical form are returned unchanged.
+    """
+    categories = {}
+    dtype = []
+    for name in data.dtype.names:
+        metadata = data.dtype[name].metadata
+        if metadata and "categories" in metadata:
+            categories[name] = _object_array(metadata["categories"])
+            dtype.append((name, object))
+        else:
+            dtype.append((name, data.dtype[name]))
+
+    if not categories:
+        return data
+
+    out = np.zeros(data.shape, dtype=dtype)
+    for name in data.dtype.names:
+        if name in categories:
+            out[name] = categories[name][data[name]]
+        else:
+            out[name] = data[name]
+    return out
+
+
 def to_csv(data, header=True, col_sep=",", row_sep="\n", none="NA",
            objects_as_name=True):
     """Render a structured array produced :py:class:`Results` as a CSV complete
     with headings.
 
+    For large tables, consider using :py:func:`write_csv` which writes the CSV
+    directly to a file rather than building it in memory.
+
     Parameters
     ----------
     data : :py:class:`np.ndarray`
-        A structured array produced by :py:class:`Results`.
+        A structured array produced by :py:class:`Results` (in either the
+        usual or categorical form).
     header : bool
         If True, column headings are included in the output. If False, they are
         omitted.
@@ -418,26 +1756,66 @@ def to_csv(data, header=True, col_sep=",", row_sep="\n", none="NA",
         object in the table of results will be represented by its name
         attribute rather than the str() of the object.
     """
-    from network_tester.experiment import Group, Core, Flow
+    out = StringIO()
+    write_csv(data, out, header, col_sep, row_sep, none, objects_as_name)
+    return(out.getvalue().rstrip())
+
+
+def write_csv(data, f, header=True, col_sep=",", row_sep="\n", none="NA",
+              objects_as_name=True, chunk_size=65536):
+    """Write a structured array produced :py:class:`Results` to a file as a
+    CSV complete with headings.
+
+    The CSV is produced in the same format as :py:func:`to_csv` (except that
+    every row, including the last, is followed by row_sep) but is written a
+    chunk of rows at a time with numerical columns formatted in bulk. This
+    allows very large tables to be written quickly and without building the
+    whole CSV in memory.
 
-    data = data.copy()
+    Parameters
+    ----------
+    data : :py:class:`np.ndarray`
+        A structured array produced by :py:class:`Results` (in either the
+        usual or categorical form).
+    f : file-like
+        A file opened in text mode to write the CSV to.
+    header, col_sep, row_sep, none, objects_as_name
+        See :py:func:`to_csv`.
+    chunk_size : int
+        The number of rows to format and write at once.
+    """
+    from network_tester.experiment import Group, Core, Flow
 
-    out = ""
+    def format_object(value):
+        if value is None:
+            return none
+        elif objects_as_name and isinstance(value, (Group, Core, Flow)):
+            return str(value.name)
+        else:
+            return str(value)
+
+    # Categorical fields are formatted by formatting each category just once
+    categories = {}
+    for name in data.dtype.names:
+        metadata = data.dtype[name].metadata
+        if metadata and "categories" in metadata:
+            categories[name] = _object_array(
+                [format_object(c) for c in metadata["categories"]])
 
     # Add column headers
     if header:
-        columns = data.dtype.names
-        out += col_sep.join(columns) + row_sep
+        f.write(col_sep.join(data.dtype.names) + row_sep)
 
     # Add all data reformatting Nones and certain objects as required
-    for row in data:
-        out += col_sep.join(none if value is None else
-                            str(value.name) if (objects_as_name and
-                                                isinstance(value,
-                                                           (Group,
-                                                            Core,
-                                                            Flow))) else
-                            str(value)
-                            for value in row) + row_sep
-
-    return(out.rstrip())
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        columns = []
+        for name in data.dtype.names:
+            if name in categories:
+                columns.append(categories[name][chunk[name]])
+            elif chunk.dtype[name] == object:
+                columns.append([format_object(v) for v in chunk[name]])
+            else:
+                columns.append(chunk[name].astype(str))
+        f.write(row_sep.join(col_sep.join(row) for row in zip(*columns)) +
+                row_sep)
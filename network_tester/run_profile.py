@@ -0,0 +1,335 @@
+"""Timing of the phases of an experimental run.
+
+:py:meth:`.Experiment.run` records the wall-clock time spent in each phase
+of running an experiment (placement, routing, loading, running each group,
+reading back results, etc.) in a :py:class:`RunProfile`, made available as
+the :py:attr:`~.Results.profile` attribute of the results returned (or of
+the :py:exc:`.NetworkTesterError` raised). For example::
+
+    >>> results = e.run()
+    >>> print(results.profile)
+    Phase                 Time (s)   Bytes       SCP ops
+    placement             0.132      0           0
+    ...
+    >>> results.profile.write_chrome_trace("run.json")
+
+The trace written by :py:meth:`RunProfile.write_chrome_trace` may be viewed
+using the ``chrome://tracing`` tool built into Chrome (or
+https://ui.perfetto.dev).
+
+The profiles of previous runs may be used to calibrate a :py:class:`CostModel`
+which :py:meth:`.Experiment.predict_duration` uses to predict how long an
+experiment will take to run::
+
+    >>> cost_model = CostModel.calibrate([results.profile, ...])
+    >>> e.predict_duration(cost_model, slot=3600.0)
+    DurationPrediction(load=12.3, run=1800.2, readback=30.1, total=1842.6, ...)
+"""
+
+import json
+
+import time
+
+from collections import OrderedDict, namedtuple
+
+from contextlib import contextmanager
+
+import numpy as np
+
+
+SCP_DATA_LENGTH = 256
+"""The number of bytes of data carried by each SCP packet, used to estimate
+the number of SCP operations required to transfer data (see
+:py:func:`scp_operations`)."""
+
+
+def scp_operations(num_bytes):
+    """Estimate the number of SCP operations needed to transfer the given
+    number of bytes to or from a SpiNNaker machine."""
+    return max(1, (num_bytes + SCP_DATA_LENGTH - 1) // SCP_DATA_LENGTH)
+
+
+Phase = namedtuple("Phase", "name group start duration num_bytes "
+                            "num_operations")
+"""The timing of a single phase of an experimental run.
+
+Attributes
+----------
+name : str
+    The name of the phase, e.g. "placement" (see :py:class:`RunProfile`).
+group : :py:class:`.Group` or None
+    The group the phase relates to (for "barrier" and "run" phases) or None.
+start : float
+    The time the phase started (in seconds since the start of the run).
+duration : float
+    The wall-clock time taken by the phase (in seconds).
+num_bytes : int
+    The number of bytes transferred to or from the machine during the phase.
+num_operations : int
+    The (estimated) number of SCP operations performed during the phase.
+"""
+
+
+class RunProfile(object):
+    """The wall-clock time taken by each phase of an experimental run.
+
+    The phases of :py:meth:`.Experiment.run`, in the order they occur, are:
+
+    ``"placement"``, ``"allocation"``, ``"routing"``
+        Placement, allocation and routing of cores and flows.
+    ``"table_generation"``, ``"minimisation"``
+        Generation and minimisation of routing tables.
+    ``"command_build"``
+        Generation of the commands loaded onto every core.
+    ``"sdram_allocation"``, ``"upload"``
+        Allocation of SDRAM on the machine and loading of the commands.
+    ``"routing_table_load"``
+        Loading of routing tables.
+    ``"application_load"``
+        Loading of the network tester (and packet reinjector) applications.
+    ``"barrier"``, ``"run"`` (for each group)
+        Waiting for every core to reach the barrier before the group and the
+        time spent waiting for the group to run.
+    ``"exit"``
+        Waiting for every core to finish.
+    ``"readback"``
+        Reading back the recorded results.
+    ``"results"``
+        Preparing the :py:class:`.Results`.
+
+    When an experiment is split across several machine loads, the phases
+    from ``"sdram_allocation"`` to ``"readback"`` are repeated for each load.
+
+    The number of SCP operations performed is estimated from the amount of
+    data transferred by each operation (see :py:func:`scp_operations`).
+
+    Attributes
+    ----------
+    phases : [:py:class:`Phase`, ...]
+        The phases of the run in the order they finished.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self._start = time.time()
+
+        # [num_bytes, num_operations] for the phase currently running
+        self._counts = None
+
+    @contextmanager
+    def phase(self, name, group=None):
+        """Context manager which times a phase of the run."""
+        start = time.time()
+        outer_counts, self._counts = self._counts, [0, 0]
+        try:
+            yield
+        finally:
+            num_bytes, num_operations = self._counts
+            self._counts = outer_counts
+            self.phases.append(Phase(name, group, start - self._start,
+                                     time.time() - start,
+                                     num_bytes, num_operations))
+
+    def count(self, num_bytes=0, num_operations=1):
+        """Add to the bytes transferred and operations performed during the
+        current phase."""
+        if self._counts is not None:
+            self._counts[0] += num_bytes
+            self._counts[1] += num_operations
+
+    @property
+    def duration(self):
+        """The total time spent in all phases (in seconds)."""
+        return sum(phase.duration for phase in self.phases)
+
+    def totals(self):
+        """Get the totals for every phase name (i.e. summing the phases for
+        every group).
+
+        Returns
+        -------
+        OrderedDict([(name, :py:class:`Phase`), ...])
+            The summed :py:class:`Phase` of each name, in the order each
+            first occurred. The group and start fields are those of the first
+            phase with each name.
+        """
+        totals = OrderedDict()
+        for phase in self.phases:
+            if phase.name not in totals:
+                totals[phase.name] = phase._replace(group=None)
+            else:
+                total = totals[phase.name]
+                totals[phase.name] = total._replace(
+                    duration=total.duration + phase.duration,
+                    num_bytes=total.num_bytes + phase.num_bytes,
+                    num_operations=(total.num_operations +
+                                    phase.num_operations))
+        return totals
+
+    def to_chrome_trace(self):
+        """Get the phases in the Chrome trace event format.
+
+        Returns
+        -------
+        dict
+            A JSON-serialisable object in the `Trace Event Format
+            <https://docs.google.com/document/d/
+            1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`_.
+        """
+        events = []
+        for phase in self.phases:
+            args = OrderedDict([("bytes", phase.num_bytes),
+                                ("scp_operations", phase.num_operations)])
+            if phase.group is not None:
+                args["group"] = str(phase.group.name)
+            events.append(OrderedDict([
+                ("name", phase.name),
+                ("cat", "network_tester"),
+                ("ph", "X"),
+                ("ts", phase.start * 1e6),
+                ("dur", phase.duration * 1e6),
+                ("pid", 0),
+                ("tid", 0),
+                ("args", args),
+            ]))
+        return OrderedDict([("traceEvents", events),
+                            ("displayTimeUnit", "ms")])
+
+    def write_chrome_trace(self, filename):
+        """Write the phases to a file in the Chrome trace event format (see
+        :py:meth:`.to_chrome_trace`)."""
+        with open(filename, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def __str__(self):
+        lines = ["{:<22}{:<11}{:<12}{}".format(
+            "Phase", "Time (s)", "Bytes", "SCP ops")]
+        for name, phase in self.totals().items():
+            lines.append("{:<22}{:<11.3f}{:<12}{}".format(
+                name, phase.duration, phase.num_bytes,
+                phase.num_operations))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "<{} {} phases, {:.3f} s>".format(
+            self.__class__.__name__, len(self.phases), self.duration)
+
+
+class CostModel(object):
+    """Per-operation costs used to predict the wall-clock time taken by each
+    phase of an experimental run (see :py:meth:`.Experiment.predict_duration`).
+
+    The time taken by a phase (see :py:class:`RunProfile`) is modelled as::
+
+        per_call + (per_byte * num_bytes) + (per_operation * num_operations)
+
+    Where ``num_bytes`` and ``num_operations`` are the number of bytes
+    transferred and (estimated) SCP operations performed during the phase.
+    Phases which run on the host alone (e.g. ``"placement"``) have a fixed
+    cost. The ``"run"`` phase of each group additionally includes the time the
+    group runs for.
+
+    The default coefficients are rough estimates for a machine connected via
+    Ethernet: models calibrated from the profiles of previous runs on the
+    machine in use (see :py:meth:`.calibrate`) will give better predictions.
+
+    Attributes
+    ----------
+    coefficients : {name: (per_call, per_byte, per_operation), ...}
+        The cost coefficients (in seconds) of each phase.
+    """
+
+    DEFAULT_COEFFICIENTS = {
+        "placement": (0.0, 0.0, 0.0),
+        "allocation": (0.0, 0.0, 0.0),
+        "routing": (0.0, 0.0, 0.0),
+        "table_generation": (0.0, 0.0, 0.0),
+        "minimisation": (0.0, 0.0, 0.0),
+        "command_build": (0.0, 0.0, 0.0),
+        "sdram_allocation": (0.0, 0.0, 1e-3),
+        "upload": (0.0, 0.0, 2e-4),
+        "routing_table_load": (0.0, 0.0, 1e-3),
+        "application_load": (0.5, 0.0, 2e-4),
+        "barrier": (0.05, 0.0, 0.0),
+        "run": (0.0, 0.0, 1e-3),
+        "exit": (0.05, 0.0, 0.0),
+        "readback": (0.0, 0.0, 2e-4),
+        "results": (0.0, 0.0, 0.0),
+    }
+    """The default coefficients used for any phase without coefficients."""
+
+    def __init__(self, coefficients={}):
+        """Create a cost model.
+
+        Parameters
+        ----------
+        coefficients : {name: (per_call, per_byte, per_operation), ...}
+            The coefficients (in seconds) to use for each phase, overriding
+            :py:attr:`DEFAULT_COEFFICIENTS`.
+        """
+        self.coefficients = dict(self.DEFAULT_COEFFICIENTS)
+        self.coefficients.update(coefficients)
+
+    @classmethod
+    def calibrate(cls, profiles):
+        """Calibrate a cost model from the profiles of previous runs.
+
+        The coefficients of each phase are fitted to the durations of the
+        phases recorded in the supplied profiles by (non-negative) least
+        squares. Phases which do not appear in any profile use the default
+        coefficients, as do ``"run"`` phases since the time each group ran for
+        is not recorded in a profile.
+
+        Parameters
+        ----------
+        profiles : [:py:class:`RunProfile`, ...]
+            For example, the :py:attr:`~.Results.profile` of the results of
+            previous runs.
+        """
+        # {name: ([(1, num_bytes, num_operations), ...], [duration, ...])}
+        observations = OrderedDict()
+        for profile in profiles:
+            for phase in profile.phases:
+                if phase.name == "run":
+                    continue
+                rows, durations = observations.setdefault(phase.name,
+                                                          ([], []))
+                rows.append((1.0, phase.num_bytes, phase.num_operations))
+                durations.append(phase.duration)
+
+        return cls({name: _fit_non_negative(np.array(rows, dtype=float),
+                                            np.array(durations, dtype=float))
+                    for name, (rows, durations) in observations.items()})
+
+    def cost(self, name, num_bytes=0, num_operations=0):
+        """Predict the wall-clock time (in seconds) taken by a phase."""
+        per_call, per_byte, per_operation = self.coefficients.get(
+            name, (0.0, 0.0, 0.0))
+        return (per_call +
+                (per_byte * num_bytes) +
+                (per_operation * num_operations))
+
+    def __repr__(self):
+        return "<{} {} phases>".format(self.__class__.__name__,
+                                       len(self.coefficients))
+
+
+def _fit_non_negative(rows, durations):
+    """Fit non-negative coefficients, x, minimising |rows * x - durations|.
+
+    Columns whose unconstrained coefficient would be negative are removed
+    (i.e. fixed at zero) and the remaining columns refitted.
+    """
+    columns = list(range(rows.shape[1]))
+    while True:
+        x = np.linalg.lstsq(rows[:, columns], durations, rcond=-1)[0]
+        if np.all(x >= 0.0):
+            break
+        columns = [c for c, v in zip(columns, x) if v > 0.0]
+        if not columns:
+            break
+
+    coefficients = [0.0] * rows.shape[1]
+    for c, v in zip(columns, x if columns else []):
+        coefficients[c] = float(v)
+    return tuple(coefficients)
@@ -0,0 +1,1091 @@
+"""A discrete-event simulation of the network tester running on SpiNNaker.
+
+:py:class:`Simulator` is a software stand-in for a SpiNNaker machine running
+the network tester application. It takes the same data
+:py:meth:`.Experiment.run` loads onto a machine (the routing tables of every
+chip and the packed :py:class:`.Commands` of every core) and produces the
+result data each core would have written into SDRAM, in exactly the form
+parsed by :py:class:`.Results`. This allows experiments (and host-side tools)
+to be developed without access to a machine and predicted behaviour to be
+compared with measurements.
+
+The commands of every core are interpreted as the network tester application
+would interpret them while packets are carried through a model of the
+multicast network:
+
+* Each router admits at most one packet per router clock cycle from its
+  inputs (each link, each core and the packet reinjector) into a pipeline,
+  taking ``router_pipeline_length`` cycles to pass through it.
+* The packet at the end of the pipeline waits until every link and core it is
+  routed to can accept it, blocking the packets behind it. Packets which wait
+  longer than the router timeout are dropped. Emergency routing is not
+  modelled: a packet is dropped once both wait phases have elapsed.
+* Links carry one packet at a time at ``link_bandwidth`` and the far end of
+  each link buffers a single packet until its router admits it, applying
+  back-pressure to the sending router.
+* Packets arriving from a link which match no routing entry are
+  default-routed to the opposite link. Locally sourced packets which match no
+  entry are dropped.
+* When reinjection is enabled, dropped packets are collected by a reinjector
+  on each chip, queued and fed back into the router as local packets. Packets
+  dropped while the reinjector is still collecting the previous packet are
+  missed.
+* Each core holds one outgoing and one arriving packet. Sending a packet
+  while the outgoing packet is waiting to enter the router fails (and so is
+  blocked or retried) and packets are not removed from the network by cores
+  which are not consuming packets. The time taken to send and handle packets
+  is modelled such that overloaded cores miss timing deadlines.
+
+Since the random number generators and timers of the simulated cores differ
+from those of a real machine, results agree statistically (not exactly) with
+those of a real machine.
+"""
+
+import heapq
+
+import random
+
+import struct
+
+from collections import deque
+
+from six import iteritems, itervalues
+
+from rig.links import Links
+
+from network_tester.commands import NT_CMD, wait_time_decode
+
+from network_tester.counters import Counters
+
+from network_tester.errors import NT_ERR
+
+
+# The default capacities and costs of the modelled hardware. These are shared
+# with the fast model of network_tester.emulator and the loads predicted by
+# Experiment.predict_load so that all three agree.
+_LINK_BANDWIDTH = 250e6
+_ROUTER_FREQUENCY = 133e6
+_CPU_FREQUENCY = 200e6
+_SEND_CYCLES = 60
+_RECEIVE_CYCLES = 120
+
+# The number of bits a packet occupies on a link without and with a payload.
+_PACKET_BITS = 40
+_PAYLOAD_PACKET_BITS = 72
+
+
+class Simulator(object):
+    """A discrete-event simulation of a SpiNNaker machine running the network
+    tester application.
+
+    Typical usage::
+
+        >>> sim = Simulator(system_info, routing_tables,
+        ...                 {(x, y, p): commands.pack(), ...})
+        >>> cores_result_data = sim.run()
+    """
+
+    def __init__(self, system_info, routing_tables, cores_commands,
+                 link_bandwidth=_LINK_BANDWIDTH,
+                 router_frequency=_ROUTER_FREQUENCY,
+                 router_pipeline_length=4,
+                 router_timeout=480,
+                 cpu_frequency=_CPU_FREQUENCY,
+                 send_cycles=_SEND_CYCLES,
+                 receive_cycles=_RECEIVE_CYCLES,
+                 reinject_cycles=100,
+                 reinject_queue_length=64,
+                 seed=None):
+        """Create a new simulation.
+
+        Parameters
+        ----------
+        system_info : \
+                :py:class:`rig.machine_control.machine_controller.SystemInfo`
+            The machine to simulate. Links which are not working (or which
+            lead off the edge of the machine) never accept packets.
+        routing_tables : {(x, y): [\
+                :py:class:`rig.routing_table.RoutingTableEntry`, ...], ...}
+            The multicast routing table loaded into each router.
+        cores_commands : {(x, y, p): bytes or :py:class:`.Commands`, ...}
+            For each core running the network tester application, the packed
+            command stream loaded into its SDRAM (including the length
+            prefix), or the :py:class:`.Commands` themselves.
+        link_bandwidth : float
+            The bandwidth of each chip-to-chip link in bits per second. A
+            packet occupies a link for 40 bits (72 with a payload).
+        router_frequency : float
+            The router clock frequency in Hz. Routers admit one packet into
+            their pipeline per cycle and timeouts are given in cycles.
+        router_pipeline_length : int
+            The number of packets which may be in a router's pipeline and the
+            number of cycles taken to pass through it.
+        router_timeout : int
+            The number of router cycles a packet may wait before being dropped
+            until changed by a router timeout command.
+        cpu_frequency : float
+            The CPU clock frequency in Hz. The timing values recorded by each
+            core are given in cycles of this clock.
+        send_cycles : int
+            The number of CPU cycles spent on each attempt to send a packet.
+        receive_cycles : int
+            The number of CPU cycles spent handling each arriving packet.
+        reinject_cycles : int
+            The number of CPU cycles the reinjector spends collecting each
+            dropped packet.
+        reinject_queue_length : int
+            The number of dropped packets the reinjector can queue.
+        seed : int or None
+            Seed for the random number generator of each core, used until
+            the core's commands set a seed. If None, a random seed is used.
+        """
+        self.system_info = system_info
+        self.link_bandwidth = link_bandwidth
+        self.router_pipeline_length = router_pipeline_length
+        self.cpu_frequency = cpu_frequency
+
+        # Times are kept in ns
+        self._router_cycle = 1e9 / router_frequency
+        self._send_time = send_cycles * 1e9 / cpu_frequency
+        self._receive_time = receive_cycles * 1e9 / cpu_frequency
+        self._reinject_time = reinject_cycles * 1e9 / cpu_frequency
+        self._reinject_queue_length = reinject_queue_length
+
+        # The event queue: a heap of (time, sequence, function, args) where
+        # the sequence number preserves the order in which simultaneous events
+        # were scheduled.
+        self._events = []
+        self._num_events = 0
+        self._now = 0.0
+
+        self._routers = {
+            xy: _Router(self, xy, routing_tables.get(xy, []),
+                        router_timeout)
+            for xy in system_info}
+        for (x, y), router in iteritems(self._routers):
+            chip_info = system_info[(x, y)]
+            for link in Links:
+                if link in chip_info.working_links:
+                    dx, dy = link.to_vector()
+                    router.neighbours[link] = self._routers.get(
+                        ((x + dx) % system_info.width,
+                         (y + dy) % system_info.height))
+
+        rng = random.Random(seed)
+        self._cores = {}
+        for (x, y, p), commands in iteritems(cores_commands):
+            if not isinstance(commands, bytes):
+                commands = commands.pack()
+            core = _Core(self, self._routers[(x, y)], p,
+                         decode_commands(commands), rng.getrandbits(32))
+            self._cores[(x, y, p)] = core
+            self._routers[(x, y)].cores[p] = core
+
+        # The cores waiting at the current synchronisation barrier
+        self._barrier = []
+
+    @property
+    def time(self):
+        """The current simulation time in seconds."""
+        return self._now / 1e9
+
+    def run(self):
+        """Run the simulation until every core has exited and the network is
+        empty.
+
+        Returns
+        -------
+        {(x, y, p): bytes, ...}
+            The result data written into SDRAM by each core, starting with
+            its error word. This is the data read back by
+            :py:meth:`.Experiment.run` and parsed by :py:class:`.Results`.
+        """
+        for core in itervalues(self._cores):
+            self._schedule(0.0, core.resume)
+
+        events = self._events
+        while events:
+            self._now, _, function, args = heapq.heappop(events)
+            function(*args)
+
+        return {xyp: core.result_data()
+                for xyp, core in iteritems(self._cores)}
+
+    def _schedule(self, time, function, *args):
+        """Call function(*args) at the specified time (in ns)."""
+        heapq.heappush(self._events,
+                       (time, self._num_events, function, args))
+        self._num_events += 1
+
+    def _reach_barrier(self, core):
+        """Called when a core reaches a synchronisation barrier."""
+        self._barrier.append(core)
+        self._release_barrier()
+
+    def _release_barrier(self):
+        """Release the cores waiting at the barrier once every core which has
+        not exited has reached it."""
+        if not self._barrier:
+            return
+        if len(self._barrier) == sum(not core.exited
+                                     for core in itervalues(self._cores)):
+            barrier, self._barrier = self._barrier, []
+            for core in barrier:
+                self._schedule(self._now, core.resume)
+
+
+# Router inputs are numbered as rig.routing_table.Routes: links 0-5 and cores
+# 6-23. The reinjector is given its own input.
+_REINJECTOR_INPUT = 24
+_NUM_INPUTS = 25
+
+# Indices of the router and reinjector counters (by bit number).
+_LOCAL_MULTICAST = Counters.local_multicast.bit_length() - 1
+_EXTERNAL_MULTICAST = Counters.external_multicast.bit_length() - 1
+_DROPPED_MULTICAST = Counters.dropped_multicast.bit_length() - 1
+_REINJECTED = 0
+_REINJECT_OVERFLOW = 1
+_REINJECT_MISSED = 2
+
+
+class _Router(object):
+    """The model of a single chip's router and packet reinjector."""
+
+    def __init__(self, sim, xy, routing_table, timeout):
+        self.sim = sim
+        self.xy = xy
+
+        # [(key, mask, (route, ...)), ...]
+        self.entries = [(entry.key, entry.mask,
+                         tuple(sorted(int(r) for r in entry.route)))
+                        for entry in routing_table]
+        self.lookup_cache = {}
+
+        # Only the bits of the key examined by some routing entry affect
+        # routing decisions.
+        self.key_mask = 0
+        for _, mask, _ in self.entries:
+            self.key_mask |= mask
+
+        # {link: _Router or None, ...} for working links
+        self.neighbours = {}
+
+        # {p: _Core, ...}
+        self.cores = {}
+
+        # The packet held by each input (or None) and the time at which it
+        # arrived (or will arrive, for packets in transit over a link).
+        self.inputs = [None] * _NUM_INPUTS
+        self.input_arrival = [0.0] * _NUM_INPUTS
+        self.num_inputs = 0
+        self.next_input = 0
+
+        # The packets in the pipeline: deque([(ready_time, packet, input,
+        # routes), ...]).
+        self.pipeline = deque()
+        self.next_admit = 0.0
+
+        # The time at which each link finishes transmitting its last packet
+        self.link_free = [0.0] * 6
+
+        # Router control register wait fields and the values saved by the
+        # last router timeout command.
+        self.wait1 = timeout
+        self.wait2 = 0
+        self.old_wait = (self.wait1, self.wait2)
+
+        self.reinject = False
+        self.reinject_dump = None
+        self.reinject_queue = deque()
+
+        self.counters = [0] * 16
+        self.reinjector_counters = [0] * 3
+
+        # The times at which a call to service is already scheduled
+        self.wakeups = set()
+
+    @property
+    def timeout(self):
+        """The time (in ns) a packet may wait before being dropped."""
+        return (self.wait1 + self.wait2) * self.sim._router_cycle
+
+    def set_router_timeout(self, control):
+        """Set the wait fields from a router control register value."""
+        self.old_wait = (self.wait1, self.wait2)
+        self.wait1 = wait_time_decode((control >> 16) & 0xFF)
+        self.wait2 = wait_time_decode((control >> 24) & 0xFF)
+
+    def restore_router_timeout(self):
+        self.wait1, self.wait2 = self.old_wait
+
+    def wake(self, time=None):
+        """Schedule the router to be serviced (now by default)."""
+        if time is None:
+            time = self.sim._now
+        if time not in self.wakeups:
+            self.wakeups.add(time)
+            self.sim._schedule(time, self.service, time)
+
+    def inject(self, input, packet, arrival=None):
+        """Place a packet in an (empty) input."""
+        if arrival is None:
+            arrival = self.sim._now
+        self.inputs[input] = packet
+        self.input_arrival[input] = arrival
+        self.num_inputs += 1
+        self.wake(arrival)
+
+    def route(self, key, input):
+        """Get the routes a packet with the given key arriving at the given
+        input takes or None if it is to be dropped."""
+        masked_key = key & self.key_mask
+        try:
+            routes = self.lookup_cache[masked_key]
+        except KeyError:
+            routes = None
+            for entry_key, mask, entry_routes in self.entries:
+                if key & mask == entry_key:
+                    routes = entry_routes
+                    break
+            self.lookup_cache[masked_key] = routes
+
+        if routes is None and input < 6:
+            # Default route
+            return ((input + 3) % 6, )
+        else:
+            return routes
+
+    def service(self, time):
+        """Move packets through the router as far as possible."""
+        self.wakeups.discard(time)
+        now = self.sim._now
+        pipeline = self.pipeline
+
+        progress = True
+        while progress:
+            progress = False
+
+            # Send (or drop) the packet at the end of the pipeline
+            if pipeline and pipeline[0][0] <= now:
+                ready, packet, input, routes = pipeline[0]
+                if routes is None:
+                    self.drop(packet)
+                    pipeline.popleft()
+                    progress = True
+                elif self.emit(packet, routes):
+                    pipeline.popleft()
+                    progress = True
+                elif now >= ready + self.timeout:
+                    self.drop(packet)
+                    pipeline.popleft()
+                    progress = True
+
+            # Admit a new packet into the pipeline
+            if (self.num_inputs and
+                    len(pipeline) < self.sim.router_pipeline_length and
+                    now >= self.next_admit):
+                progress = self.admit(now) or progress
+
+        # Schedule the next time something can happen
+        if pipeline:
+            ready = pipeline[0][0]
+            if ready > now:
+                self.wake(ready)
+            else:
+                # Blocked: drop the packet if it is still blocked once the
+                # timeout has elapsed.
+                self.wake(max(ready + self.timeout, now))
+        if (self.num_inputs and
+                len(pipeline) < self.sim.router_pipeline_length):
+            if self.next_admit > now:
+                self.wake(self.next_admit)
+
+    def admit(self, now):
+        """Admit the next waiting input packet into the pipeline (choosing
+        inputs in round-robin order). Returns True if a packet was
+        admitted."""
+        inputs = self.inputs
+        for i in range(_NUM_INPUTS):
+            input = (self.next_input + i) % _NUM_INPUTS
+            if (inputs[input] is not None and
+                    self.input_arrival[input] <= now):
+                break
+        else:
+            # All waiting packets are still in transit: the router will be
+            # woken when they arrive.
+            return False
+
+        packet = inputs[input]
+        inputs[input] = None
+        self.num_inputs -= 1
+        self.next_input = (input + 1) % _NUM_INPUTS
+        self.next_admit = now + self.sim._router_cycle
+
+        if input < 6:
+            self.counters[_EXTERNAL_MULTICAST] += 1
+        else:
+            self.counters[_LOCAL_MULTICAST] += 1
+
+        self.pipeline.append((
+            now + self.sim._router_cycle * self.sim.router_pipeline_length,
+            packet, input, self.route(packet[0], input)))
+
+        # Space has been freed in the input
+        if input < 6:
+            neighbour = self.neighbours.get(input)
+            if neighbour is not None:
+                neighbour.wake()
+        elif input == _REINJECTOR_INPUT:
+            self.feed_reinjector_packet()
+
+        return True
+
+    def emit(self, packet, routes):
+        """Send a packet to all of the supplied routes if they are all able
+        to accept it. Returns True if the packet was sent."""
+        now = self.sim._now
+
+        # Check every destination is free
+        for route in routes:
+            if route < 6:
+                neighbour = self.neighbours.get(route)
+                if neighbour is None:
+                    return False
+                elif self.link_free[route] > now:
+                    self.wake(self.link_free[route])
+                    return False
+                elif neighbour.inputs[(route + 3) % 6] is not None:
+                    return False
+            else:
+                core = self.cores.get(route - 6)
+                if core is None or not core.can_accept():
+                    return False
+
+        # Send the packet
+        for route in routes:
+            if route < 6:
+                arrival = now + self.transmission_time(packet)
+                self.link_free[route] = arrival
+                self.neighbours[route].inject((route + 3) % 6, packet,
+                                              arrival)
+            else:
+                self.cores[route - 6].accept(packet)
+
+        return True
+
+    def transmission_time(self, packet):
+        """The time taken (in ns) to send a packet over a link."""
+        bits = _PACKET_BITS if packet[1] is None else _PAYLOAD_PACKET_BITS
+        return bits * 1e9 / self.sim.link_bandwidth
+
+    def drop(self, packet):
+        """Drop a packet, passing it to the reinjector if enabled."""
+        self.counters[_DROPPED_MULTICAST] += 1
+
+        if self.reinject:
+            if self.reinject_dump is not None:
+                self.reinjector_counters[_REINJECT_MISSED] += 1
+            else:
+                self.reinject_dump = packet
+                self.sim._schedule(self.sim._now + self.sim._reinject_time,
+                                   self.collect_dropped_packet)
+
+    def collect_dropped_packet(self):
+        """The reinjector collects the dropped packet from the router."""
+        packet = self.reinject_dump
+        self.reinject_dump = None
+        if len(self.reinject_queue) >= self.sim._reinject_queue_length:
+            self.reinjector_counters[_REINJECT_OVERFLOW] += 1
+        else:
+            self.reinject_queue.append(packet)
+            self.feed_reinjector_packet()
+
+    def feed_reinjector_packet(self):
+        """Feed the next queued packet back into the router (if possible)."""
+        if (self.reinject_queue and
+                self.inputs[_REINJECTOR_INPUT] is None):
+            self.reinjector_counters[_REINJECTED] += 1
+            self.inject(_REINJECTOR_INPUT, self.reinject_queue.popleft())
+
+
+class _Source(object):
+    """The state of a traffic source (see source_t)."""
+
+    def __init__(self):
+        self.key = 0
+        self.burst_period = 0
+        self.burst_duty = 0
+        self.burst_phase = 0
+        self.num_retries = 0
+        self.num_packets = 1
+        self.probability = 0
+        self.payload = False
+        self.sequence = 0
+        self.sent = 0
+        self.blocked = 0
+        self.retry = 0
+
+
+class _Sink(object):
+    """The state of a traffic sink (see sink_t)."""
+
+    def __init__(self):
+        self.key = 0
+        self.arrived = 0
+        self.seq_valid = False
+        self.seq_next = 0
+        # Bitmap of the sequence numbers seen, indexed by the bottom 7 bits
+        # of the sequence number.
+        self.seq_seen = 0
+        self.sequence_gaps = 0
+        self.missing = 0
+        self.duplicated = 0
+        self.out_of_order = 0
+        self.echo = False
+        self.echo_key = 0
+
+
+_WORD = 0xFFFFFFFF
+
+
+class _Core(object):
+    """A core running the network tester application, mirroring the
+    behaviour of network_tester.c."""
+
+    def __init__(self, sim, router, p, commands, seed):
+        self.sim = sim
+        self.router = router
+        self.p = p
+        self.commands = commands
+
+        self.error = 0
+        self.exited = False
+        self.num_barriers = 0
+        self.rng = random.Random(seed)
+
+        self.to_record = 0
+        self.record_interval_steps = 0
+        self.timestep = 100000.0  # 100 us
+
+        self.sources = []
+        self.sinks = []
+        # [(key, source_num), ...]
+        self.replies = []
+
+        self.num_latency_bins = 0
+        self.latency_bin_width = 1.0
+        self.latency_histograms = []
+        self.round_trip_histograms = []
+
+        self.slack_min = _WORD
+        self.slack_total = 0
+        self.slack_num_steps = 0
+        self.interrupt_ticks = 0
+        self.generation_ticks = 0
+
+        # {result_num: value, ...}
+        self.last_recorded = {}
+
+        self.compact_recording = False
+        self.num_tag_words = 0
+        self.tags = bytearray()
+        self.aggregate_recording = False
+        self.aggregates = []
+        self.results = bytearray()
+
+        # Packet reception state
+        self.consume = True
+        self.rx = None
+        self.in_handler = False
+
+        # Time spent handling packets which arrived while generating packets
+        # (which delays generation) and whether packets are being generated.
+        self.generating = False
+        self.stolen = 0.0
+
+        self.program = self.interpret()
+
+    def ticks(self, duration):
+        """Convert a duration in ns into CPU clock cycles."""
+        return int(duration * self.sim.cpu_frequency / 1e9)
+
+    def resume(self):
+        """Continue executing the command stream."""
+        try:
+            delay = next(self.program)
+        except StopIteration:
+            self.exited = True
+            self.sim._release_barrier()
+            return
+        if delay is None:
+            self.sim._reach_barrier(self)
+        else:
+            self.sim._schedule(self.sim._now + delay, self.resume)
+
+    def result_data(self):
+        """Get the contents of the core's SDRAM block."""
+        error = self.error if self.exited else NT_ERR.STILL_RUNNING
+        data = struct.pack("<I", error)
+        if self.compact_recording:
+            tags = bytes(self.tags).ljust(self.num_tag_words * 4, b"\0")
+            data += struct.pack("<I", len(self.results)) + tags
+        return data + bytes(self.results)
+
+    def interpret(self):
+        """Interpret the command stream (as interpreter_main).
+
+        A generator which yields the time (in ns) to wait before continuing
+        or None to wait at a synchronisation barrier.
+        """
+        commands = iter(self.commands)
+        for word in commands:
+            command = word & 0xFF
+            num = (word >> 8) & 0xFF
+
+            if command == NT_CMD.EXIT:
+                return
+            elif command == NT_CMD.SLEEP:
+                yield next(commands) * 1000.0
+            elif command == NT_CMD.BARRIER:
+                self.num_barriers += 1
+                yield None
+            elif command == NT_CMD.SEED:
+                self.rng.seed(next(commands))
+            elif command == NT_CMD.TIMESTEP:
+                self.timestep = float(next(commands))
+            elif command in (NT_CMD.RUN, NT_CMD.RUN_NO_RECORD):
+                for delay in self.run(next(commands),
+                                      command == NT_CMD.RUN):
+                    yield delay
+            elif command == NT_CMD.NUM:
+                arg = next(commands)
+                self.set_num_sources(arg & 0xFFFF)
+                self.set_num_sinks((arg >> 16) & 0xFFFF)
+            elif command == NT_CMD.ROUTER_TIMEOUT:
+                self.router.set_router_timeout(next(commands))
+            elif command == NT_CMD.ROUTER_TIMEOUT_RESTORE:
+                self.router.restore_router_timeout()
+            elif command == NT_CMD.REINJECTION_ENABLE:
+                self.router.reinject = True
+            elif command == NT_CMD.REINJECTION_DISABLE:
+                self.router.reinject = False
+            elif command == NT_CMD.RECORD:
+                arg = next(commands)
+                if num < 2:
+                    self.to_record = (
+                        (self.to_record & ~(_WORD << (32 * num))) |
+                        (arg << (32 * num)))
+                else:
+                    self.error |= NT_ERR.BAD_ARGUMENTS
+            elif command == NT_CMD.RECORD_INTERVAL:
+                self.record_interval_steps = next(commands)
+            elif command == NT_CMD.COMPACT_RECORDING:
+                self.compact_recording = True
+                self.num_tag_words = next(commands)
+            elif command == NT_CMD.AGGREGATE_RECORDING:
+                self.aggregate_recording = True
+            elif command == NT_CMD.LATENCY_HISTOGRAM:
+                self.set_latency_histogram(next(commands), next(commands))
+            elif command == NT_CMD.NUM_REPLIES:
+                num_replies = next(commands)
+                self.replies = (self.replies +
+                                [(0, 0)] * num_replies)[:num_replies]
+            elif command == NT_CMD.REPLY_KEY:
+                reply_num = next(commands)
+                key, source_num = next(commands), next(commands)
+                if reply_num < len(self.replies):
+                    self.replies[reply_num] = (key, source_num)
+                else:
+                    self.error |= NT_ERR.BAD_ARGUMENTS
+            elif command == NT_CMD.CONSUME:
+                self.consume = True
+                self.start_handler()
+            elif command == NT_CMD.NO_CONSUME:
+                self.consume = False
+            elif command in _SOURCE_COMMANDS:
+                if command == NT_CMD.PAYLOAD:
+                    arg = True
+                elif command == NT_CMD.NO_PAYLOAD:
+                    arg = False
+                else:
+                    arg = next(commands)
+                if num < len(self.sources):
+                    setattr(self.sources[num], _SOURCE_COMMANDS[command], arg)
+                else:
+                    self.error |= NT_ERR.BAD_ARGUMENTS
+            elif command in _SINK_COMMANDS:
+                arg = next(commands)
+                if num < len(self.sinks):
+                    sink = self.sinks[num]
+                    setattr(sink, _SINK_COMMANDS[command], arg)
+                    if command == NT_CMD.ECHO_KEY:
+                        sink.echo = True
+                else:
+                    self.error |= NT_ERR.BAD_ARGUMENTS
+            else:
+                self.error |= NT_ERR.UNKNOWN_COMMAND
+                return
+
+    def set_num_sources(self, num_sources):
+        self.sources = (self.sources[:num_sources] +
+                        [_Source()
+                         for _ in range(num_sources - len(self.sources))])
+        self.round_trip_histograms = [0] * (num_sources *
+                                            self.num_latency_bins)
+
+    def set_num_sinks(self, num_sinks):
+        self.sinks = (self.sinks[:num_sinks] +
+                      [_Sink() for _ in range(num_sinks - len(self.sinks))])
+        self.latency_histograms = [0] * (num_sinks * self.num_latency_bins)
+
+    def set_latency_histogram(self, num_bins, bin_width):
+        self.num_latency_bins = num_bins
+        self.latency_bin_width = float(max(bin_width, 1))
+        self.latency_histograms = [0] * (len(self.sinks) * num_bins)
+        self.round_trip_histograms = [0] * (len(self.sources) * num_bins)
+
+    def run(self, num_steps, enable_recording):
+        """Generate traffic for the specified number of timesteps (as run).
+
+        A generator which yields the time (in ns) to wait before continuing.
+        """
+        sim = self.sim
+        deadlines_missed = 0
+        time_left = num_steps
+
+        next_timestep = sim._now
+        record_elapsed_steps = 0
+
+        if enable_recording:
+            self.record(True, deadlines_missed)
+
+        while time_left:
+            # Wait for the next timestep
+            if sim._now < next_timestep:
+                yield next_timestep - sim._now
+            next_timestep += self.timestep
+            if sim._now >= next_timestep:
+                deadlines_missed += 1
+            time_left -= 1
+
+            generation_start = sim._now
+            self.generating = True
+            for source in self.sources:
+                if source.burst_period != 0:
+                    burst = source.burst_phase < source.burst_duty
+                    source.burst_phase += 1
+                    if source.burst_phase >= source.burst_period:
+                        source.burst_phase = 0
+                else:
+                    burst = True
+
+                if not burst:
+                    continue
+
+                for _ in range(source.num_packets):
+                    if not (source.probability == _WORD or
+                            (source.probability != 0 and
+                             self.rng.getrandbits(32) < source.probability)):
+                        continue
+
+                    for attempt in range(source.num_retries + 1):
+                        sent = self.send(
+                            source.key | source.sequence,
+                            sim._now if source.payload else None)
+                        if attempt != 0:
+                            source.retry += 1
+
+                        yield self.generation_time(sim._send_time)
+
+                        if sent:
+                            break
+
+                    if sent:
+                        source.sent += 1
+                        source.sequence = (source.sequence + 1) & 0xFF
+                    else:
+                        source.blocked += 1
+            if self.stolen:
+                yield self.generation_time(0.0)
+            self.generating = False
+
+            # Measure the time spent generating packets and the time
+            # remaining before the next timestep.
+            self.generation_ticks += self.ticks(sim._now - generation_start)
+            slack = self.ticks(max(next_timestep - sim._now, 0.0))
+            self.slack_min = min(self.slack_min, slack)
+            self.slack_total += slack
+            self.slack_num_steps += 1
+
+            if enable_recording and self.record_interval_steps > 0:
+                record_elapsed_steps += 1
+                if record_elapsed_steps >= self.record_interval_steps:
+                    record_elapsed_steps = 0
+                    self.record(False, deadlines_missed)
+
+        if enable_recording and self.record_interval_steps == 0:
+            self.record(False, deadlines_missed)
+
+        if enable_recording and self.aggregate_recording:
+            self.write_aggregates()
+
+        if deadlines_missed:
+            self.error |= NT_ERR.DEADLINE_MISSED
+        if deadlines_missed > num_steps // 2:
+            self.error |= NT_ERR.MOST_DEADLINES_MISSED
+
+    def generation_time(self, duration):
+        """The time taken by a step of packet generation which would take the
+        specified time (in ns) if not delayed by arriving packets."""
+        duration += self.stolen
+        self.stolen = 0.0
+        return duration
+
+    def send(self, key, payload):
+        """Attempt to send a packet (as spin1_send_mc_packet). The payload
+        is a timestamp (in ns) or None. Returns True if successful."""
+        if self.router.inputs[6 + self.p] is not None:
+            return False
+        self.router.inject(6 + self.p, (key, payload))
+        return True
+
+    def can_accept(self):
+        """Can a packet be delivered to this core?"""
+        return self.rx is None
+
+    def accept(self, packet):
+        """Deliver a packet to this core."""
+        self.rx = packet
+        self.start_handler()
+
+    def start_handler(self):
+        """Start handling the arrived packet if possible."""
+        if (self.rx is not None and self.consume and not self.exited and
+                not self.in_handler):
+            self.handle_packet()
+
+    def handle_packet(self):
+        """Handle the arrived packet (as on_mc_packet and on_mcpl_packet)."""
+        sim = self.sim
+        (key, payload), self.rx = self.rx, None
+        self.router.wake()
+
+        sink_num = self.find_sink(key)
+        source_num = self.find_reply(key)
+        if sink_num is not None:
+            sink = self.sinks[sink_num]
+            sink.arrived += 1
+            self.track_sequence(sink, key)
+            if payload is not None:
+                if sink.echo:
+                    self.send(sink.echo_key, payload)
+                if self.num_latency_bins:
+                    self.latency_histograms[
+                        (sink_num * self.num_latency_bins) +
+                        self.latency_bin(sim._now - payload)] += 1
+        elif payload is not None and source_num is not None:
+            if self.num_latency_bins:
+                self.round_trip_histograms[
+                    (source_num * self.num_latency_bins) +
+                    self.latency_bin(sim._now - payload)] += 1
+        else:
+            self.error |= NT_ERR.UNEXPECTED_PACKET
+
+        self.in_handler = True
+        self.interrupt_ticks += self.ticks(sim._receive_time)
+        if self.generating:
+            self.stolen += sim._receive_time
+        sim._schedule(sim._now + sim._receive_time, self.end_handler)
+
+    def end_handler(self):
+        self.in_handler = False
+        self.start_handler()
+
+    def find_sink(self, key):
+        """Find the number of the sink expecting packets with the supplied
+        key."""
+        key &= ~0xFF
+        for sink_num, sink in enumerate(self.sinks):
+            if sink.key == key:
+                return sink_num
+        return None
+
+    def find_reply(self, key):
+        """Find the number of the source whose packets are echoed back with
+        the supplied key."""
+        key &= ~0xFF
+        for reply_key, source_num in self.replies:
+            if reply_key == key:
+                return source_num
+        return None
+
+    def latency_bin(self, duration):
+        """Get the histogram bin a packet taking the specified time (in ns)
+        falls into."""
+        return min(int(max(duration, 0.0) // self.latency_bin_width),
+                   self.num_latency_bins - 1)
+
+    @staticmethod
+    def track_sequence(sink, key):
+        """Update a sink's sequence number statistics (as
+        track_sequence)."""
+        seq = key & 0xFF
+
+        if not sink.seq_valid:
+            sink.seq_valid = True
+            sink.seq_next = seq
+
+        ahead = ((seq - sink.seq_next + 128) & 0xFF) - 128
+        if ahead >= 0:
+            if ahead > 0:
+                sink.sequence_gaps += 1
+                sink.missing += ahead
+
+            while sink.seq_next != seq:
+                sink.seq_seen &= ~(1 << (sink.seq_next & 0x7F))
+                sink.seq_next = (sink.seq_next + 1) & 0xFF
+            sink.seq_seen |= 1 << (seq & 0x7F)
+            sink.seq_next = (sink.seq_next + 1) & 0xFF
+        elif sink.seq_seen & (1 << (seq & 0x7F)):
+            sink.duplicated += 1
+        else:
+            sink.out_of_order += 1
+            sink.seq_seen |= 1 << (seq & 0x7F)
+
+    def record(self, first, deadlines_missed):
+        """Record a single snapshot of the core's counters (as record)."""
+        values = []
+        last_recorded = self.last_recorded
+        to_record = self.to_record
+
+        def append(value):
+            num = len(values)
+            value &= _WORD
+            values.append((value - last_recorded.get(num, 0)) & _WORD)
+            last_recorded[num] = value
+
+        append(deadlines_missed)
+
+        if to_record & Counters.slack_min:
+            values.append(self.slack_min if self.slack_num_steps else 0)
+        if to_record & Counters.slack_mean:
+            values.append(self.slack_total // self.slack_num_steps
+                          if self.slack_num_steps else 0)
+        if to_record & Counters.interrupt_cycles:
+            append(self.interrupt_ticks)
+        if to_record & Counters.generation_cycles:
+            append(self.generation_ticks)
+        self.slack_min = _WORD
+        self.slack_total = 0
+        self.slack_num_steps = 0
+
+        for counter in range(16):
+            if to_record & (1 << counter):
+                append(self.router.counters[counter])
+        for counter in range(3):
+            if to_record & (1 << (counter + 16)):
+                append(self.router.reinjector_counters[counter])
+
+        for counter, attr in ((Counters.sent, "sent"),
+                              (Counters.blocked, "blocked"),
+                              (Counters.retried, "retry")):
+            if to_record & counter:
+                for source in self.sources:
+                    append(getattr(source, attr))
+        if to_record & Counters.round_trip:
+            for value in self.round_trip_histograms:
+                append(value)
+
+        if to_record & Counters.received:
+            for sink in self.sinks:
+                append(sink.arrived)
+        if to_record & Counters.latency:
+            for value in self.latency_histograms:
+                append(value)
+        for counter in (Counters.sequence_gaps, Counters.missing,
+                        Counters.duplicated, Counters.out_of_order):
+            if to_record & counter:
+                for sink in self.sinks:
+                    append(getattr(sink, counter.name))
+
+        if self.aggregate_recording:
+            if first:
+                self.aggregates = [[0, _WORD, 0, 0] for _ in values]
+            else:
+                for aggregate, value in zip(self.aggregates, values):
+                    aggregate[0] += value
+                    aggregate[1] = min(aggregate[1], value)
+                    aggregate[2] = max(aggregate[2], value)
+                    aggregate[3] += value * value
+        elif not first and self.compact_recording:
+            self.write_compact_results(values)
+        elif not first:
+            self.results += struct.pack("<{}I".format(len(values)), *values)
+
+    def write_compact_results(self, values):
+        """Append values in the compact encoding (as
+        write_compact_results)."""
+        tags = [0] * ((len(values) + 15) // 16)
+        data = bytearray()
+        for num, value in enumerate(values):
+            if value == 0:
+                continue
+            elif value <= 0xFF:
+                tag, width = 1, 1
+            elif value <= 0xFFFF:
+                tag, width = 2, 2
+            else:
+                tag, width = 3, 4
+            tags[num // 16] |= tag << ((num % 16) * 2)
+            data += struct.pack("<I", value)[:width]
+        data += b"\0" * (-len(data) % 4)
+
+        self.tags += struct.pack("<{}I".format(len(tags)), *tags)
+        self.results += data
+
+    def write_aggregates(self):
+        """Append the aggregates of the last recording run (as
+        write_aggregates)."""
+        for total, minimum, maximum, total_squares in self.aggregates:
+            self.results += struct.pack(
+                "<6I",
+                total & _WORD, (total >> 32) & _WORD,
+                minimum, maximum,
+                total_squares & _WORD, (total_squares >> 32) & _WORD)
+
+
+# Source commands: {command: source_t attribute, ...}
+_SOURCE_COMMANDS = {
+    NT_CMD.PROBABILITY: "probability",
+    NT_CMD.BURST_PERIOD: "burst_period",
+    NT_CMD.BURST_DUTY: "burst_duty",
+    NT_CMD.BURST_PHASE: "burst_phase",
+    NT_CMD.SOURCE_KEY: "key",
+    NT_CMD.PAYLOAD: "payload",
+    NT_CMD.NO_PAYLOAD: "payload",
+    NT_CMD.NUM_RETRIES: "num_retries",
+    NT_CMD.NUM_PACKETS: "num_packets",
+}
+
+# Sink commands: {command: sink_t attribute, ...}
+_SINK_COMMANDS = {
+    NT_CMD.SINK_KEY: "key",
+    NT_CMD.ECHO_KEY: "echo_key",
+}
+
+
+def decode_commands(data):
+    """Unpack a command stream packed by :py:meth:`.Commands.pack`.
+
+    Parameters
+    ----------
+    data : bytes
+        The packed commands, starting with the 32-bit length prefix.
+
+    Returns
+    -------
+    [int, ...]
+        The 32-bit command words.
+    """
+    num_bytes = struct.unpack_from("<I", data)[0]
+    return list(struct.unpack_from("<{}I".format(num_bytes // 4), data, 4))
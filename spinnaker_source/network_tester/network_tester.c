@@ -27,10 +27,26 @@ static uint32_t error_occurred = 0;
 // Bit 24 enables logging number of received packets
 static uint32_t to_record;
 
+// A bit field which extends to_record (i.e. gives bits 63:32 of the set of
+// fields to be recorded).
+static uint32_t to_record_ext;
+
 #define RECORD_SENT_BIT (1u << 24)
 #define RECORD_BLOCKED_BIT (1u << 25)
 #define RECORD_RETRY_BIT (1u << 26)
+#define RECORD_ROUND_TRIP_BIT (1u << 27)
 #define RECORD_RECEIVED_BIT (1u << 28)
+#define RECORD_LATENCY_BIT (1u << 29)
+
+// Bits in to_record_ext
+#define RECORD_SLACK_MIN_BIT (1u << (32 - 32))
+#define RECORD_SLACK_MEAN_BIT (1u << (33 - 32))
+#define RECORD_INTERRUPT_CYCLES_BIT (1u << (34 - 32))
+#define RECORD_GENERATION_CYCLES_BIT (1u << (35 - 32))
+#define RECORD_SEQUENCE_GAPS_BIT (1u << (48 - 32))
+#define RECORD_MISSING_BIT (1u << (49 - 32))
+#define RECORD_DUPLICATED_BIT (1u << (50 - 32))
+#define RECORD_OUT_OF_ORDER_BIT (1u << (51 - 32))
 
 // The maximum number of values which can be recorded simultaneously (used to
 // set the size of the buffer where results are stored)
@@ -48,12 +64,60 @@ static uint32_t *sdram_block;
 // SDRAM location where the next results should be stored
 static uint32_t *sdram_next_results;
 
+// Are results being recorded in compact form? If so, sdram_block[1] holds the
+// number of bytes of (compacted) results written so far starting from
+// sdram_next_results's initial value and sdram_next_tags gives the SDRAM
+// location where the next set of width tags should be stored. See
+// write_compact_results().
+static bool compact_recording;
+static uint32_t *sdram_next_tags;
+
+// Are results being aggregated on-core? If so, rather than writing every sample
+// into SDRAM, the sum, minimum, maximum and sum of squares of each recorded
+// value are accumulated in aggregate_buffer over the course of each recording
+// run and written into SDRAM only when the run ends.
+static bool aggregate_recording;
+
 // Details of the set of sources and sinks.
 static size_t num_sources;
 static size_t num_sinks;
 static source_t *sources;
 static sink_t *sinks;
 
+// Details of the packets echoed back to this core's sources by remote sinks,
+// sorted by key.
+static size_t num_replies;
+static reply_t *replies;
+
+// Per-sink histograms of packet transit times. Each sink has
+// num_latency_bins consecutive bins, the first counting packets which took
+// less than latency_bin_ticks to arrive, the next those which took less than
+// twice that and so on. The final bin counts all packets which arrived later
+// than that. Only packets with a payload (which holds the tc2 value at the time
+// of sending) contribute.
+static uint32_t num_latency_bins;
+static uint32_t latency_bin_ticks;
+static uint32_t *latency_histograms;
+
+// Per-source histograms of packet round-trip times, binned in the same way as
+// the latency histograms. Only packets echoed back to the source by a sink
+// contribute. Since both the departure and return time are measured by this
+// core's timer, these histograms do not depend on clock alignment between
+// cores.
+static uint32_t *round_trip_histograms;
+
+// The slack (number of timer ticks remaining before the next timestep's
+// deadline once a timestep's packets have been generated) observed since the
+// last recording. Timesteps whose deadline was missed have zero slack.
+static uint32_t slack_min_ticks;
+static uint64_t slack_total_ticks;
+static uint32_t slack_num_steps;
+
+// The total number of timer ticks (i.e. CPU cycles) spent handling arriving
+// packets and generating packets respectively.
+static volatile uint32_t interrupt_ticks;
+static uint32_t generation_ticks;
+
 // This buffer is used to store the last raw counter values recorded. These are
 // used to calculate the change in counter values between this recording and
 // the next recording. The results are packed consecutively from index zero
@@ -65,6 +129,23 @@ static uint32_t *last_recorded;
 // This buffer holds the results currently being copied into SDRAM by DMA.
 static uint32_t *recorded_value_buffer;
 
+// This buffer holds the width tags of the results currently being copied into
+// SDRAM by DMA when recording compactly. Two bits are used per result.
+static uint32_t *compact_tag_buffer;
+
+// Gives the number of words required to hold the width tags for the specified
+// number of results.
+#define NUM_TAG_WORDS(num_results) (((num_results) + 15) / 16)
+
+// When aggregate_recording is enabled, this buffer holds AGGREGATE_WORDS words
+// for each result: the least- and most-significant words of the sum, the
+// minimum, the maximum and the least- and most-significant words of the sum of
+// squares. The number of results being aggregated is given by
+// num_aggregated_results. This buffer is NULL when not aggregating.
+static uint32_t *aggregate_buffer;
+static int num_aggregated_results;
+#define AGGREGATE_WORDS 6
+
 // The value of the router timeout register just before the previous call to
 // `NT_CMD_ROUTER_TIMEOUT`.
 static uint old_router_timeout;
@@ -73,28 +154,84 @@ static uint old_router_timeout;
 // value of these counters is undefined.
 reinjector_counters_t *reinjector_counters;
 
-// Is a DMA operation currently in progress
-static volatile bool dma_in_progress = false;
+// The number of DMA operations currently in progress
+static volatile uint32_t dma_in_progress = 0;
 
 // The number of recording counters which exist for each router, source and
 // sink.
 #define NUM_PERMANENT_COUNTERS 1
+#define NUM_CORE_COUNTERS 4
 #define NUM_ROUTER_COUNTERS 16
 #define NUM_REINJECTOR_COUNTERS (sizeof(reinjector_counters_t) / sizeof(uint))
 #define NUM_SOURCE_COUNTERS 3
-#define NUM_SINK_COUNTERS 1
+#define NUM_SINK_COUNTERS 5
 
-// Given a number of sinks and a number of sources, gives the maximum number of
-// result counters which may exist.
-#define MAX_NUM_RESULTS(num_sources, num_sinks) ( \
+// Given a number of sources, sinks and latency histogram bins, gives the
+// maximum number of result counters which may exist.
+#define MAX_NUM_RESULTS(num_sources, num_sinks, num_bins) ( \
 	NUM_PERMANENT_COUNTERS + \
+	NUM_CORE_COUNTERS + \
 	NUM_ROUTER_COUNTERS + \
 	NUM_REINJECTOR_COUNTERS + \
 	(NUM_SOURCE_COUNTERS * (num_sources)) + \
-	(NUM_SINK_COUNTERS * (num_sinks)) \
+	(NUM_SINK_COUNTERS * (num_sinks)) + \
+	((num_bins) * ((num_sources) + (num_sinks))) \
 )
 
 
+/**
+ * Replace the last_recorded, recorded_value_buffer, compact_tag_buffer and (if
+ * aggregate_recording is enabled) aggregate_buffer buffers with buffers large
+ * enough to hold the specified number of results.
+ *
+ * Returns false (leaving the existing buffers in place) if the allocation
+ * failed.
+ */
+bool resize_result_buffers(size_t max_num_results) {
+	uint32_t *new_last_recorded = sark_alloc(max_num_results, sizeof(uint32_t));
+	if (!new_last_recorded)
+		return false;
+	uint32_t *new_recorded_value_buffer = sark_alloc(max_num_results,
+	                                                 sizeof(uint32_t));
+	if (!new_recorded_value_buffer) {
+		sark_free(new_last_recorded);
+		return false;
+	}
+	uint32_t *new_compact_tag_buffer = sark_alloc(NUM_TAG_WORDS(max_num_results),
+	                                              sizeof(uint32_t));
+	if (!new_compact_tag_buffer) {
+		sark_free(new_last_recorded);
+		sark_free(new_recorded_value_buffer);
+		return false;
+	}
+	uint32_t *new_aggregate_buffer = NULL;
+	if (aggregate_recording) {
+		new_aggregate_buffer = sark_alloc(max_num_results * AGGREGATE_WORDS,
+		                                  sizeof(uint32_t));
+		if (!new_aggregate_buffer) {
+			sark_free(new_last_recorded);
+			sark_free(new_recorded_value_buffer);
+			sark_free(new_compact_tag_buffer);
+			return false;
+		}
+	}
+	
+	while (dma_in_progress)
+		;
+	sark_free(last_recorded);
+	last_recorded = new_last_recorded;
+	sark_free(recorded_value_buffer);
+	recorded_value_buffer = new_recorded_value_buffer;
+	sark_free(compact_tag_buffer);
+	compact_tag_buffer = new_compact_tag_buffer;
+	if (aggregate_buffer)
+		sark_free(aggregate_buffer);
+	aggregate_buffer = new_aggregate_buffer;
+	
+	return true;
+}
+
+
 /**
  * Change the number of sources.
  */
@@ -107,22 +244,24 @@ void set_num_sources(size_t new_num_sources) {
 		return;
 	}
 	
-	// Allocate new result arrays
-	uint32_t *new_last_recorded = sark_alloc(
-		MAX_NUM_RESULTS(new_num_sources, num_sinks), sizeof(uint32_t));
-	if (!new_last_recorded) {
+	// Allocate new round-trip histograms
+	uint32_t *new_round_trip_histograms = sark_alloc(
+		new_num_sources * num_latency_bins, sizeof(uint32_t));
+	if (!new_round_trip_histograms && new_num_sources * num_latency_bins != 0) {
 		ERROR("Could not allocate space for %d sources.\n", new_num_sources);
 		error_occurred |= NT_ERR_MALLOC;
 		sark_free(new_sources);
 		return;
 	}
-	uint32_t *new_recorded_value_buffer = sark_alloc(
-		MAX_NUM_RESULTS(new_num_sources, num_sinks), sizeof(uint32_t));
-	if (!new_recorded_value_buffer) {
+	
+	// Allocate new result arrays
+	if (!resize_result_buffers(MAX_NUM_RESULTS(new_num_sources, num_sinks,
+	                                           num_latency_bins))) {
 		ERROR("Could not allocate space for %d sources.\n", new_num_sources);
 		error_occurred |= NT_ERR_MALLOC;
 		sark_free(new_sources);
-		sark_free(new_last_recorded);
+		if (new_round_trip_histograms)
+			sark_free(new_round_trip_histograms);
 		return;
 	}
 	
@@ -136,6 +275,7 @@ void set_num_sources(size_t new_num_sources) {
 		new_sources[i].num_packets = 1; // One packet per time-step
 		new_sources[i].probability = 0x00000000; // 0%
 		new_sources[i].payload = false;
+		new_sources[i].sequence = 0;
 		new_sources[i].sent_count = 0;
 		new_sources[i].blocked_count = 0;
 		new_sources[i].retry_count = 0;
@@ -150,10 +290,12 @@ void set_num_sources(size_t new_num_sources) {
 	sources = new_sources;
 	num_sources = new_num_sources;
 	
-	sark_free(last_recorded);
-	last_recorded = new_last_recorded;
-	sark_free(recorded_value_buffer);
-	recorded_value_buffer = new_recorded_value_buffer;
+	// Histograms are always reset when the number of sources changes
+	for (int i = 0; i < num_sources * num_latency_bins; i++)
+		new_round_trip_histograms[i] = 0;
+	if (round_trip_histograms)
+		sark_free(round_trip_histograms);
+	round_trip_histograms = new_round_trip_histograms;
 }
 
 
@@ -169,22 +311,24 @@ void set_num_sinks(size_t new_num_sinks) {
 		return;
 	}
 	
-	// Allocate new result arrays
-	uint32_t *new_last_recorded = sark_alloc(
-		MAX_NUM_RESULTS(num_sources, new_num_sinks), sizeof(uint32_t));
-	if (!new_last_recorded) {
+	// Allocate new latency histograms
+	uint32_t *new_latency_histograms = sark_alloc(
+		new_num_sinks * num_latency_bins, sizeof(uint32_t));
+	if (!new_latency_histograms && new_num_sinks * num_latency_bins != 0) {
 		ERROR("Could not allocate space for %d sinks.\n", new_num_sinks);
 		error_occurred |= NT_ERR_MALLOC;
 		sark_free(new_sinks);
 		return;
 	}
-	uint32_t *new_recorded_value_buffer = sark_alloc(
-		MAX_NUM_RESULTS(num_sources, new_num_sinks), sizeof(uint32_t));
-	if (!new_recorded_value_buffer) {
+	
+	// Allocate new result arrays
+	if (!resize_result_buffers(MAX_NUM_RESULTS(num_sources, new_num_sinks,
+	                                           num_latency_bins))) {
 		ERROR("Could not allocate space for %d sinks.\n", new_num_sinks);
 		error_occurred |= NT_ERR_MALLOC;
 		sark_free(new_sinks);
-		sark_free(new_last_recorded);
+		if (new_latency_histograms)
+			sark_free(new_latency_histograms);
 		return;
 	}
 	
@@ -192,6 +336,16 @@ void set_num_sinks(size_t new_num_sinks) {
 	for (int i = 0; i < new_num_sinks; i++) {
 		new_sinks[i].key = 0x00000000;
 		new_sinks[i].arrived_count = 0;
+		new_sinks[i].seq_valid = false;
+		new_sinks[i].seq_next = 0;
+		for (int j = 0; j < 4; j++)
+			new_sinks[i].seq_seen[j] = 0;
+		new_sinks[i].sequence_gaps_count = 0;
+		new_sinks[i].missing_count = 0;
+		new_sinks[i].duplicated_count = 0;
+		new_sinks[i].out_of_order_count = 0;
+		new_sinks[i].echo = false;
+		new_sinks[i].echo_key = 0x00000000;
 	}
 	
 	// Copy-across all previous sinks which remain
@@ -203,12 +357,96 @@ void set_num_sinks(size_t new_num_sinks) {
 	sinks = new_sinks;
 	num_sinks = new_num_sinks;
 	
-	while (dma_in_progress)
-		;
-	sark_free(last_recorded);
-	last_recorded = new_last_recorded;
-	sark_free(recorded_value_buffer);
-	recorded_value_buffer = new_recorded_value_buffer;
+	// Histograms are always reset when the number of sinks changes
+	for (int i = 0; i < num_sinks * num_latency_bins; i++)
+		new_latency_histograms[i] = 0;
+	if (latency_histograms)
+		sark_free(latency_histograms);
+	latency_histograms = new_latency_histograms;
+}
+
+
+/**
+ * Change the number of replies expected by this core's sources.
+ */
+void set_num_replies(size_t new_num_replies) {
+	// Allocate a new array of replies
+	reply_t *new_replies = sark_alloc(new_num_replies, sizeof(reply_t));
+	if (!new_replies && new_num_replies != 0) {
+		ERROR("Could not allocate space for %d replies.\n", new_num_replies);
+		error_occurred |= NT_ERR_MALLOC;
+		return;
+	}
+	
+	// Set default values
+	for (int i = 0; i < new_num_replies; i++) {
+		new_replies[i].key = 0x00000000;
+		new_replies[i].source = 0;
+	}
+	
+	// Copy-across all previous replies which remain
+	spin1_memcpy(new_replies, replies,
+	             MIN(new_num_replies, num_replies) * sizeof(reply_t));
+	
+	if (num_replies > 0)
+		sark_free(replies);
+	replies = new_replies;
+	num_replies = new_num_replies;
+}
+
+
+/**
+ * Change the shape of the latency and round-trip histograms kept for each sink
+ * and source respectively.
+ *
+ * All histogram bins are reset to zero.
+ */
+void set_latency_histogram(uint32_t new_num_bins, uint32_t bin_ticks) {
+	uint32_t *new_latency_histograms = sark_alloc(
+		num_sinks * new_num_bins, sizeof(uint32_t));
+	if (!new_latency_histograms && num_sinks * new_num_bins != 0) {
+		ERROR("Could not allocate space for %d histogram bins.\n", new_num_bins);
+		error_occurred |= NT_ERR_MALLOC;
+		return;
+	}
+	
+	uint32_t *new_round_trip_histograms = sark_alloc(
+		num_sources * new_num_bins, sizeof(uint32_t));
+	if (!new_round_trip_histograms && num_sources * new_num_bins != 0) {
+		ERROR("Could not allocate space for %d histogram bins.\n", new_num_bins);
+		error_occurred |= NT_ERR_MALLOC;
+		if (new_latency_histograms)
+			sark_free(new_latency_histograms);
+		return;
+	}
+	
+	if (!resize_result_buffers(MAX_NUM_RESULTS(num_sources, num_sinks,
+	                                           new_num_bins))) {
+		ERROR("Could not allocate space for %d histogram bins.\n", new_num_bins);
+		error_occurred |= NT_ERR_MALLOC;
+		if (new_latency_histograms)
+			sark_free(new_latency_histograms);
+		if (new_round_trip_histograms)
+			sark_free(new_round_trip_histograms);
+		return;
+	}
+	
+	for (int i = 0; i < num_sinks * new_num_bins; i++)
+		new_latency_histograms[i] = 0;
+	if (latency_histograms)
+		sark_free(latency_histograms);
+	latency_histograms = new_latency_histograms;
+	
+	for (int i = 0; i < num_sources * new_num_bins; i++)
+		new_round_trip_histograms[i] = 0;
+	if (round_trip_histograms)
+		sark_free(round_trip_histograms);
+	round_trip_histograms = new_round_trip_histograms;
+	
+	num_latency_bins = new_num_bins;
+	
+	// A zero-width bin would cause a division by zero when binning packets.
+	latency_bin_ticks = MAX(bin_ticks, 1);
 }
 
 
@@ -217,14 +455,17 @@ void set_num_sinks(size_t new_num_sinks) {
  */
 void on_dma_transfer_done(uint arg1, uint arg2)
 {
-	dma_in_progress = false;
+	dma_in_progress--;
 }
 
 
 /**
- * Callback on MC packet arrival. Simply counts the packet.
+ * Find the sink which expects packets with the supplied key (binary
+ * searching the key-sorted list of sinks).
+ *
+ * Returns the sink number or -1 if no sink expects the key.
  */
-void on_mc_packet(uint key, uint payload)
+static inline int find_sink(uint key)
 {
 	key &= ~0xFF;
 	
@@ -238,20 +479,330 @@ void on_mc_packet(uint key, uint payload)
 			right = middle - 1;
 		} else if (key > cur_key) {
 			left = middle + 1;
-		} else if (key == cur_key) {
-			sinks[middle].arrived_count++;
-			return;
 		} else {
-			error_occurred |= NT_ERR_UNEXPECTED_PACKET;
-			return;
+			return middle;
 		}
 		
 		middle = (left + right) / 2;
 	}
+	return -1;
+}
+
+
+/**
+ * Find the reply which carries echoed packets with the supplied key (binary
+ * searching the key-sorted list of replies).
+ *
+ * Returns the reply number or -1 if no reply has the key.
+ */
+static inline int find_reply(uint key)
+{
+	key &= ~0xFF;
+	
+	int left = 0;
+	int right = num_replies - 1;
+	int middle = (left + right) / 2;
+	
+	while (left <= right) {
+		uint32_t cur_key = replies[middle].key;
+		if (key < cur_key) {
+			right = middle - 1;
+		} else if (key > cur_key) {
+			left = middle + 1;
+		} else {
+			return middle;
+		}
+		
+		middle = (left + right) / 2;
+	}
+	return -1;
+}
+
+
+/**
+ * Get the histogram bin a packet which took the specified number of ticks to
+ * arrive falls into.
+ */
+static inline uint32_t latency_bin(int32_t ticks)
+{
+	// Packets which apparently arrived before they were sent (due to skew
+	// between cores' timers) are counted in the first bin.
+	uint32_t bin = (ticks > 0) ? ((uint32_t)ticks) / latency_bin_ticks : 0;
+	return MIN(bin, num_latency_bins - 1);
+}
+
+
+/**
+ * Update a sink's sequence number statistics on the arrival of a packet with
+ * the supplied key (whose bottom 8 bits hold the packet's sequence number).
+ *
+ * Sequence numbers are compared using serial number arithmetic: a packet whose
+ * sequence number is up to 127 ahead of the expected one is treated as new,
+ * with any sequence numbers skipped over counted as missing. Any other packet
+ * is late and is counted either as a duplicate or as out-of-order depending on
+ * whether its sequence number has been seen before.
+ */
+static inline void track_sequence(sink_t *sink, uint key)
+{
+	uint8_t seq = key & 0xFF;
+	
+	#define SEEN_WORD(seq) sink->seq_seen[((seq) >> 5) & 0x3]
+	#define SEEN_BIT(seq) (1u << ((seq) & 0x1F))
+	
+	// Synchronise with the source on the first packet to arrive
+	if (!sink->seq_valid) {
+		sink->seq_valid = true;
+		sink->seq_next = seq;
+	}
+	
+	int8_t ahead = (int8_t)(seq - sink->seq_next);
+	if (ahead >= 0) {
+		if (ahead > 0) {
+			sink->sequence_gaps_count++;
+			sink->missing_count += ahead;
+		}
+		
+		// Mark any skipped sequence numbers as not-yet-seen
+		while (sink->seq_next != seq) {
+			SEEN_WORD(sink->seq_next) &= ~SEEN_BIT(sink->seq_next);
+			sink->seq_next++;
+		}
+		SEEN_WORD(seq) |= SEEN_BIT(seq);
+		sink->seq_next++;
+	} else if (SEEN_WORD(seq) & SEEN_BIT(seq)) {
+		sink->duplicated_count++;
+	} else {
+		sink->out_of_order_count++;
+		SEEN_WORD(seq) |= SEEN_BIT(seq);
+	}
+	
+	#undef SEEN_WORD
+	#undef SEEN_BIT
+}
+
+
+/**
+ * Callback on MC packet arrival. Counts the packet.
+ */
+void on_mc_packet(uint key, uint payload)
+{
+	uint32_t arrival_ticks = tc2[TC_COUNT];
+	
+	int sink = find_sink(key);
+	if (sink >= 0) {
+		sinks[sink].arrived_count++;
+		track_sequence(&sinks[sink], key);
+	} else {
+		error_occurred |= NT_ERR_UNEXPECTED_PACKET;
+	}
+	
+	// Note that tc2 is a down-counter.
+	interrupt_ticks += arrival_ticks - tc2[TC_COUNT];
+}
+
+
+/**
+ * Handle the arrival of an MC packet with payload which arrived when tc2 held
+ * the value arrival_ticks.
+ *
+ * Packets arriving at a sink are counted, echoed back to their source (if
+ * enabled) and their transit time added to the sink's latency histogram.
+ * Packets echoed back to one of this core's sources have their round-trip time
+ * added to the source's round-trip histogram.
+ */
+static inline void handle_mcpl_packet(uint key, uint payload,
+                                      uint32_t arrival_ticks)
+{
+	// Note that tc2 is a down-counter.
+	int32_t transit_ticks = (int32_t)(payload - arrival_ticks);
+	
+	int sink = find_sink(key);
+	if (sink >= 0) {
+		sinks[sink].arrived_count++;
+		track_sequence(&sinks[sink], key);
+		
+		// Return the packet, with its original timestamp, to its source
+		if (sinks[sink].echo)
+			spin1_send_mc_packet(sinks[sink].echo_key, payload, WITH_PAYLOAD);
+		
+		if (num_latency_bins)
+			latency_histograms[(sink * num_latency_bins) +
+			                   latency_bin(transit_ticks)]++;
+		return;
+	}
+	
+	int reply = find_reply(key);
+	if (reply >= 0) {
+		if (num_latency_bins)
+			round_trip_histograms[(replies[reply].source * num_latency_bins) +
+			                      latency_bin(transit_ticks)]++;
+		return;
+	}
+	
 	error_occurred |= NT_ERR_UNEXPECTED_PACKET;
 }
 
 
+/**
+ * Callback on MC packet with payload arrival.
+ */
+void on_mcpl_packet(uint key, uint payload)
+{
+	// Sample the timer as early as possible.
+	uint32_t arrival_ticks = tc2[TC_COUNT];
+	
+	handle_mcpl_packet(key, payload, arrival_ticks);
+	
+	// Note that tc2 is a down-counter.
+	interrupt_ticks += arrival_ticks - tc2[TC_COUNT];
+}
+
+
+/**
+ * Start a DMA transfer of the specified number of bytes from DTCM into SDRAM.
+ */
+static void dma_to_sdram(uint32_t *sdram, uint32_t *dtcm, uint32_t num_bytes)
+{
+	dma_in_progress++;
+	if (!spin1_dma_transfer(DMA_WRITE, sdram, dtcm, DMA_WRITE, num_bytes)) {
+		ERROR("DMA transfer of %d bytes failed.\n", num_bytes);
+		error_occurred |= NT_ERR_DMA;
+		dma_in_progress--;
+	}
+}
+
+
+/**
+ * Compactly encode the first num_results values in recorded_value_buffer and
+ * copy them into SDRAM.
+ *
+ * Each value is given a two-bit width tag (0: the value is zero and is
+ * omitted, 1: one byte, 2: two bytes, 3: four bytes), packed sixteen to a word
+ * with the first value in the least-significant bits. The tags for each sample
+ * are written consecutively into a fixed-size region of SDRAM. The non-zero
+ * values are written, little-endian, using the indicated number of bytes into a
+ * separate region with each sample's values padded to a whole number of words.
+ *
+ * The values are compacted in-place in recorded_value_buffer: the encoded form
+ * of each value never extends past the word the value was originally stored
+ * in.
+ */
+static void write_compact_results(int num_results)
+{
+	uint8_t *data = (uint8_t *)recorded_value_buffer;
+	uint32_t num_bytes = 0;
+	
+	int num_tag_words = NUM_TAG_WORDS(num_results);
+	for (int i = 0; i < num_tag_words; i++)
+		compact_tag_buffer[i] = 0;
+	
+	for (int i = 0; i < num_results; i++) {
+		uint32_t value = recorded_value_buffer[i];
+		
+		uint32_t tag;
+		uint32_t width;
+		if (value == 0) {
+			tag = 0;
+			width = 0;
+		} else if (value <= 0xFF) {
+			tag = 1;
+			width = 1;
+		} else if (value <= 0xFFFF) {
+			tag = 2;
+			width = 2;
+		} else {
+			tag = 3;
+			width = 4;
+		}
+		
+		compact_tag_buffer[i / 16] |= tag << ((i % 16) * 2);
+		for (int byte = 0; byte < width; byte++)
+			data[num_bytes++] = (value >> (byte * 8)) & 0xFF;
+	}
+	
+	// Pad to a whole number of words
+	while (num_bytes % sizeof(uint32_t))
+		data[num_bytes++] = 0;
+	
+	DEBUG("Copying %d results compacted into %d bytes into SDRAM\n",
+	      num_results, num_bytes);
+	dma_to_sdram(sdram_next_tags, compact_tag_buffer,
+	             num_tag_words * sizeof(uint32_t));
+	if (num_bytes > 0)
+		dma_to_sdram(sdram_next_results, recorded_value_buffer, num_bytes);
+	
+	// Advance the SDRAM pointers to the next free space
+	sdram_next_tags += num_tag_words;
+	sdram_next_results += num_bytes / sizeof(uint32_t);
+	sdram_block[1] += num_bytes;
+}
+
+
+/**
+ * Reset the aggregates of the first num_results values ready for a new
+ * recording run.
+ */
+static void reset_aggregates(int num_results)
+{
+	for (int i = 0; i < num_results; i++) {
+		uint32_t *aggregate = aggregate_buffer + (i * AGGREGATE_WORDS);
+		aggregate[0] = 0;
+		aggregate[1] = 0;
+		aggregate[2] = 0xFFFFFFFF;
+		aggregate[3] = 0;
+		aggregate[4] = 0;
+		aggregate[5] = 0;
+	}
+	num_aggregated_results = num_results;
+}
+
+
+/**
+ * Accumulate the first num_results values in recorded_value_buffer into the
+ * aggregates.
+ */
+static void accumulate_aggregates(int num_results)
+{
+	for (int i = 0; i < num_results; i++) {
+		uint32_t value = recorded_value_buffer[i];
+		uint32_t *aggregate = aggregate_buffer + (i * AGGREGATE_WORDS);
+		
+		// 64-bit sums are kept as pairs of words (with explicit carries) since
+		// aggregate_buffer is not guaranteed to be double-word aligned.
+		aggregate[0] += value;
+		aggregate[1] += (aggregate[0] < value);
+		
+		aggregate[2] = MIN(aggregate[2], value);
+		aggregate[3] = MAX(aggregate[3], value);
+		
+		uint64_t square = (uint64_t)value * (uint64_t)value;
+		uint32_t square_lo = (uint32_t)square;
+		aggregate[4] += square_lo;
+		aggregate[5] += (uint32_t)(square >> 32) + (aggregate[4] < square_lo);
+	}
+}
+
+
+/**
+ * Copy the aggregates accumulated during the last recording run into SDRAM.
+ */
+static void write_aggregates(void)
+{
+	// Wait for the final sample of the run to be accumulated
+	while (dma_in_progress)
+		;
+	
+	if (num_aggregated_results > 0) {
+		uint32_t num_words = num_aggregated_results * AGGREGATE_WORDS;
+		DEBUG("Copying aggregates of %d results into SDRAM\n",
+		      num_aggregated_results);
+		dma_to_sdram(sdram_next_results, aggregate_buffer,
+		             num_words * sizeof(uint32_t));
+		sdram_next_results += num_words;
+	}
+}
+
+
 /**
  * Record a single snapshot of the network's activity.
  *
@@ -276,10 +827,32 @@ void record(bool first, uint32_t deadlines_missed)
 			num_results++; \
 	} while (0)
 	
+	#define APPEND_RAW_RESULT(value) do { \
+			/* Record the value itself, rather than the change in value */ \
+			recorded_value_buffer[num_results] = (value); \
+			num_results++; \
+	} while (0)
+	
 	// Record the number of realtime deadlines missed
 	APPEND_RESULT(deadlines_missed);
 	//recorded_value_buffer[0] = 1234; // XXX
 	
+	// Record core counters. The slack statistics are recorded as-is and reset
+	// for the next recording interval.
+	if (to_record_ext & RECORD_SLACK_MIN_BIT)
+		APPEND_RAW_RESULT(slack_num_steps ? slack_min_ticks : 0);
+	if (to_record_ext & RECORD_SLACK_MEAN_BIT)
+		APPEND_RAW_RESULT(slack_num_steps
+		                  ? (uint32_t)(slack_total_ticks / slack_num_steps)
+		                  : 0);
+	if (to_record_ext & RECORD_INTERRUPT_CYCLES_BIT)
+		APPEND_RESULT(interrupt_ticks);
+	if (to_record_ext & RECORD_GENERATION_CYCLES_BIT)
+		APPEND_RESULT(generation_ticks);
+	slack_min_ticks = 0xFFFFFFFF;
+	slack_total_ticks = 0;
+	slack_num_steps = 0;
+	
 	// Record router counters.
 	for (int counter = 0; counter < NUM_ROUTER_COUNTERS; counter++) {
 		if (to_record & (1u << counter)) {
@@ -306,28 +879,49 @@ void record(bool first, uint32_t deadlines_missed)
 	if (to_record & RECORD_RETRY_BIT)
 		for (int source = 0; source < num_sources; source++)
 			APPEND_RESULT(sources[source].retry_count);
+	if (to_record & RECORD_ROUND_TRIP_BIT)
+		for (int bin = 0; bin < num_sources * num_latency_bins; bin++)
+			APPEND_RESULT(round_trip_histograms[bin]);
 	
 	// Record sink counters
 	if (to_record & RECORD_RECEIVED_BIT)
 		for (int sink = 0; sink < num_sinks; sink++)
 			APPEND_RESULT(sinks[sink].arrived_count);
+	if (to_record & RECORD_LATENCY_BIT)
+		for (int bin = 0; bin < num_sinks * num_latency_bins; bin++)
+			APPEND_RESULT(latency_histograms[bin]);
+	if (to_record_ext & RECORD_SEQUENCE_GAPS_BIT)
+		for (int sink = 0; sink < num_sinks; sink++)
+			APPEND_RESULT(sinks[sink].sequence_gaps_count);
+	if (to_record_ext & RECORD_MISSING_BIT)
+		for (int sink = 0; sink < num_sinks; sink++)
+			APPEND_RESULT(sinks[sink].missing_count);
+	if (to_record_ext & RECORD_DUPLICATED_BIT)
+		for (int sink = 0; sink < num_sinks; sink++)
+			APPEND_RESULT(sinks[sink].duplicated_count);
+	if (to_record_ext & RECORD_OUT_OF_ORDER_BIT)
+		for (int sink = 0; sink < num_sinks; sink++)
+			APPEND_RESULT(sinks[sink].out_of_order_count);
 	
-	// DMA the results into SDRAM
-	if (!first && num_results > 0) {
+	// DMA the results into SDRAM (or accumulate them on-core)
+	if (aggregate_recording) {
+		if (first)
+			reset_aggregates(num_results);
+		else
+			accumulate_aggregates(num_results);
+	} else if (!first && num_results > 0 && compact_recording) {
+		write_compact_results(num_results);
+	} else if (!first && num_results > 0) {
 		DEBUG("Copying %d results into SDRAM\n", num_results);
-		dma_in_progress = true;
-		if (!spin1_dma_transfer(DMA_WRITE, sdram_next_results, recorded_value_buffer, DMA_WRITE,
-		                        num_results * sizeof(uint32_t))) {
-			ERROR("DMA transfer of %d bytes failed.\n", num_results * sizeof(uint32_t));
-			error_occurred |= NT_ERR_DMA;
-			dma_in_progress = false;
-		}
+		dma_to_sdram(sdram_next_results, recorded_value_buffer,
+		             num_results * sizeof(uint32_t));
 		
 		// Advance the SDRAM pointer to the next free space
 		sdram_next_results += num_results;
 	}
 	
 	#undef APPEND_RESULT
+	#undef APPEND_RAW_RESULT
 }
 
 
@@ -363,6 +957,7 @@ uint32_t run(uint32_t time_left_steps, bool enable_recording)
 			deadlines_missed++;
 		time_left_steps--;
 		
+		uint32_t generation_start_ticks = tc2[TC_COUNT];
 		for (int i = 0; i < num_sources; i++) {
 			// Only generate packets when in the correct phase if bursting (or all the
 			// time if not).
@@ -388,7 +983,10 @@ uint32_t run(uint32_t time_left_steps, bool enable_recording)
 						// Retry on back-pressure blocking transmission, if required
 						for (int k = 0; k <= sources[i].num_retries; k++) {
 							// Check to see if the comms controller is able to trasnmit a packet
-							sent = spin1_send_mc_packet(sources[i].key, 0xDEADBEEF,
+							// (timestamping the payload, if present, and giving the packet's
+							// sequence number in the bottom 8 bits of the key).
+							sent = spin1_send_mc_packet(sources[i].key | sources[i].sequence,
+							                            tc2[TC_COUNT],
 							                            sources[i].payload);
 							
 							if (k != 0)
@@ -396,15 +994,26 @@ uint32_t run(uint32_t time_left_steps, bool enable_recording)
 							if (sent)
 								break;
 						}
-						if (sent)
+						if (sent) {
 							sources[i].sent_count++;
-						else
+							sources[i].sequence++;
+						} else {
 							sources[i].blocked_count++;
+						}
 					}
 				}
 			}
 		}
 		
+		// Measure the time spent generating packets and the time remaining before
+		// the next timestep.
+		time_ticks = (int32_t)tc2[TC_COUNT];
+		generation_ticks += generation_start_ticks - (uint32_t)time_ticks;
+		uint32_t slack_ticks = MAX(time_ticks - next_timestep_ticks, 0);
+		slack_min_ticks = MIN(slack_min_ticks, slack_ticks);
+		slack_total_ticks += slack_ticks;
+		slack_num_steps++;
+		
 		// If the recording interval has elapsed, record the state of the network.
 		if (enable_recording
 		    && record_interval_steps > 0
@@ -419,6 +1028,11 @@ uint32_t run(uint32_t time_left_steps, bool enable_recording)
 	if (enable_recording && record_interval_steps == 0)
 		record(false, deadlines_missed);
 	
+	// When aggregating, the aggregates for the whole run are written out once
+	// the run is complete.
+	if (enable_recording && aggregate_recording)
+		write_aggregates();
+	
 	uint32_t errors = (deadlines_missed ? NT_ERR_DEADLINE_MISSED : 0) |
 	                  (deadlines_missed > (num_steps / 2)
 	                   ? NT_ERR_MOST_DEADLINES_MISSED
@@ -470,6 +1084,10 @@ void interpreter_main(uint commands_ptr, uint arg1)
 			
 			case NT_CMD_BARRIER:
 				event_wait();
+				// Restart the (free-running) timer as the barrier is released so that
+				// timestamps carried in packet payloads are approximately comparable
+				// between cores.
+				tc2[TC_LOAD] = 0xFFFFFFFF;
 				break;
 			
 			case NT_CMD_SEED:
@@ -519,13 +1137,48 @@ void interpreter_main(uint commands_ptr, uint arg1)
 			    break;
 			
 			case NT_CMD_RECORD:
-				to_record = *(commands++);
+				// The source/sink number field selects which word of the record
+				// bitmap is being set.
+				if (num == 0) {
+					to_record = *(commands++);
+				} else if (num == 1) {
+					to_record_ext = *(commands++);
+				} else {
+					commands++;
+					ERROR("Record word %d does not exist.\n", num);
+					error_occurred |= NT_ERR_BAD_ARGUMENTS;
+				}
 				break;
 			
 			case NT_CMD_RECORD_INTERVAL:
 				record_interval_steps = *(commands++);
 				break;
 			
+			case NT_CMD_COMPACT_RECORDING:
+				// Results are recorded after a header word (giving the number of bytes
+				// of results recorded) and the supplied number of words reserved for
+				// width tags.
+				compact_recording = true;
+				sdram_block[1] = 0;
+				sdram_next_tags = sdram_block + 2;
+				sdram_next_results = sdram_next_tags + *(commands++);
+				break;
+			
+			case NT_CMD_AGGREGATE_RECORDING:
+				aggregate_recording = true;
+				if (!resize_result_buffers(MAX_NUM_RESULTS(num_sources, num_sinks,
+				                                           num_latency_bins))) {
+					ERROR("Could not allocate space for aggregate_buffer.\n");
+					error_occurred |= NT_ERR_MALLOC;
+					aggregate_recording = false;
+				}
+				break;
+			
+			case NT_CMD_LATENCY_HISTOGRAM:
+				set_latency_histogram(commands[0], NS_TO_TICKS(commands[1]));
+				commands += 2;
+				break;
+			
 			case NT_CMD_PROBABILITY:
 				if (num < num_sources) {
 					sources[num].probability = *(commands++);
@@ -595,6 +1248,24 @@ void interpreter_main(uint commands_ptr, uint arg1)
 				}
 				break;
 			
+			case NT_CMD_NUM_REPLIES:
+				set_num_replies(*(commands++));
+				break;
+			
+			case NT_CMD_REPLY_KEY:
+				// The reply number is given in its own word since a core may
+				// expect more than 256 replies.
+				if (commands[0] < num_replies) {
+					DEBUG("Reply key %d = 0x%08x\n", commands[0], commands[1]);
+					replies[commands[0]].key = commands[1];
+					replies[commands[0]].source = commands[2];
+				} else {
+					ERROR("Reply %d does not exist.\n", commands[0]);
+					error_occurred |= NT_ERR_BAD_ARGUMENTS;
+				}
+				commands += 3;
+				break;
+			
 			case NT_CMD_CONSUME:
 				// Enables the interrupt on packet arrival
 				vic[VIC_ENABLE] = 1 << CC_MC_INT;
@@ -616,6 +1287,17 @@ void interpreter_main(uint commands_ptr, uint arg1)
 					error_occurred |= NT_ERR_BAD_ARGUMENTS;
 				}
 				break;
+			
+			case NT_CMD_ECHO_KEY:
+				if (num < num_sinks) {
+					sinks[num].echo = true;
+					sinks[num].echo_key = *(commands++);
+				} else {
+					commands++;
+					ERROR("Sink %d does not exist.\n", num);
+					error_occurred |= NT_ERR_BAD_ARGUMENTS;
+				}
+				break;
 		}
 	}
 }
@@ -631,34 +1313,58 @@ void c_main(void)
 	
 	// Set default parameters
 	to_record = 0x00000000; // Nothing
+	to_record_ext = 0x00000000; // Nothing
 	record_interval_steps = 0;
 	timestep_ticks = US_TO_TICKS(100);
 	
 	// Initially have no sources/sinks
 	num_sources = 0;
 	num_sinks = 0;
+	num_replies = 0;
+	
+	// Latency histograms are disabled by default
+	num_latency_bins = 0;
+	latency_bin_ticks = 1;
+	latency_histograms = NULL;
+	round_trip_histograms = NULL;
+	
+	// Timing statistics start from zero
+	slack_min_ticks = 0xFFFFFFFF;
+	slack_total_ticks = 0;
+	slack_num_steps = 0;
+	interrupt_ticks = 0;
+	generation_ticks = 0;
 	
 	// Accept MC packets
 	spin1_callback_on(MC_PACKET_RECEIVED, on_mc_packet, -1);
-	spin1_callback_on(MCPL_PACKET_RECEIVED, on_mc_packet, -1);
+	spin1_callback_on(MCPL_PACKET_RECEIVED, on_mcpl_packet, -1);
 	
 	// Monitor DMA completion
 	spin1_callback_on(DMA_TRANSFER_DONE, on_dma_transfer_done, 0);
-	dma_in_progress = false;
+	dma_in_progress = 0;
 	
 	// Allocate space for storing results (this may be reallocated later)
 	last_recorded = sark_alloc(
-		MAX_NUM_RESULTS(num_sources, num_sinks), sizeof(uint32_t));
+		MAX_NUM_RESULTS(num_sources, num_sinks, num_latency_bins),
+		sizeof(uint32_t));
 	if (!last_recorded) {
 		ERROR("Could not allocate space last_recorded.\n");
 		return;
 	}
 	recorded_value_buffer = sark_alloc(
-		MAX_NUM_RESULTS(num_sources, num_sinks), sizeof(uint32_t));
+		MAX_NUM_RESULTS(num_sources, num_sinks, num_latency_bins),
+		sizeof(uint32_t));
 	if (!recorded_value_buffer) {
 		ERROR("Could not allocate space for recorded_value_buffer.\n");
 		return;
 	}
+	compact_tag_buffer = sark_alloc(
+		NUM_TAG_WORDS(MAX_NUM_RESULTS(num_sources, num_sinks, num_latency_bins)),
+		sizeof(uint32_t));
+	if (!compact_tag_buffer) {
+		ERROR("Could not allocate space for compact_tag_buffer.\n");
+		return;
+	}
 	
 	// Get a pointer to the diagnostic counters used by the packet reinjector
 	reinjector_counters = (reinjector_counters_t *)sark_tag_ptr(0xFF, 0);
@@ -669,6 +1375,9 @@ void c_main(void)
 	// with a 32-bit integer giving the number of bytes worth of commands.
 	sdram_block = (uint32_t *)sark_tag_ptr(p, 0);
 	sdram_next_results = sdram_block + 1;
+	compact_recording = false;
+	aggregate_recording = false;
+	aggregate_buffer = NULL;
 	uint32_t commands_length = sdram_block[0];
 	uint32_t *commands = sark_alloc(commands_length, 1);
 	if (commands == NULL) {
@@ -49,6 +49,9 @@
 
 #define NT_CMD_RECORD 0x10
 #define NT_CMD_RECORD_INTERVAL 0x11
+#define NT_CMD_LATENCY_HISTOGRAM 0x12
+#define NT_CMD_COMPACT_RECORDING 0x13
+#define NT_CMD_AGGREGATE_RECORDING 0x14
 
 #define NT_CMD_PROBABILITY 0x20
 #define NT_CMD_BURST_PERIOD 0x21
@@ -59,10 +62,13 @@
 #define NT_CMD_NO_PAYLOAD 0x26
 #define NT_CMD_NUM_RETRIES 0x27
 #define NT_CMD_NUM_PACKETS 0x28
+#define NT_CMD_NUM_REPLIES 0x29
+#define NT_CMD_REPLY_KEY 0x2A
 
 #define NT_CMD_CONSUME 0x30
 #define NT_CMD_NO_CONSUME 0x31
 #define NT_CMD_SINK_KEY 0x32
+#define NT_CMD_ECHO_KEY 0x33
 
 // Error status bits
 #define NT_ERR_STILL_RUNNING (1 << 0)
@@ -99,9 +105,14 @@ typedef struct {
 	// by (1<<32) with 0xFFFFFFFF being special-cased as "1".
 	uint32_t probability;
 	
-	// Should generated packets include payloads?
+	// Should generated packets include payloads? If so, the payload holds the
+	// value of tc2 at the time the packet was sent.
 	bool payload;
 	
+	// The sequence number of the next packet to be sent, sent in the bottom 8
+	// bits of the key. This is only incremented when a packet is actually sent.
+	uint8_t sequence;
+	
 	// Count of packets which have been sent by this core
 	uint32_t sent_count;
 	
@@ -124,8 +135,49 @@ typedef struct {
 	
 	// Count of packets which have arrived at this core
 	uint32_t arrived_count;
+	
+	// Sequence number tracking. seq_next gives the sequence number following
+	// the highest (in serial number arithmetic) sequence number seen so far and
+	// is only valid once seq_valid is true. seq_seen is a bitmap, indexed by
+	// the bottom 7 bits of the sequence number, indicating which of the 128
+	// sequence numbers preceding seq_next have been seen.
+	bool seq_valid;
+	uint8_t seq_next;
+	uint32_t seq_seen[4];
+	
+	// Count of the number of times packets arrived with a sequence number later
+	// than the one expected.
+	uint32_t sequence_gaps_count;
+	
+	// Count of sequence numbers skipped over by packets arriving early.
+	uint32_t missing_count;
+	
+	// Count of packets which arrived with a sequence number already seen.
+	uint32_t duplicated_count;
+	
+	// Count of packets which arrived after a packet with a later sequence
+	// number (and which were not duplicates).
+	uint32_t out_of_order_count;
+	
+	// Should arriving packets be echoed back to their source? If so, a copy of
+	// each arriving packet (including its payload) is sent with the key below.
+	bool echo;
+	uint32_t echo_key;
 } sink_t;
 
+/**
+ * A struct which identifies the source of packets echoed back to this core by a
+ * sink.
+ */
+typedef struct {
+	// The top 24 bits of this value are used as the key of the echoed MC packets
+	// which will be received.
+	uint32_t key;
+	
+	// The index of the source which originally sent the echoed packets.
+	uint32_t source;
+} reply_t;
+
 /**
  * The struct used by the packet reinjector for its status counters.
  */
@@ -0,0 +1,52 @@
+import pytest
+
+import json
+
+import os
+
+from mock import Mock
+
+from network_tester.experiment import Experiment
+
+from network_tester.counters import Counters
+
+from rig.links import Links
+
+from network_tester.columnar import \
+    load_columnar, _encode_object, _decode_object
+
+
+@pytest.mark.parametrize("obj,encoded", [
+    (None, None),
+    (123, 123),
+    (1.5, 1.5),
+    ("foo", "foo"),
+    ((1, 2), [1, 2]),
+    (Counters.sent, {"counter": "sent"}),
+    (Links.north, {"link": "north"}),
+])
+def test_encode_decode_object(obj, encoded):
+    assert _encode_object(obj) == encoded
+    assert _decode_object(encoded) == obj
+
+
+def test_encode_named_objects():
+    e = Experiment(Mock())
+    c0 = e.new_core(name="c0")
+    f0 = e.new_flow(c0, c0, name=1)
+    g0 = e.new_group(name="g0")
+    assert _encode_object(c0) == "c0"
+    assert _encode_object(f0) == 1
+    assert _encode_object(g0) == "g0"
+
+    # Unknown objects become strings
+    assert _encode_object(set()) == "set()"
+
+
+def test_load_columnar_bad_version(tmpdir):
+    path = str(tmpdir)
+    with open(os.path.join(path, "metadata.json"), "w") as f:
+        json.dump({"format_version": -1}, f)
+
+    with pytest.raises(ValueError):
+        load_columnar(path)
@@ -3,7 +3,8 @@ import pytest
 from six import integer_types
 
 from network_tester.commands import \
-    NT_CMD, Commands, wait_time_encode, wait_time_decode
+    NT_CMD, Commands, wait_time_encode, wait_time_decode, compact_tag_words, \
+    max_num_results
 
 from network_tester.counters import Counters
 
@@ -208,6 +209,17 @@ def test_record():
     a.record(Counters.local_multicast, Counters.sent)
     assert len(a._commands) == 2
 
+    # Counters in the upper word should be set by a separate command which is
+    # only sent when that word changes
+    a.record(Counters.local_multicast, Counters.sent, Counters.missing)
+    assert a._commands[2:] == [NT_CMD.RECORD | (1 << 8), 1 << (49 - 32)]
+    a.record(Counters.sent, Counters.missing)
+    assert a._commands[4:] == [NT_CMD.RECORD, 1 << 24]
+
+    # Clearing the upper word should also be sent
+    a.record(Counters.sent)
+    assert a._commands[6:] == [NT_CMD.RECORD | (1 << 8), 0]
+
 
 def test_record_interval():
     # Make sure the record interval is converted correctly and is updated when
@@ -240,6 +252,109 @@ def test_record_interval():
     assert a._commands[-2:] == [NT_CMD.RECORD_INTERVAL, 1000]
 
 
+def test_latency_histogram():
+    # Make sure the histogram shape can be changed
+    a = Commands()
+
+    # Should produce a command the first time (converting to ns)
+    a.latency_histogram(8, 1e-6)
+    assert a._commands == [NT_CMD.LATENCY_HISTOGRAM, 8, 1000]
+
+    # If not changed, shouldn't produce any commands
+    a.latency_histogram(8, 1e-6)
+    assert len(a._commands) == 3
+
+    # Changing either value should produce a new command
+    a.latency_histogram(4, 1e-6)
+    assert a._commands[3:] == [NT_CMD.LATENCY_HISTOGRAM, 4, 1000]
+    a.latency_histogram(4, 2.5e-7)
+    assert a._commands[6:] == [NT_CMD.LATENCY_HISTOGRAM, 4, 250]
+
+
+def test_num_replies():
+    # Make sure the number of replies can be set
+    a = Commands()
+    a.num_replies(3)
+    assert a._commands == [NT_CMD.NUM_REPLIES, 3]
+
+
+def test_reply_key():
+    # Make sure the reply keys can be changed.
+    a = Commands()
+    a.num(2, 0)
+    a.num_replies(2)
+    assert len(a._commands) == 4
+
+    # Should produce a command on first setting (masking off bottom bits)
+    a.reply_key(0, 0x00BEEFAA, 1)
+    assert a._commands[4:] == [NT_CMD.REPLY_KEY, 0, 0x00BEEF00, 1]
+    a.reply_key(1, 0x00DEAD00, 0)
+    assert a._commands[8:] == [NT_CMD.REPLY_KEY, 1, 0x00DEAD00, 0]
+
+    # No command should be produced on non-change
+    a.reply_key(0, 0x00BEEFCC, 1)
+    assert len(a._commands) == 12
+
+    # Changing either the key or source should produce a command
+    a.reply_key(0, 0x00BEEF00, 0)
+    assert a._commands[12:] == [NT_CMD.REPLY_KEY, 0, 0x00BEEF00, 0]
+
+
+def test_reply_key_many_replies():
+    # The reply number is not limited to 8 bits
+    a = Commands()
+    a.num(1, 0)
+    a.num_replies(300)
+    a.reply_key(299, 0x00BEEF00, 0)
+    assert a._commands[4:] == [NT_CMD.REPLY_KEY, 299, 0x00BEEF00, 0]
+
+
+def test_echo_key():
+    # Make sure sinks can be made to echo packets.
+    a = Commands()
+    a.num(0, 2)
+    assert len(a._commands) == 2
+
+    # Should produce a command when first set (masking off bottom bits), even
+    # if zero
+    a.echo_key(0, 0x000000AA)
+    assert a._commands[2:] == [NT_CMD.ECHO_KEY | (0 << 8), 0x00000000]
+    a.echo_key(1, 0x00DEADBB)
+    assert a._commands[4:] == [NT_CMD.ECHO_KEY | (1 << 8), 0x00DEAD00]
+
+    # No command should be produced on non-change
+    a.echo_key(0, 0x00000000)
+    a.echo_key(1, 0x00DEADDD)
+    assert len(a._commands) == 6
+
+
+def test_compact_recording():
+    a = Commands()
+    a.compact_recording(123)
+    assert a._commands == [NT_CMD.COMPACT_RECORDING, 123]
+
+
+def test_aggregate_recording():
+    a = Commands()
+    a.aggregate_recording()
+    assert a._commands == [NT_CMD.AGGREGATE_RECORDING]
+
+
+@pytest.mark.parametrize("num_values,num_words",
+                         [(0, 0), (1, 1), (16, 1), (17, 2), (32, 2)])
+def test_compact_tag_words(num_values, num_words):
+    assert compact_tag_words(num_values) == num_words
+
+
+@pytest.mark.parametrize("num_sources,num_sinks,num_bins,num_results",
+                         [(0, 0, 0, 24),
+                          (2, 0, 0, 30),
+                          (0, 3, 0, 39),
+                          (2, 3, 4, 65)])
+def test_max_num_results(num_sources, num_sinks, num_bins, num_results):
+    assert max_num_results(num_sources, num_sinks, num_bins) == num_results
+
+
 def test_probability():
     # Make sure the probability can be changed.
     a = Commands()
@@ -4,6 +4,10 @@ from network_tester.counters import Counters
 def test_counters_classes():
     # Make sure each of the counter types is identified correctly
     permanent_counters = set([Counters.deadlines_missed])
+    core_counters = set([Counters.slack_min,
+                         Counters.slack_mean,
+                         Counters.interrupt_cycles,
+                         Counters.generation_cycles])
     router_counters = set([Counters.local_multicast,
                            Counters.external_multicast,
                            Counters.local_p2p,
@@ -23,36 +27,51 @@ def test_counters_classes():
     reinjector_counters = set([Counters.reinjected,
                                Counters.reinject_overflow,
                                Counters.reinject_missed])
-    source_counters = set([Counters.sent, Counters.blocked, Counters.retried])
-    sink_counters = set([Counters.received])
+    source_counters = set([Counters.sent, Counters.blocked, Counters.retried,
+                           Counters.round_trip])
+    sink_counters = set([Counters.received, Counters.latency,
+                         Counters.sequence_gaps, Counters.missing,
+                         Counters.duplicated, Counters.out_of_order])
 
     for counter in Counters:
         if counter in permanent_counters:
             assert counter.permanent_counter
+            assert not counter.core_counter
+            assert not counter.router_counter
+            assert not counter.reinjector_counter
+            assert not counter.source_counter
+            assert not counter.sink_counter
+        elif counter in core_counters:
+            assert not counter.permanent_counter
+            assert counter.core_counter
             assert not counter.router_counter
             assert not counter.reinjector_counter
             assert not counter.source_counter
             assert not counter.sink_counter
         elif counter in router_counters:
             assert not counter.permanent_counter
+            assert not counter.core_counter
             assert counter.router_counter
             assert not counter.reinjector_counter
             assert not counter.source_counter
             assert not counter.sink_counter
         elif counter in reinjector_counters:
             assert not counter.permanent_counter
+            assert not counter.core_counter
             assert not counter.router_counter
             assert counter.reinjector_counter
             assert not counter.source_counter
             assert not counter.sink_counter
         elif counter in source_counters:
             assert not counter.permanent_counter
+            assert not counter.core_counter
             assert not counter.router_counter
             assert not counter.reinjector_counter
             assert counter.source_counter
             assert not counter.sink_counter
         elif counter in sink_counters:
             assert not counter.permanent_counter
+            assert not counter.core_counter
             assert not counter.router_counter
             assert not counter.reinjector_counter
             assert not counter.source_counter
@@ -61,6 +80,12 @@ def test_counters_classes():
             assert False
 
 
+def test_histogram_counters():
+    histogram_counters = set([Counters.round_trip, Counters.latency])
+    for counter in Counters:
+        assert counter.histogram_counter == (counter in histogram_counters)
+
+
 def test_ordering():
     # Order of iteration *must* be the same as the order of the definition bits
     # since the order is used to indicate which result is which in the results.
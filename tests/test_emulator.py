@@ -0,0 +1,261 @@
+import pytest
+
+import os
+
+import struct
+
+import numpy as np
+
+from rig.machine_control.machine_controller import \
+    SystemInfo, ChipInfo, SpiNNakerMemoryError, SpiNNakerRouterError
+from rig.machine_control.consts import AppState
+from rig.routing_table import RoutingTableEntry, Routes
+
+from network_tester import emulator
+from network_tester.emulator import EmulatedMachineController
+
+from network_tester.experiment import Experiment
+
+from network_tester.commands import Commands
+
+from network_tester.errors import NT_ERR
+
+
+def test_system_info():
+    mc = EmulatedMachineController(3, 2)
+    system_info = mc.get_system_info()
+    assert (system_info.width, system_info.height) == (3, 2)
+    assert len(system_info) == 6
+
+    system_info = SystemInfo(1, 1, {(0, 0): ChipInfo()})
+    mc = EmulatedMachineController(system_info=system_info)
+    assert mc.get_system_info() is system_info
+
+    assert mc.num_operations["get_system_info"] == 1
+
+
+def test_sdram():
+    system_info = SystemInfo(1, 1, {
+        (0, 0): ChipInfo(largest_free_sdram_block=100)})
+    mc = EmulatedMachineController(system_info=system_info)
+
+    with mc.application(0x42):
+        sdram = mc.sdram_alloc_as_filelike(60, x=0, y=0, tag=1)
+        assert sdram.read() == b"\0" * 60
+        assert sdram.tell() == 60
+
+        sdram.seek(10)
+        assert sdram.write(b"hello") == 5
+        sdram.seek(-5, os.SEEK_CUR)
+        assert sdram.read(5) == b"hello"
+        sdram.seek(-2, os.SEEK_END)
+        assert sdram.write(b"abc") == 2
+        assert sdram.read(10) == b""
+
+        # Tags may only be used once
+        with pytest.raises(SpiNNakerMemoryError):
+            mc.sdram_alloc_as_filelike(10, x=0, y=0, tag=1)
+
+        # Allocations are limited to the free memory
+        mc.sdram_alloc_as_filelike(40, x=0, y=0)
+        with pytest.raises(SpiNNakerMemoryError):
+            mc.sdram_alloc_as_filelike(1, x=0, y=0)
+
+    # Memory is freed when the application stops
+    with mc.application(0x42):
+        mc.sdram_alloc_as_filelike(100, x=0, y=0, tag=1)
+
+    assert mc.num_operations["sdram_alloc_as_filelike"] == 5
+    assert mc.num_units["sdram_alloc_as_filelike"] == 211
+    assert mc.num_operations["write"] == 2
+    assert mc.num_units["write"] == 7
+    assert mc.num_units["read"] == 65
+
+
+def test_load_routing_tables():
+    system_info = SystemInfo(1, 1, {
+        (0, 0): ChipInfo(largest_free_rtr_mc_block=2)})
+    mc = EmulatedMachineController(system_info=system_info)
+    entry = RoutingTableEntry({Routes.core(1)}, 0x100, 0xFFFFFF00)
+
+    mc.load_routing_tables({(0, 0): [entry, entry]})
+    with pytest.raises(SpiNNakerRouterError):
+        mc.load_routing_tables({(0, 0): [entry, entry, entry]})
+
+    assert mc.num_units["load_routing_tables"] == 5
+
+
+def test_latencies(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(emulator.time, "sleep", sleeps.append)
+
+    mc = EmulatedMachineController(1, 1, latencies={
+        "sdram_alloc_as_filelike": (0.5, 0.0),
+        "write": (0.25, 0.125),
+        "read": (0.0, 0.0),
+    })
+    sdram = mc.sdram_alloc_as_filelike(8, x=0, y=0)
+    sdram.write(b"1234")
+    sdram.read(4)
+    mc.send_signal("sync0")
+    assert sleeps == [0.5, 0.75]
+
+
+def test_barriers():
+    mc = EmulatedMachineController(1, 1, seed=1)
+
+    # Core 1 waits at two barriers, core 2 at one
+    for p, num_barriers in ((1, 2), (2, 1)):
+        c = Commands()
+        c.timestep(1e-5)
+        for _ in range(num_barriers):
+            c.barrier()
+            c.run(1e-3)
+        c.exit()
+        mc.sdram_alloc_as_filelike(c.size, x=0, y=0, tag=p).write(c.pack())
+    mc.load_application({"/foo/network_tester.aplx": {(0, 0): set([1, 2])}})
+
+    assert mc.wait_for_cores_to_reach_state("sync0", 2) == 2
+    assert mc.wait_for_cores_to_reach_state(AppState.sync1, 2) == 0
+    assert mc.wait_for_cores_to_reach_state("exit", 2) == 0
+    mc.send_signal("sync0")
+    assert mc.wait_for_cores_to_reach_state("sync0", 2) == 0
+    assert mc.wait_for_cores_to_reach_state(AppState.sync1, 2) == 1
+    assert mc.wait_for_cores_to_reach_state("exit", 2) == 1
+    mc.send_signal(AppState.sync1)
+    assert mc.wait_for_cores_to_reach_state("exit", 2) == 2
+
+    # Other applications are not run
+    mc.sdram_alloc_as_filelike(4, x=0, y=0, tag=3)
+    mc.load_application({"/foo/reinjector.aplx": {(0, 0): set([3])}})
+    assert mc.wait_for_cores_to_reach_state("exit", 3) == 2
+
+
+def test_unexpected_packet():
+    mc = EmulatedMachineController(2, 1, seed=1)
+    mc.load_routing_tables({
+        (0, 0): [RoutingTableEntry({Routes.east}, 0x100, 0xFFFFFF00)],
+        (1, 0): [RoutingTableEntry({Routes.core(1)}, 0x100, 0xFFFFFF00)],
+    })
+
+    source = Commands()
+    source.num(1, 0)
+    source.source_key(0, 0x100)
+    source.probability(0, 1.0)
+    source.timestep(1e-5)
+    source.record_interval(0.0)
+    source.record()
+    source.run(1e-3)
+    source.exit()
+    sink = Commands()
+    sink.timestep(1e-5)
+    sink.record_interval(0.0)
+    sink.record()
+    sink.run(1e-3)
+    sink.exit()
+    sdram = {}
+    for (x, y, p), c in (((0, 0, 1), source), ((1, 0, 1), sink)):
+        sdram[(x, y)] = mc.sdram_alloc_as_filelike(64, x=x, y=y, tag=p)
+        sdram[(x, y)].write(c.pack())
+    mc.load_application({"network_tester.aplx": {(0, 0): set([1]),
+                                                 (1, 0): set([1])}})
+
+    sdram[(0, 0)].seek(0)
+    assert struct.unpack("<II", sdram[(0, 0)].read(8)) == (0, 0)
+    sdram[(1, 0)].seek(0)
+    assert struct.unpack("<II", sdram[(1, 0)].read(8)) == \
+        (NT_ERR.UNEXPECTED_PACKET, 0)
+
+
+@pytest.mark.parametrize("simulate", [False, True])
+@pytest.mark.parametrize("recording", ["raw", "compact", "aggregate"])
+def test_experiment(simulate, recording):
+    mc = EmulatedMachineController(4, 4, simulate=simulate, seed=1)
+    e = Experiment(mc)
+    e.timestep = 1e-5
+    e.warmup = 0.0
+    e.duration = 1e-3
+    e.cooldown = 0.0
+    e.flush_time = 0.0
+    e.record_interval = 2e-4
+    e.record_sent = True
+    e.record_received = True
+    e.record_local_multicast = True
+    e.record_external_multicast = True
+    e.compact_recording = recording == "compact"
+    e.aggregate_recording = recording == "aggregate"
+
+    cores = [e.new_core(x, y) for x in range(4) for y in range(4)]
+    for i, core in enumerate(cores):
+        e.new_flow(core, cores[(i + 5) % len(cores)])
+    groups = []
+    for probability in (0.5, 1.0):
+        with e.new_group() as group:
+            e.probability = probability
+        groups.append(group)
+
+    results = e.run(ignore_deadline_errors=True)
+    totals = results.totals()
+    assert not results.errors
+    assert len(totals) == 2 if recording == "aggregate" else 10
+
+    for group, probability in zip(groups, (0.5, 1.0)):
+        group_totals = totals[totals["group"] == group]
+        sent = group_totals["sent"].sum()
+        assert abs(sent - (probability * 16 * 100)) < 160
+        assert abs(group_totals["received"].sum() - sent) <= 16
+        assert group_totals["external_multicast"].sum() > 0
+
+    # Each core's commands and results are written and read once
+    assert mc.num_operations["load_application"] == 1
+    assert mc.num_operations["write"] == len(cores)
+    if recording == "compact":
+        assert mc.num_operations["read"] == 2 * len(cores)
+    else:
+        assert mc.num_operations["read"] == len(cores)
+    assert mc.num_operations["sdram_alloc_as_filelike"] == len(cores)
+
+
+def test_fast_model():
+    mc = EmulatedMachineController(4, 4, seed=1, hop_latency=1e-7)
+    e = Experiment(mc)
+    e.timestep = 1e-5
+    e.warmup = 0.0
+    e.duration = 1e-3
+    e.cooldown = 0.0
+    e.flush_time = 0.0
+    e.burst_period = 1e-4
+    e.burst_duty = 0.5
+    e.record_sent = True
+    e.record_received = True
+    e.record_latency = True
+    e.record_round_trip = True
+    e.record_interrupt_cycles = True
+    e.record_generation_cycles = True
+    e.record_slack_mean = True
+    e.latency_bin_width = 1e-7
+
+    source = e.new_core(0, 0)
+    sink = e.new_core(2, 0)
+    flow = e.new_flow(source, sink)
+    flow.echo = True
+    results = e.run()
+
+    # Sources send in half of their timesteps and every packet arrives and
+    # returns
+    flow_totals = results.flow_totals()
+    assert flow_totals["sent"] == flow_totals["received"] == 50
+
+    latency = results.latency_histograms()
+    round_trip = results.round_trip_histograms()
+    assert latency["count"].sum() == round_trip["count"].sum() == 50
+    assert np.all(latency["count"][latency["latency"] > 3e-7] == 0)
+    assert np.all(round_trip["count"][round_trip["round_trip"] < 4e-7] == 0)
+
+    core_totals = results.core_totals()
+    source_totals = core_totals[core_totals["core"] == source]
+    sink_totals = core_totals[core_totals["core"] == sink]
+    assert source_totals["generation_cycles"] == 50 * 60
+    assert source_totals["interrupt_cycles"] == 50 * 120
+    assert sink_totals["interrupt_cycles"] == 50 * 120
+    assert 0 < sink_totals["slack_mean"] < 2000
@@ -40,6 +40,7 @@ def test_exception():
     # Single error should have a full error name in
     err = NetworkTesterError(mock_results)
     assert err.results is mock_results
+    assert err.profile is mock_results.profile
     assert "NT_ERR_DMA" in str(err)
 
     # Multiple errors should also be listed
@@ -4,9 +4,13 @@ import struct
 
 import warnings
 
+from collections import OrderedDict
+
 from mock import Mock
 
-from six import itervalues
+from six import BytesIO, iteritems, itervalues
+
+import numpy as np
 
 from rig.netlist import Net as RigNet
 
@@ -14,6 +18,10 @@ from rig.machine_control.machine_controller import SystemInfo, ChipInfo
 from rig.machine_control.consts import AppState
 from rig.links import Links
 
+from rig.routing_table import Routes
+
+from rig.place_and_route.routing_tree import RoutingTree
+
 from rig.place_and_route import Cores
 
 from rig.place_and_route import place, allocate, route
@@ -21,7 +29,8 @@ from rig.place_and_route.constraints import \
     ReserveResourceConstraint, LocationConstraint
 
 from network_tester.experiment import \
-    Experiment, Core, Flow, Group, _ReinjectionCore, APIChangedError
+    Experiment, Core, Flow, Group, _ReinjectionCore, _ReplyFlow, \
+    APIChangedError, _copy_to_file
 
 from network_tester.commands import NT_CMD
 
@@ -31,6 +40,8 @@ from network_tester.errors import NetworkTesterError
 
 from network_tester.results import Results
 
+from network_tester.emulator import EmulatedMachineController
+
 
 def test_hostname_or_machine_controler(monkeypatch):
     # If a hostname is passed in, a new MC should be made
@@ -412,6 +423,11 @@ def test_new_flow():
     assert flow.sinks == [cores[9]]
     assert flow.weight == 123
 
+    # Flows don't echo by default
+    assert not flow.echo
+    flow = e.new_flow(cores[0], cores[1], echo=True)
+    assert flow.echo
+
 
 def test_system_info(monkeypatch):
     # Make sure lazy-loading of the system_info works
@@ -651,6 +667,40 @@ def test_place_and_route(record_reinjected):
     assert set(e.routes) == set([f0])
 
 
+def test_place_and_route_echo():
+    # Flows which echo packets should have a reply flow routed back from each
+    # sink which is hidden from the user.
+    mock_mc = Mock()
+    mock_mc.get_system_info.return_value = SystemInfo(2, 2, {
+        (x, y): ChipInfo(num_cores=18,
+                         core_states=[AppState.run] + [AppState.idle] * 17,
+                         working_links=set(Links),
+                         largest_free_sdram_block=110*1024*1024,
+                         largest_free_sram_block=1024*1024)
+        for x in range(2)
+        for y in range(2)
+    })
+
+    e = Experiment(mock_mc)
+    c0 = e.new_core(0, 0)
+    c1 = e.new_core(1, 1)
+    c2 = e.new_core(0, 1)
+    f0 = e.new_flow(c0, [c1, c2], echo=True)
+    f1 = e.new_flow(c1, c2)
+
+    e._place_and_route()
+
+    assert set(e._reply_flows) == set([(f0, c1), (f0, c2)])
+    for (flow, sink), reply_flow in iteritems(e._reply_flows):
+        assert reply_flow.flow is flow
+        assert reply_flow.source is sink
+        assert reply_flow.sinks == [flow.source]
+
+    assert set(e._routes) == set([f0, f1]).union(
+        set(itervalues(e._reply_flows)))
+    assert set(e.routes) == set([f0, f1])
+
+
 @pytest.mark.parametrize("router_access_core", [True, False])
 def test_construct_core_commands(router_access_core):
     # XXX: This test is *very* far from being complete. In particular, though
@@ -732,6 +782,7 @@ def test_construct_core_commands(router_access_core):
             core=core,
             source_flows=cores_source_flows[core],
             sink_flows=cores_sink_flows[core],
+            reply_flows=[],
             flow_keys=flow_keys,
             records=[Counters.deadlines_missed, Counters.sent],
             router_access_core=router_access_core).pack()
@@ -796,6 +847,125 @@ def test_construct_core_commands(router_access_core):
             assert ref_cmd0 not in commands
             assert ref_cmd1 not in commands
 
+    # Latency histograms are not recorded and so should not be configured
+    for core in cores:
+        commands = core_commands[core]
+        ref_cmd = struct.pack("<I", NT_CMD.LATENCY_HISTOGRAM)
+        assert ref_cmd not in commands
+
+    # No flows echo and so no echo/reply keys should be set
+    for core in cores:
+        commands = core_commands[core]
+        assert struct.pack("<I", NT_CMD.NUM_REPLIES) not in commands
+        for num in range(3):
+            ref_cmd = struct.pack("<I", NT_CMD.ECHO_KEY | (num << 8))
+            assert ref_cmd not in commands
+
+
+def test_construct_core_commands_latency_histogram():
+    # Make sure latency histograms are configured when recorded
+    e = Experiment(Mock())
+    core0 = e.new_core()
+    core1 = e.new_core()
+    flow0 = e.new_flow(core0, core1)
+    e.new_group()
+
+    e.latency_bins = 4
+    e.latency_bin_width = 2e-6
+
+    commands = e._construct_core_commands(
+        core=core1, source_flows=[], sink_flows=[flow0], reply_flows=[],
+        flow_keys={flow0: 0xAA00},
+        records=[Counters.deadlines_missed] + [Counters.latency] * 4,
+        router_access_core=False).pack()
+    assert struct.pack("<III", NT_CMD.LATENCY_HISTOGRAM, 4, 2000) in commands
+
+
+def test_construct_core_commands_compact_recording():
+    # Make sure space is reserved for width tags when compactly recording.
+    e = Experiment(Mock())
+    core0 = e.new_core()
+    e.new_group()
+    e.new_group()
+    with e.new_group():
+        e.record_interval = e.duration / 3.0
+    records = [Counters.deadlines_missed] + [Counters.sent] * 16
+
+    commands = e._construct_core_commands(
+        core=core0, source_flows=[], sink_flows=[], reply_flows=[],
+        flow_keys={}, records=records, router_access_core=False).pack()
+    assert struct.pack("<I", NT_CMD.COMPACT_RECORDING) not in commands
+
+    # Five samples, two tag words per sample
+    e.compact_recording = True
+    commands = e._construct_core_commands(
+        core=core0, source_flows=[], sink_flows=[], reply_flows=[],
+        flow_keys={}, records=records, router_access_core=False).pack()
+    assert struct.pack("<II", NT_CMD.COMPACT_RECORDING, 10) in commands
+
+
+def test_construct_core_commands_aggregate_recording():
+    # Make sure results are aggregated on-core when required
+    e = Experiment(Mock())
+    core0 = e.new_core()
+    e.new_group()
+    records = [Counters.deadlines_missed, Counters.sent]
+
+    commands = e._construct_core_commands(
+        core=core0, source_flows=[], sink_flows=[], reply_flows=[],
+        flow_keys={}, records=records, router_access_core=False).pack()
+    assert struct.pack("<I", NT_CMD.AGGREGATE_RECORDING) not in commands
+
+    e.aggregate_recording = True
+    commands = e._construct_core_commands(
+        core=core0, source_flows=[], sink_flows=[], reply_flows=[],
+        flow_keys={}, records=records, router_access_core=False).pack()
+    assert struct.pack("<I", NT_CMD.AGGREGATE_RECORDING) in commands
+
+
+def test_construct_core_commands_echo():
+    # Make sure sinks of echo flows send packets back to the source and that
+    # the source knows which source each reply belongs to.
+    e = Experiment(Mock())
+    core0 = e.new_core()
+    core1 = e.new_core()
+    flow0 = e.new_flow(core0, core1)
+    flow1 = e.new_flow(core0, core1, echo=True)
+    e.new_group()
+    e.record_round_trip = True
+    e.latency_bins = 2
+
+    reply1 = _ReplyFlow(flow1, core1)
+    e._reply_flows = {(flow1, core1): reply1}
+    flow_keys = {flow0: 0xAA00, flow1: 0xBB00, reply1: 0xCC00}
+
+    source_commands = e._construct_core_commands(
+        core=core0, source_flows=[flow0, flow1], sink_flows=[],
+        reply_flows=[reply1], flow_keys=flow_keys,
+        records=[Counters.deadlines_missed] + [Counters.round_trip] * 4,
+        router_access_core=False).pack()
+    sink_commands = e._construct_core_commands(
+        core=core1, source_flows=[], sink_flows=[flow0, flow1],
+        reply_flows=[], flow_keys=flow_keys,
+        records=[Counters.deadlines_missed],
+        router_access_core=False).pack()
+
+    # The source should expect the reply and attribute it to source 1
+    assert struct.pack("<II", NT_CMD.NUM_REPLIES, 1) in source_commands
+    assert struct.pack("<IIII", NT_CMD.REPLY_KEY, 0,
+                       0xCC00, 1) in source_commands
+    assert struct.pack("<I", NT_CMD.LATENCY_HISTOGRAM) in source_commands
+
+    # Only the echo flow should be forced to carry a payload
+    assert struct.pack("<I", NT_CMD.PAYLOAD | (0 << 8)) not in source_commands
+    assert struct.pack("<I", NT_CMD.PAYLOAD | (1 << 8)) in source_commands
+
+    # Only the sink of the echo flow should echo
+    assert struct.pack("<I", NT_CMD.ECHO_KEY | (0 << 8)) not in sink_commands
+    assert struct.pack("<II", NT_CMD.ECHO_KEY | (1 << 8),
+                       0xCC00) in sink_commands
+    assert struct.pack("<I", NT_CMD.NUM_REPLIES) not in sink_commands
+
 
 def test_core_chip_incomplete():
     # If only X or only Y are specified, things should fail
@@ -864,6 +1034,72 @@ def test_get_core_record_lookup():
                 (flow1, Counters.received)],
     }
 
+    # Histogram counters should be listed once per bin
+    e.latency_bins = 3
+    e.record_latency = True
+    cores_records = e._get_core_record_lookup(
+        cores,
+        cores_source_flows,
+        cores_sink_flows)
+    assert cores_records == {
+        core0: [(core0, Counters.deadlines_missed),
+                ((0, 0), Counters.external_multicast),
+                (flow0, Counters.sent), (flow1, Counters.sent),
+                (flow0, Counters.received),
+                (flow0, Counters.latency),
+                (flow0, Counters.latency),
+                (flow0, Counters.latency)],
+        core1: [(core1, Counters.deadlines_missed),
+                (flow1, Counters.received),
+                (flow1, Counters.latency),
+                (flow1, Counters.latency),
+                (flow1, Counters.latency)],
+    }
+
+    # Core counters are listed immediately after the permanent counters
+    e.record_latency = False
+    e.record_slack_min = True
+    e.record_generation_cycles = True
+    cores_records = e._get_core_record_lookup(
+        cores,
+        cores_source_flows,
+        cores_sink_flows)
+    assert cores_records == {
+        core0: [(core0, Counters.deadlines_missed),
+                (core0, Counters.slack_min),
+                (core0, Counters.generation_cycles),
+                ((0, 0), Counters.external_multicast),
+                (flow0, Counters.sent), (flow1, Counters.sent),
+                (flow0, Counters.received)],
+        core1: [(core1, Counters.deadlines_missed),
+                (core1, Counters.slack_min),
+                (core1, Counters.generation_cycles),
+                (flow1, Counters.received)],
+    }
+    e.record_slack_min = False
+    e.record_generation_cycles = False
+
+    # Source histograms are listed after the other source counters
+    e.latency_bins = 2
+    e.record_latency = False
+    e.record_round_trip = True
+    cores_records = e._get_core_record_lookup(
+        cores,
+        cores_source_flows,
+        cores_sink_flows)
+    assert cores_records == {
+        core0: [(core0, Counters.deadlines_missed),
+                ((0, 0), Counters.external_multicast),
+                (flow0, Counters.sent), (flow1, Counters.sent),
+                (flow0, Counters.round_trip),
+                (flow0, Counters.round_trip),
+                (flow1, Counters.round_trip),
+                (flow1, Counters.round_trip),
+                (flow0, Counters.received)],
+        core1: [(core1, Counters.deadlines_missed),
+                (flow1, Counters.received)],
+    }
+
 
 @pytest.mark.parametrize("auto_create_group", [True, False])
 @pytest.mark.parametrize("samples_per_group",
@@ -1001,6 +1237,117 @@ def test_run(auto_create_group, samples_per_group, num_cores,
     assert len(mock_mc.send_signal.mock_calls) == num_groups
 
 
+def test_run_compact_recording():
+    """Make sure compactly recorded results are allocated and read back
+    correctly."""
+    system_info = SystemInfo(1, 1, {
+        (0, 0): ChipInfo(num_cores=18,
+                         core_states=[AppState.run] + [AppState.idle] * 17,
+                         working_links=set(Links),
+                         largest_free_sdram_block=110*1024*1024,
+                         largest_free_sram_block=1024*1024)
+    })
+
+    mock_mc = Mock()
+    mock_mc.get_system_info.return_value = system_info
+    mock_application_ctx = Mock()
+    mock_application_ctx.__enter__ = Mock()
+    mock_application_ctx.__exit__ = Mock()
+    mock_mc.application.return_value = mock_application_ctx
+    mock_mc.wait_for_cores_to_reach_state.return_value = 1
+
+    # Two samples of (deadlines_missed, sent): the first is (0, 3) and the
+    # second (0, 300).
+    data = struct.pack("<II", 0, 8)  # No errors, 8 bytes of data
+    data += struct.pack("<II", 0x4, 0x8)  # Tags
+    data += b"\x03\0\0\0" + b"\x2C\x01\0\0"  # Data
+    reads = []
+
+    def mock_sdram_file_read(size):
+        reads.append(size)
+        offset = sum(reads[:-1])
+        return data[offset:offset + size]
+    mock_sdram_file = Mock()
+    mock_sdram_file.read.side_effect = mock_sdram_file_read
+    mock_mc.sdram_alloc_as_filelike.return_value = mock_sdram_file
+
+    e = Experiment(mock_mc)
+    e.timestep = 1e-6
+    e.duration = 0.01
+    e.flush_time = 0.0
+    e.record_interval = 0.005
+    e.record_sent = True
+    e.compact_recording = True
+
+    c0 = e.new_core(0, 0)
+    e.new_flow(c0, c0)
+
+    results = e.run()
+    assert list(results.totals()["sent"]) == [3, 300]
+
+    # Space for the worst case should have been allocated: the error and
+    # header words, one tag word per sample and then two values per sample.
+    size = mock_mc.sdram_alloc_as_filelike.mock_calls[0][1][0]
+    assert size >= (2 + 2 + (2 * 2)) * 4
+
+    # Only the data actually recorded should be read back
+    assert reads == [8, 16]
+
+
+def test_run_aggregate_recording():
+    """Make sure space for aggregated results is allocated and read back
+    correctly."""
+    system_info = SystemInfo(1, 1, {
+        (0, 0): ChipInfo(num_cores=18,
+                         core_states=[AppState.run] + [AppState.idle] * 17,
+                         working_links=set(Links),
+                         largest_free_sdram_block=110*1024*1024,
+                         largest_free_sram_block=1024*1024)
+    })
+
+    mock_mc = Mock()
+    mock_mc.get_system_info.return_value = system_info
+    mock_application_ctx = Mock()
+    mock_application_ctx.__enter__ = Mock()
+    mock_application_ctx.__exit__ = Mock()
+    mock_mc.application.return_value = mock_application_ctx
+    mock_mc.wait_for_cores_to_reach_state.return_value = 1
+
+    # The aggregates of (deadlines_missed, sent) for two samples of sent: 3
+    # and 300.
+    data = struct.pack("<I", 0)  # No errors
+    data += struct.pack("<6I", 0, 0, 0, 0, 0, 0)
+    data += struct.pack("<6I", 303, 0, 3, 300, 90009, 0)
+    mock_sdram_file = Mock()
+    mock_sdram_file.read.return_value = data
+    mock_mc.sdram_alloc_as_filelike.return_value = mock_sdram_file
+
+    e = Experiment(mock_mc)
+    e.timestep = 1e-6
+    e.duration = 0.01
+    e.flush_time = 0.0
+    e.record_interval = 0.005
+    e.record_sent = True
+    e.aggregate_recording = True
+
+    c0 = e.new_core(0, 0)
+    e.new_flow(c0, c0)
+
+    results = e.run()
+    assert list(results.totals()["sent"]) == [303]
+    stats = results.counter_statistics()
+    assert list(stats["mean"]) == [0, 151.5]
+    assert list(stats["max"]) == [0, 300]
+
+    # Only the aggregates for the single group should be read back
+    mock_sdram_file.read.assert_called_once_with(len(data))
+
+    # Compact and aggregate recording cannot be combined
+    e.compact_recording = True
+    with pytest.raises(ValueError):
+        e.run()
+
+
 def test_run_callbacks():
     """Make sure that the run command's callbacks occur at the right time."""
     num_groups = 3
@@ -1117,3 +1464,324 @@ def test_api_changed_errors():
         e.allocations = {}
     with pytest.raises(APIChangedError):
         e.routes = {}
+
+
+@pytest.mark.parametrize("compact_recording", [False, True])
+def test_run_results_file(compact_recording, tmpdir):
+    """Make sure results can be streamed into a file and processed
+    out-of-core."""
+    system_info = SystemInfo(1, 1, {
+        (0, 0): ChipInfo(num_cores=18,
+                         core_states=[AppState.run] + [AppState.idle] * 17,
+                         working_links=set(Links),
+                         largest_free_sdram_block=110*1024*1024,
+                         largest_free_sram_block=1024*1024)
+    })
+
+    mock_mc = Mock()
+    mock_mc.get_system_info.return_value = system_info
+    mock_application_ctx = Mock()
+    mock_application_ctx.__enter__ = Mock()
+    mock_application_ctx.__exit__ = Mock()
+    mock_mc.application.return_value = mock_application_ctx
+    mock_mc.wait_for_cores_to_reach_state.return_value = 1
+
+    # Two samples of (deadlines_missed, sent): the first is (0, 3) and the
+    # second (0, 300).
+    if compact_recording:
+        data = struct.pack("<II", 0, 8)  # No errors, 8 bytes of data
+        data += struct.pack("<II", 0x4, 0x8)  # Tags
+        data += struct.pack("<II", 3, 300)  # Data
+    else:
+        data = struct.pack("<5I", 0, 0, 3, 0, 300)
+    reads = []
+
+    def mock_sdram_file_read(size):
+        reads.append(size)
+        offset = sum(reads[:-1])
+        return data[offset:offset + size]
+    mock_sdram_file = Mock()
+    mock_sdram_file.read.side_effect = mock_sdram_file_read
+    mock_mc.sdram_alloc_as_filelike.return_value = mock_sdram_file
+
+    e = Experiment(mock_mc)
+    e.timestep = 1e-6
+    e.duration = 0.01
+    e.flush_time = 0.0
+    e.record_interval = 0.005
+    e.record_sent = True
+    e.compact_recording = compact_recording
+
+    c0 = e.new_core(0, 0)
+    e.new_flow(c0, c0)
+
+    filename = str(tmpdir.join("results.bin"))
+    results = e.run(results_file=filename)
+    assert list(results.totals()["sent"]) == [3, 300]
+
+    # The data should have been streamed into the file and memory-mapped
+    with open(filename, "rb") as f:
+        assert f.read() == data
+    assert isinstance(results._samples, np.memmap)
+    assert tmpdir.join("results.bin.samples.npy").check()
+
+
+def test_copy_to_file():
+    src = BytesIO(b"0123456789")
+    dst = BytesIO()
+    _copy_to_file(src, dst, 8, chunk_size=3)
+    assert dst.getvalue() == b"01234567"
+
+
+def test_predict_load():
+    """Make sure link, router and core loads are predicted from routes and
+    traffic parameters."""
+    e = Experiment(Mock())
+    c0 = e.new_core(0, 0)
+    c1 = e.new_core(1, 0)
+    c2 = e.new_core(2, 0)
+    f0 = e.new_flow(c0, c2)
+    f1 = e.new_flow(c2, c1, echo=True)
+
+    with e.new_group() as g0:
+        e.timestep = 1e-3
+        f0.probability = 0.5
+    with e.new_group() as g1:
+        e.timestep = 1e-4
+        f0.packets_per_timestep = 2
+        f0.burst_period = 1.0
+        f0.burst_duty = 0.25
+        f1.probability = 0.0
+
+    # Route f0 east through (1, 0), f1 west and its reply back east.
+    reply = _ReplyFlow(f1, c1)
+    e._reply_flows = OrderedDict([((f1, c1), reply)])
+    e._routes = {
+        f0: RoutingTree((0, 0), [
+            (Routes.east, RoutingTree((1, 0), [
+                (Routes.east, RoutingTree((2, 0), [(Routes.core_1, c2)]))
+            ]))]),
+        f1: RoutingTree((2, 0), [
+            (Routes.west, RoutingTree((1, 0), [(Routes.core_1, c1)]))]),
+        reply: RoutingTree((1, 0), [
+            (Routes.east, RoutingTree((2, 0), [(Routes.core_1, c2)]))]),
+    }
+
+    links, routers, cores = e.predict_load()
+
+    # f0: 500 packets/s in g0, 5000 packets/s in g1
+    # f1 (and its reply): 1000 packets/s in g0, none in g1
+    assert list(links["group"]) == [g0] * 3 + [g1] * 3
+    assert list(zip(links["x"], links["y"], links["link"])) == [
+        (0, 0, Links.east), (1, 0, Links.east), (2, 0, Links.west)] * 2
+    assert list(links["packets_per_second"]) == [500, 1500, 1000,
+                                                 5000, 5000, 0]
+
+    assert list(zip(routers["x"], routers["y"])) == [
+        (0, 0), (1, 0), (2, 0)] * 2
+    assert list(routers["packets_per_second"]) == [500, 2500, 2500,
+                                                   5000, 5000, 5000]
+
+    assert list(cores["core"]) == [c0, c1, c2] * 2
+    assert list(cores["packets_per_timestep"]) == [0.5, 0, 1,
+                                                   0.5, 0, 0]
+    assert list(cores["sent"]) == [500, 1000, 1000, 5000, 0, 0]
+    assert list(cores["received"]) == [0, 1000, 1500, 0, 0, 5000]
+
+    # Utilisation: packets without a payload occupy 40 bits on a link, echo
+    # flows (f1) and echoed packets always carry a payload and occupy 72 bits
+    assert np.allclose(links["utilisation"], np.array([
+        500 * 40, 500 * 40 + 1000 * 72, 1000 * 72,
+        5000 * 40, 5000 * 40, 0]) / 250e6)
+    assert np.allclose(routers["utilisation"],
+                       routers["packets_per_second"] / 133e6)
+    assert np.allclose(cores["utilisation"],
+                       (cores["sent"] * 60 + cores["received"] * 120) / 200e6)
+
+
+def test_predict_load_echo_payload():
+    """Echo flows always carry a payload, even without use_payload."""
+    e = Experiment(Mock())
+    c0 = e.new_core(0, 0)
+    c1 = e.new_core(1, 0)
+    f0 = e.new_flow(c0, c1, echo=True)
+    f0.use_payload = False
+    e.timestep = 1e-3
+    reply = _ReplyFlow(f0, c1)
+    e._reply_flows = OrderedDict([((f0, c1), reply)])
+    e._routes = {
+        f0: RoutingTree((0, 0), [
+            (Routes.east, RoutingTree((1, 0), [(Routes.core_1, c1)]))]),
+        reply: RoutingTree((1, 0), [
+            (Routes.west, RoutingTree((0, 0), [(Routes.core_1, c0)]))]),
+    }
+
+    links, routers, cores = e.predict_load()
+    assert list(links["link"]) == [Links.east, Links.west]
+    assert np.allclose(links["utilisation"], [1000 * 72 / 250e6] * 2)
+
+
+def test_predict_load_overloaded():
+    """Groups which overload a core or link should be identifiable."""
+    e = Experiment(Mock())
+    c0 = e.new_core(0, 0)
+    c1 = e.new_core(1, 0)
+    f0 = e.new_flow(c0, c1)
+    e._reply_flows = OrderedDict()
+    e._routes = {
+        f0: RoutingTree((0, 0), [
+            (Routes.east, RoutingTree((1, 0), [(Routes.core_1, c1)]))])}
+
+    with e.new_group():
+        e.timestep = 1e-3
+    with e.new_group() as g1:
+        # 10 million packets/s of 72 bits: 720 Mbit/s over the link, 3 s of
+        # sending per second at the source and 6 s of receiving at the sink
+        e.timestep = 1e-7
+        f0.use_payload = True
+
+    links, routers, cores = e.predict_load()
+    assert set(links[links["utilisation"] > 1.0]["group"]) == set([g1])
+    assert set(cores[cores["utilisation"] > 1.0]["group"]) == set([g1])
+    assert list(cores[cores["utilisation"] > 1.0]["core"]) == [c0, c1]
+    assert np.all(routers["utilisation"] < 1.0)
+
+
+def test_predict_load_place_and_route():
+    """If not already routed, place and route should be carried out."""
+    mock_mc = Mock()
+    mock_mc.get_system_info.return_value = SystemInfo(2, 2, {
+        (x, y): ChipInfo(num_cores=18,
+                         core_states=[AppState.run] + [AppState.idle] * 17,
+                         working_links=set(Links),
+                         largest_free_sdram_block=110*1024*1024,
+                         largest_free_sram_block=1024*1024)
+        for x in range(2)
+        for y in range(2)
+    })
+
+    e = Experiment(mock_mc)
+    c0 = e.new_core(0, 0)
+    c1 = e.new_core(1, 0)
+    e.new_flow(c0, c1)
+    e.timestep = 1e-3
+
+    mock_route = Mock(side_effect=route)
+    links, routers, cores = e.predict_load(route=mock_route)
+    assert mock_route.called
+    assert list(links["group"]) == [None]
+    assert list(links["packets_per_second"]) == [1000]
+    assert list(cores["sent"]) == [1000, 0]
+
+
+def _partitioning_experiment(largest_free_sdram_block, recording):
+    """An experiment with two cores on separate chips with the given amount of
+    free SDRAM, running four groups of different durations."""
+    system_info = SystemInfo(2, 1, {
+        (x, 0): ChipInfo(largest_free_sdram_block=largest_free_sdram_block)
+        for x in range(2)})
+    mc = EmulatedMachineController(system_info=system_info, seed=1)
+    e = Experiment(mc)
+    e.timestep = 1e-5
+    e.warmup = e.cooldown = e.flush_time = 0.0
+    e.record_interval = 1e-4
+    e.record_sent = True
+    e.record_received = True
+    e.compact_recording = recording == "compact"
+    e.aggregate_recording = recording == "aggregate"
+    cores = [e.new_core(x, 0) for x in range(2)]
+    e.new_flow(cores[0], cores[1])
+    e.new_flow(cores[1], cores[0])
+    for num in range(4):
+        with e.new_group():
+            e.duration = 1e-3 * (num + 1)
+    return e, mc
+
+
+@pytest.mark.parametrize("recording", ["raw", "compact", "aggregate"])
+@pytest.mark.parametrize("use_results_file", [False, True])
+def test_run_partitioned(recording, use_results_file, tmpdir):
+    # Run the experiment in one load to find how much SDRAM is required
+    e, mc = _partitioning_experiment(1024 * 1024, recording)
+    expected = e.run().totals()
+    sdram_required = mc.num_units["sdram_alloc_as_filelike"] // 2
+    assert mc.num_operations["load_application"] == 1
+
+    # With only enough memory for (roughly) half the groups, the groups are
+    # split between several loads whose results are combined
+    e, mc = _partitioning_experiment(sdram_required // 2, recording)
+    results_file = (str(tmpdir.join("results"))
+                    if use_results_file else None)
+    results = e.run(results_file=results_file)
+    assert mc.num_operations["load_application"] > 1
+    assert [p.name for p in results.profile.phases].count("exit") == \
+        mc.num_operations["load_application"]
+
+    totals = results.totals()
+    assert ([g.name for g in totals["group"]] ==
+            [g.name for g in expected["group"]])
+    for name in ("time", "sent", "received"):
+        assert np.array_equal(totals[name], expected[name])
+    if use_results_file:
+        # The temporary file holding each load's results is removed
+        assert not tmpdir.join("results.partial").check()
+
+
+def test_run_partitioned_too_large():
+    # If even a single group does not fit, the experiment fails before
+    # anything is loaded
+    e, mc = _partitioning_experiment(64, "raw")
+    with pytest.raises(ValueError) as exc_info:
+        e.run()
+    assert "SDRAM" in str(exc_info.value)
+    assert mc.num_operations["sdram_alloc_as_filelike"] == 0
+
+
+def test_run_partitioned_dtcm(monkeypatch):
+    # Commands and buffers which don't fit in DTCM are split between loads
+    from network_tester import experiment
+    e, mc = _partitioning_experiment(1024 * 1024, "raw")
+    e.run()
+    partition = e._prepare_load(experiment.RunProfile()).partitions[0]
+    size = max(itervalues(partition.cores_dtcm_size))
+    monkeypatch.setattr(experiment, "_DTCM_HEAP_SIZE", size - 1)
+
+    prediction = e.predict_duration()
+    assert [p.name for p in prediction.profile.phases].count("exit") > 1
+
+    e.run()
+    assert mc.num_operations["load_application"] > 2
+
+
+def test_run_partitioned_dtcm_buffers():
+    # The buffers allocated for the latency histograms of every source and
+    # sink count towards the DTCM required even though the commands are small
+    e, mc = _partitioning_experiment(1024 * 1024, "aggregate")
+    e.record_latency = True
+    e.latency_bins = 8192
+    with pytest.raises(ValueError) as exc_info:
+        e.run()
+    assert "DTCM" in str(exc_info.value)
+    assert mc.num_operations["sdram_alloc_as_filelike"] == 0
+
+
+def test_run_partitioned_dtcm_many_sinks():
+    # The firmware sizes its recording buffers for every value which could be
+    # recorded, so a core with many sinks may not fit in DTCM even when few
+    # values are recorded and its commands are small
+    mc = EmulatedMachineController(2, 1, seed=1)
+    e = Experiment(mc)
+    e.timestep = 1e-5
+    e.warmup = e.cooldown = e.flush_time = 0.0
+    e.duration = 1e-4
+    e.record_sent = True
+    e.aggregate_recording = True
+    source = e.new_core(0, 0)
+    sink = e.new_core(1, 0)
+    for _ in range(300):
+        e.new_flow(source, sink)
+
+    with pytest.raises(ValueError) as exc_info:
+        e.run()
+    assert "{} requires an estimated".format(sink) in str(exc_info.value)
+    assert mc.num_operations["sdram_alloc_as_filelike"] == 0
@@ -4,11 +4,29 @@ from mock import Mock
 
 import struct
 
+from collections import OrderedDict
+
+import pickle
+
+import os
+
+import subprocess
+
+import sys
+
+from six import StringIO, iteritems
+
 import numpy as np
 
-from network_tester.results import Results, to_csv
+from network_tester.results import \
+    Results, to_csv, write_csv, to_objects, load_results, \
+    decode_compact, decode_aggregates, link_incidence
+
+import network_tester
 
-from network_tester.experiment import Experiment
+from network_tester.experiment import Experiment, _ReplyFlow
+
+from network_tester.columnar import load_columnar
 
 from network_tester.errors import NT_ERR
 
@@ -17,6 +35,16 @@ from network_tester.counters import Counters
 from rig.place_and_route.routing_tree import RoutingTree
 from rig.routing_table import Routes
 
+from rig.links import Links
+
+
+def pack_results(*values):
+    """Pack the result data of a core which reported no errors and recorded
+    the given series of values."""
+    return struct.pack("<I{}I".format(len(values)),
+                       0x00000000,  # No errors
+                       *values)
+
 
 @pytest.fixture
 def example_experiment():
@@ -174,33 +202,27 @@ def example_results(example_experiment, example_cores, example_flows,
                           ((0, 1), Counters.external_p2p),
                           ((0, 1), Counters.reinjected)]}
 
-    def pack(*args):
-        """Pack a series of result values."""
-        return struct.pack("<I{}I".format(len(args)),
-                           0x00000000,  # No errors
-                           *args)
-
     cores_result_data = {
-        #         lp2p,ep2p,rein,n0src,n1src
-        c0: pack(10, 20, 70, 20, 30,  # g0s0
-                 1, 2, 7, 2, 3,  # g1s0
-                 2, 3, 8, 3, 4),  # g1s1
-        #         n1snk
-        c1: pack(30,  # g0s0
-                 3,  # g1s0
-                 4),  # g1s1
-        #         lp2p,ep2p,rein,n2src,n0snk,n2snk
-        c2: pack(30, 40, 80, 40, 20, 40,  # g0s0
-                 3, 4, 8, 4, 2, 4,  # g1s0
-                 4, 5, 9, 5, 3, 5),  # g1s1
-        #         n0snk
-        c3: pack(20,  # g0s0
-                 2,  # g1s0
-                 3),  # g1s1
-        #         lp2p,ep2p,rein
-        c4: pack(50, 60, 90,  # g0s0
-                 5, 6, 9,  # g1s0
-                 6, 7, 10),  # g1s1
+        #                 lp2p,ep2p,rein,n0src,n1src
+        c0: pack_results(10, 20, 70, 20, 30,  # g0s0
+                         1, 2, 7, 2, 3,  # g1s0
+                         2, 3, 8, 3, 4),  # g1s1
+        #                 n1snk
+        c1: pack_results(30,  # g0s0
+                         3,  # g1s0
+                         4),  # g1s1
+        #                 lp2p,ep2p,rein,n2src,n0snk,n2snk
+        c2: pack_results(30, 40, 80, 40, 20, 40,  # g0s0
+                         3, 4, 8, 4, 2, 4,  # g1s0
+                         4, 5, 9, 5, 3, 5),  # g1s1
+        #                 n0snk
+        c3: pack_results(20,  # g0s0
+                         2,  # g1s0
+                         3),  # g1s1
+        #                 lp2p,ep2p,rein
+        c4: pack_results(50, 60, 90,  # g0s0
+                         5, 6, 9,  # g1s0
+                         6, 7, 10),  # g1s1
     }
 
     r = Results(example_experiment, cores, example_flows, cores_records,
@@ -335,10 +357,45 @@ def test_cores_results(example_results, example_cores):
                       [6, 7, 10]],  # g1s1
                      dtype=np.uint),
     }
+    # Nothing should be decoded until it is used
+    assert example_results._cores_results == {}
+
     for core in example_cores:
-        assert (example_results._cores_results[core] ==
+        assert (example_results._get_core_results(core) ==
                 model_cores_results[core]).all()
 
+        # Once decoded, the raw data should be dropped
+        assert core not in example_results._cores_result_data
+
+
+def test_lazy_decoding(example_results, example_cores):
+    """Make sure only the cores used by a table are decoded and that values
+    are not copied from the raw data."""
+    c0, c1, c2, c3, c4 = example_cores
+    raw = example_results._cores_result_data[c0]
+
+    # Only cores recording router counters are needed
+    example_results.router_counters()
+    assert set(example_results._cores_results) == set([c0, c2, c4])
+
+    # Values should be a read-only view of the raw data
+    results = example_results._get_core_results(c0)
+    if results.dtype.isnative:
+        assert np.shares_memory(results, np.frombuffer(raw, dtype=np.uint8))
+    assert not results.flags.writeable
+
+
+def test_save_load_decoded(example_results, tmpdir):
+    """Make sure results can be saved after some cores have been decoded."""
+    expected = to_csv(example_results.flow_counters())
+    example_results.router_counters()
+
+    filename = str(tmpdir.join("results.pickle"))
+    example_results.save(filename)
+    loaded = load_results(filename)
+    assert to_csv(loaded.flow_counters()) == expected
+    assert loaded.errors == example_results.errors
+
 
 def test_make_result_array(example_results, example_groups):
     """Make sure the common set of columns are correct."""
@@ -545,6 +602,661 @@ def test_router_counters(example_results, example_groups):
         dtype=counts.dtype)).all()
 
 
+def test_latency_histograms(example_experiment):
+    """Make sure latency histograms are decoded correctly."""
+    e = example_experiment
+    e.latency_bins = 2
+    e.latency_bin_width = 1e-6
+
+    c0 = e.new_core(name="c0")
+    c1 = e.new_core(name="c1")
+    c2 = e.new_core(name="c2")
+    f0 = e.new_flow(c0, [c1, c2], name="f0")
+
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.2
+        e.record_interval = 0.1
+
+    cores = [c0, c1, c2]
+    placements = {c0: (0, 0), c1: (0, 0), c2: (0, 0)}
+    routes = {f0: RoutingTree((0, 0), set([(Routes.core_2, c1),
+                                           (Routes.core_3, c2)]))}
+    cores_records = {c0: [(f0, Counters.sent)],
+                     c1: [(f0, Counters.received),
+                          (f0, Counters.latency),
+                          (f0, Counters.latency)],
+                     c2: [(f0, Counters.latency),
+                          (f0, Counters.latency)]}
+
+    cores_result_data = {
+        #                sent
+        c0: pack_results(5,  # s0
+                         6),  # s1
+        #                rcvd, bin0, bin1
+        c1: pack_results(5, 3, 2,  # s0
+                         6, 4, 2),  # s1
+        #                bin0, bin1
+        c2: pack_results(1, 0,  # s0
+                         0, 1),  # s1
+    }
+
+    r = Results(e, cores, [f0], cores_records, set(), placements, routes,
+                cores_result_data, [g0])
+
+    # Histograms should not appear in the other tables
+    assert "latency" not in r.totals().dtype.names
+    assert "latency" not in r.core_totals().dtype.names
+    assert "latency" not in r.flow_totals().dtype.names
+    assert "latency" not in r.flow_counters().dtype.names
+    assert list(r.totals()["received"]) == [5, 6]
+
+    histograms = r.latency_histograms()
+    assert histograms.dtype.names == ("group", "time", "flow",
+                                      "source_core", "sink_core",
+                                      "bin", "latency", "count")
+    assert (histograms == np.array(
+        [(g0, 0.1, f0, c0, c1, 0, 0.0, 3),
+         (g0, 0.1, f0, c0, c1, 1, 1e-6, 2),
+         (g0, 0.1, f0, c0, c2, 0, 0.0, 1),
+         (g0, 0.1, f0, c0, c2, 1, 1e-6, 0),
+         (g0, 0.2, f0, c0, c1, 0, 0.0, 4),
+         (g0, 0.2, f0, c0, c1, 1, 1e-6, 2),
+         (g0, 0.2, f0, c0, c2, 0, 0.0, 0),
+         (g0, 0.2, f0, c0, c2, 1, 1e-6, 1)],
+        dtype=histograms.dtype)).all()
+
+
+def test_latency_histograms_not_recorded(example_results):
+    """If latency was not recorded, the histogram table should be empty."""
+    assert len(example_results.latency_histograms()) == 0
+
+
+def test_core_counters(example_experiment):
+    """Make sure core timing counters only appear in the core totals."""
+    e = example_experiment
+
+    c0 = e.new_core(name="c0")
+    c1 = e.new_core(name="c1")
+    f0 = e.new_flow(c0, c1, name="f0")
+
+    g0 = e.new_group(name="g0")
+
+    cores = [c0, c1]
+    placements = {c0: (0, 0), c1: (0, 0)}
+    routes = {f0: RoutingTree((0, 0), set([(Routes.core_2, c1)]))}
+    cores_records = {c0: [(c0, Counters.deadlines_missed),
+                          (c0, Counters.slack_min),
+                          (c0, Counters.generation_cycles),
+                          (f0, Counters.sent)],
+                     c1: [(c1, Counters.deadlines_missed),
+                          (c1, Counters.slack_min),
+                          (c1, Counters.generation_cycles),
+                          (f0, Counters.received)]}
+
+    cores_result_data = {c0: pack_results(0, 100, 2000, 10),
+                         c1: pack_results(1, 300, 50, 9)}
+
+    r = Results(e, cores, [f0], cores_records, set(), placements, routes,
+                cores_result_data, [g0])
+
+    totals = r.totals()
+    assert "slack_min" not in totals.dtype.names
+    assert "generation_cycles" not in totals.dtype.names
+    assert list(totals["deadlines_missed"]) == [1]
+
+    core_totals = r.core_totals()
+    assert list(core_totals["core"]) == [c0, c1]
+    assert list(core_totals["slack_min"]) == [100, 300]
+    assert list(core_totals["generation_cycles"]) == [2000, 50]
+    assert list(core_totals["sent"]) == [10, 0]
+    assert list(core_totals["received"]) == [0, 9]
+
+    # Core counters are not flow-specific
+    assert "slack_min" not in r.flow_totals().dtype.names
+    assert "slack_min" not in r.flow_counters().dtype.names
+
+
+def test_sequence_counters(example_experiment):
+    """Make sure sequence number counters are reported per source/sink pair."""
+    e = example_experiment
+
+    c0 = e.new_core(name="c0")
+    c1 = e.new_core(name="c1")
+    c2 = e.new_core(name="c2")
+    f0 = e.new_flow(c0, [c1, c2], name="f0")
+
+    g0 = e.new_group(name="g0")
+
+    cores = [c0, c1, c2]
+    placements = {c0: (0, 0), c1: (0, 0), c2: (0, 0)}
+    routes = {f0: RoutingTree((0, 0), set([(Routes.core_2, c1),
+                                           (Routes.core_3, c2)]))}
+    cores_records = {c0: [],
+                     c1: [(f0, Counters.missing),
+                          (f0, Counters.duplicated),
+                          (f0, Counters.out_of_order)],
+                     c2: [(f0, Counters.missing),
+                          (f0, Counters.duplicated),
+                          (f0, Counters.out_of_order)]}
+
+    cores_result_data = {c0: pack_results(),
+                         c1: pack_results(3, 0, 1),
+                         c2: pack_results(0, 2, 0)}
+
+    r = Results(e, cores, [f0], cores_records, set(), placements, routes,
+                cores_result_data, [g0])
+
+    counters = r.flow_counters()
+    assert list(counters["sink_core"]) == [c1, c2]
+    assert list(counters["missing"]) == [3, 0]
+    assert list(counters["duplicated"]) == [0, 2]
+    assert list(counters["out_of_order"]) == [1, 0]
+
+
+def test_round_trip_histograms(example_experiment):
+    """Make sure round-trip histograms are decoded correctly."""
+    e = example_experiment
+    e.latency_bins = 2
+    e.latency_bin_width = 1e-6
+
+    c0 = e.new_core(name="c0")
+    c1 = e.new_core(name="c1")
+    f0 = e.new_flow(c0, c1, name="f0")
+    f1 = e.new_flow(c0, c1, name="f1", echo=True)
+
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.2
+        e.record_interval = 0.1
+
+    cores = [c0, c1]
+    placements = {c0: (0, 0), c1: (0, 0)}
+    routes = {f0: RoutingTree((0, 0), set([(Routes.core_2, c1)])),
+              f1: RoutingTree((0, 0), set([(Routes.core_2, c1)]))}
+    cores_records = {c0: [(f0, Counters.sent),
+                          (f1, Counters.sent),
+                          (f0, Counters.round_trip),
+                          (f0, Counters.round_trip),
+                          (f1, Counters.round_trip),
+                          (f1, Counters.round_trip)],
+                     c1: []}
+
+    cores_result_data = {
+        #                sent, sent, f0 bins, f1 bins
+        c0: pack_results(5, 7, 0, 0, 3, 4,  # s0
+                         6, 8, 0, 0, 8, 0),  # s1
+        c1: pack_results(),
+    }
+
+    r = Results(e, cores, [f0, f1], cores_records, set(), placements,
+                routes, cores_result_data, [g0])
+
+    # Histograms should not appear in the other tables
+    assert "round_trip" not in r.totals().dtype.names
+    assert "round_trip" not in r.flow_totals().dtype.names
+    assert list(r.totals()["sent"]) == [12, 14]
+
+    # Only echo flows should be listed
+    histograms = r.round_trip_histograms()
+    assert histograms.dtype.names == ("group", "time", "flow",
+                                      "source_core", "bin", "round_trip",
+                                      "count")
+    assert (histograms == np.array(
+        [(g0, 0.1, f1, c0, 0, 0.0, 3),
+         (g0, 0.1, f1, c0, 1, 1e-6, 4),
+         (g0, 0.2, f1, c0, 0, 0.0, 8),
+         (g0, 0.2, f1, c0, 1, 1e-6, 0)],
+        dtype=histograms.dtype)).all()
+
+
+def test_round_trip_histograms_not_recorded(example_results):
+    """If round-trip times were not recorded, the table should be empty."""
+    assert len(example_results.round_trip_histograms()) == 0
+
+
+def encode_compact(samples):
+    """Compactly encode a list of samples in the same way as the network
+    tester application."""
+    tags = b""
+    data = b""
+    for sample in samples:
+        sample_tags = [0] * ((len(sample) + 15) // 16)
+        sample_data = b""
+        for num, value in enumerate(sample):
+            if value == 0:
+                tag, fmt = 0, ""
+            elif value <= 0xFF:
+                tag, fmt = 1, "<B"
+            elif value <= 0xFFFF:
+                tag, fmt = 2, "<H"
+            else:
+                tag, fmt = 3, "<I"
+            sample_tags[num // 16] |= tag << ((num % 16) * 2)
+            if fmt:
+                sample_data += struct.pack(fmt, value)
+        sample_data += b"\0" * (-len(sample_data) % 4)
+        tags += struct.pack("<{}I".format(len(sample_tags)), *sample_tags)
+        data += sample_data
+    return struct.pack("<I", len(data)) + tags + data
+
+
+@pytest.mark.parametrize("samples",
+                         [[],
+                          [[0]],
+                          [[1, 0, 0x100, 0x10000, 0xFFFFFFFF]],
+                          [[0, 0, 0], [0, 0, 0]],
+                          [list(range(0, 20 * 997, 997)),
+                           list(range(0, 20 * 99991, 99991)),
+                           [0] * 20,
+                           [255] * 20]])
+def test_decode_compact(samples):
+    num_values = len(samples[0]) if samples else 1
+    values = decode_compact(encode_compact(samples), len(samples), num_values)
+    assert values.shape == (len(samples), num_values)
+    assert values.tolist() == samples
+
+
+def test_decode_compact_no_values():
+    assert decode_compact(b"", 3, 0).shape == (3, 0)
+
+
+def test_compact_results():
+    """Make sure compactly recorded results are decoded."""
+    e = Experiment(Mock())
+    e.compact_recording = True
+
+    c0 = e.new_core(name="c0")
+    f0 = e.new_flow(c0, c0, name="f0")
+
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.2
+        e.record_interval = 0.1
+
+    cores_records = {c0: [(c0, Counters.deadlines_missed),
+                          (f0, Counters.sent),
+                          (f0, Counters.received)]}
+    cores_result_data = {
+        c0: struct.pack("<I", 0) + encode_compact([[0, 1000, 999],
+                                                   [0, 70000, 0]])}
+
+    r = Results(e, [c0], [f0], cores_records, set(), {c0: (0, 0)},
+                {f0: RoutingTree((0, 0), set([(Routes.core_1, c0)]))},
+                cores_result_data, [g0])
+
+    totals = r.totals()
+    assert list(totals["sent"]) == [1000, 70000]
+    assert list(totals["received"]) == [999, 0]
+
+
+def test_counter_statistics():
+    """Make sure statistics are computed from recorded samples."""
+    e = Experiment(Mock())
+
+    c0 = e.new_core(name="c0")
+    f0 = e.new_flow(c0, c0, name="f0")
+
+    e.record_interval = 0.1
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.3
+    with e.new_group(name="g1") as g1:
+        # Records no samples
+        e.duration = 0.05
+
+    cores_records = {c0: [(c0, Counters.deadlines_missed),
+                          (f0, Counters.sent)]}
+    cores_result_data = {
+        c0: struct.pack("<I", 0) + struct.pack("<6I",
+                                               0, 1,
+                                               0, 2,
+                                               0, 6)}
+
+    r = Results(e, [c0], [f0], cores_records, set(), {c0: (0, 0)},
+                {f0: RoutingTree((0, 0), set([(Routes.core_1, c0)]))},
+                cores_result_data, [g0, g1])
+
+    stats = r.counter_statistics()
+    assert len(stats) == 4
+    assert list(stats["group"]) == [g0, g0, g1, g1]
+    assert list(stats["time"]) == [0.3, 0.3, 0.05, 0.05]
+    assert list(stats["core"]) == [c0] * 4
+    assert list(stats["object"]) == [c0, f0, c0, f0]
+    assert list(stats["counter"]) == [Counters.deadlines_missed,
+                                      Counters.sent] * 2
+    assert list(stats["num_samples"]) == [3, 3, 0, 0]
+
+    assert list(stats["sum"]) == [0, 9, 0, 0]
+    assert list(stats["mean"][:2]) == [0, 3]
+    assert stats["variance"][1] == pytest.approx(14.0 / 3.0)
+    assert list(stats["min"][:2]) == [0, 1]
+    assert list(stats["max"][:2]) == [0, 6]
+
+    # Empty groups have no meaningful statistics
+    for field in ["mean", "variance", "min", "max"]:
+        assert np.all(np.isnan(stats[field][2:]))
+
+
+def test_decode_aggregates():
+    data = struct.pack("<12I",
+                       # Group 0, value 0
+                       0xFFFFFFFF, 1, 2, 3, 0x00000001, 0x10,
+                       # Group 1, value 0
+                       10, 0, 4, 6, 50, 0)
+    sums, minimums, maximums, sums_of_squares = decode_aggregates(data, 2, 1)
+    assert sums.tolist() == [[0x1FFFFFFFF], [10]]
+    assert minimums.tolist() == [[2], [4]]
+    assert maximums.tolist() == [[3], [6]]
+    assert sums_of_squares.tolist() == [[0x1000000001], [50]]
+
+
+def test_aggregate_results():
+    """Make sure aggregated results are decoded."""
+    e = Experiment(Mock())
+    e.aggregate_recording = True
+
+    c0 = e.new_core(name="c0")
+    f0 = e.new_flow(c0, c0, name="f0")
+
+    e.record_interval = 0.1
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.3
+    with e.new_group(name="g1") as g1:
+        e.duration = 0.2
+
+    cores_records = {c0: [(f0, Counters.sent)]}
+    cores_result_data = {
+        c0: struct.pack("<I", 0) + struct.pack("<12I",
+                                               9, 0, 1, 6, 41, 0,
+                                               4, 0, 2, 2, 8, 0)}
+
+    r = Results(e, [c0], [f0], cores_records, set(), {c0: (0, 0)},
+                {f0: RoutingTree((0, 0), set([(Routes.core_1, c0)]))},
+                cores_result_data, [g0, g1])
+
+    # A single summed sample should be presented for each group
+    totals = r.totals()
+    assert list(totals["group"]) == [g0, g1]
+    assert list(totals["time"]) == [0.3, 0.2]
+    assert list(totals["sent"]) == [9, 4]
+
+    stats = r.counter_statistics()
+    assert list(stats["num_samples"]) == [3, 2]
+    assert list(stats["mean"]) == [3, 2]
+    assert stats["variance"][0] == pytest.approx(14.0 / 3.0)
+    assert stats["variance"][1] == 0.0
+    assert list(stats["min"]) == [1, 2]
+    assert list(stats["max"]) == [6, 2]
+
+    # The decoded aggregates should survive pickling
+    loaded = pickle.loads(pickle.dumps(r))
+    assert to_csv(loaded.counter_statistics()) == to_csv(stats)
+
+
+@pytest.mark.parametrize("method", ["totals", "core_totals", "flow_totals",
+                                    "flow_counters", "latency_histograms",
+                                    "round_trip_histograms", "router_counters",
+                                    "link_loads", "counter_statistics"])
+def test_categorical(example_results, method):
+    """Make sure categorical output is equivalent to the object form."""
+    objects = getattr(example_results, method)()
+    categorical = getattr(example_results, method)(categorical=True)
+
+    assert categorical.dtype.names == objects.dtype.names
+    assert len(categorical) == len(objects)
+    for name in objects.dtype.names:
+        metadata = categorical.dtype[name].metadata
+        if objects.dtype[name] == object:
+            # Objects should be replaced by codes
+            assert categorical.dtype[name] == np.uint32
+            categories = metadata["categories"]
+            assert [categories[code] for code in categorical[name]] == \
+                list(objects[name])
+        else:
+            assert metadata is None
+            assert np.array_equal(categorical[name], objects[name],
+                                  equal_nan=True)
+
+    # Objects should be available on demand
+    converted = to_objects(categorical)
+    object_names = [name for name in objects.dtype.names
+                    if objects.dtype[name] == object]
+    for name in object_names:
+        assert list(converted[name]) == list(objects[name])
+    assert (to_csv(categorical[object_names]) ==
+            to_csv(objects[object_names]))
+
+
+def test_categorical_counters(example_results):
+    totals = example_results.totals(categorical=True)
+    assert totals.dtype["sent"] == np.uint
+    assert totals.dtype["time"] == np.double
+
+    # Filtering by code should be possible
+    groups = totals.dtype["group"].metadata["categories"]
+    assert len(totals[totals["group"] == groups.index(groups[1])]) == 2
+
+
+def test_to_objects_unchanged(example_results):
+    totals = example_results.totals()
+    assert to_objects(totals) is totals
+
+
+def test_link_loads(example_results, example_groups):
+    """Make sure link loads are attributed from flow routes."""
+    g0, g1 = example_groups
+    loads = example_results.link_loads()
+
+    # Only flow 0 leaves a chip (eastward from (0, 0))
+    assert list(loads["group"]) == [g0, g1, g1]
+    assert list(loads["time"]) == [1.0, 0.1, 0.2]
+    assert list(loads["x"]) == [0, 0, 0]
+    assert list(loads["y"]) == [0, 0, 0]
+    assert list(loads["link"]) == [Links.east] * 3
+    assert list(loads["packets"]) == [20, 2, 3]
+
+
+def test_link_loads_echo():
+    """Make sure echoed packets are attributed to the links of the route back
+    to the source."""
+    e = Experiment(Mock())
+    c0 = e.new_core(name="c0")
+    c1 = e.new_core(name="c1")
+    f0 = e.new_flow(c0, c1, name="f0", echo=True)
+    reply = _ReplyFlow(f0, c1)
+    e._reply_flows = OrderedDict([((f0, c1), reply)])
+
+    with e.new_group(name="g0") as g0:
+        e.duration = 0.1
+
+    placements = {c0: (0, 0), c1: (1, 0)}
+    routes = {
+        f0: RoutingTree((0, 0), [
+            (Routes.east, RoutingTree((1, 0), [(Routes.core_1, c1)]))]),
+        reply: RoutingTree((1, 0), [
+            (Routes.west, RoutingTree((0, 0), [(Routes.core_1, c0)]))]),
+    }
+    cores_records = {c0: [(f0, Counters.sent)],
+                     c1: [(f0, Counters.received)]}
+    cores_result_data = {c0: struct.pack("<II", 0, 10),
+                         c1: struct.pack("<II", 0, 7)}
+    r = Results(e, [c0, c1], [f0], cores_records, set(), placements,
+                routes, cores_result_data, [g0])
+
+    loads = r.link_loads()
+    assert list(loads["x"]) == [0, 1]
+    assert list(loads["link"]) == [Links.east, Links.west]
+    assert list(loads["packets"]) == [10, 7]
+
+
+def test_link_loads_not_recorded(example_results):
+    example_results._recorded.remove(Counters.sent)
+    loads = example_results.link_loads()
+    assert len(loads) == 0
+    assert "packets" in loads.dtype.names
+
+
+def test_link_incidence(example_flows, example_cores):
+    """Make sure flow routes are converted into a link incidence matrix."""
+    f0, f1, f2 = example_flows
+    c0, c1, c2, c3, c4 = example_cores
+    routes = {
+        # A multicast route passing through (1, 0) to (2, 0) and (1, 1)
+        f0: RoutingTree((0, 0), [
+            (Routes.east, RoutingTree((1, 0), [
+                (Routes.east, RoutingTree((2, 0), [(Routes.core_1, c2)])),
+                (Routes.north, RoutingTree((1, 1), [(Routes.core_1, c3)])),
+            ])),
+        ]),
+        # A local route
+        f1: RoutingTree((0, 0), [(Routes.core_2, c1)]),
+        # Shares a link with f0
+        f2: RoutingTree((1, 0), [
+            (Routes.east, RoutingTree((2, 0), [(Routes.core_1, c2)]))]),
+    }
+    links, entry_flows, entry_links = link_incidence([f0, f1, f2], routes)
+    assert links == [((0, 0), Links.east),
+                     ((1, 0), Links.east),
+                     ((1, 0), Links.north)]
+    assert (sorted(zip(entry_flows, entry_links)) ==
+            [(0, 0), (0, 1), (0, 2), (2, 1)])
+
+    # Flows without routes are ignored
+    links, entry_flows, entry_links = link_incidence([f1], {})
+    assert links == []
+    assert len(entry_flows) == len(entry_links) == 0
+
+
+def test_router_counters_tensor(example_results):
+    """Make sure router counters are scattered into a chip grid."""
+    tensor = example_results.router_counters_tensor()
+    assert tensor.shape == (3, 3, 2, 2)
+
+    # Compare against the router counter table
+    counters = ["local_p2p", "external_p2p", "reinjected"]
+    router_counters = example_results.router_counters()
+    for row_num, row in enumerate(router_counters):
+        sample = row_num // 3
+        for counter_num, counter in enumerate(counters):
+            assert (tensor[sample, counter_num, int(row["y"]), int(row["x"])]
+                    == row[counter])
+
+    # Chip (1, 1) was not recorded
+    assert np.all(np.isnan(tensor[:, :, 1, 1]))
+
+    # Counters may be selected and reordered
+    tensor = example_results.router_counters_tensor(
+        [Counters.reinjected, Counters.local_p2p])
+    assert list(tensor[0, :, 0, 0]) == [70, 10]
+    assert example_results.router_counters_tensor([]).shape == (3, 0, 2, 2)
+
+
+def test_flow_totals_tensor(example_results, example_flows):
+    """Make sure flow totals are given as a dense array."""
+    tensor = example_results.flow_totals_tensor()
+    assert tensor.shape == (3, 2, 3)
+
+    flow_totals = example_results.flow_totals()
+    for counter_num, counter in enumerate(["sent", "received"]):
+        assert np.array_equal(tensor[:, counter_num, :].ravel(),
+                              flow_totals[counter])
+
+    tensor = example_results.flow_totals_tensor([Counters.received])
+    assert list(tensor[0, 0]) == [40, 30, 40]
+
+
+def test_query(example_results, example_groups, example_cores,
+               example_flows):
+    """Make sure queries gather just the requested values."""
+    g0, g1 = example_groups
+    c0, c1, c2, c3, c4 = example_cores
+    f0, f1, f2 = example_flows
+
+    # Everything
+    received = example_results.query("received")
+    assert list(received["group"]) == [g0] * 4 + [g1] * 8
+    assert list(received["core"]) == [c1, c2, c2, c3] * 3
+    assert list(received["object"]) == [f1, f0, f2, f0] * 3
+    assert list(received["value"]) == [30, 20, 40, 20,
+                                       3, 2, 4, 2,
+                                       4, 3, 5, 3]
+
+    # Filtered by flow, group and time
+    received = example_results.query(Counters.received, flows=[f0],
+                                     groups=[g1], time=(0.15, 0.25))
+    assert list(received["group"]) == [g1, g1]
+    assert list(received["time"]) == [0.2, 0.2]
+    assert list(received["core"]) == [c2, c3]
+    assert list(received["value"]) == [3, 3]
+
+    # Filtered by core
+    sent = example_results.query("sent", cores=[c0])
+    assert list(sent["object"]) == [f0, f1] * 3
+    assert list(sent["value"]) == [20, 30, 2, 3, 3, 4]
+
+    # Filtered by chip
+    local_p2p = example_results.query("local_p2p", chips=[(0, 1)])
+    assert list(local_p2p["core"]) == [c4] * 3
+    assert list(local_p2p["object"]) == [(0, 1)] * 3
+    assert list(local_p2p["value"]) == [50, 5, 6]
+
+    # Nothing selected
+    assert len(example_results.query("sent", cores=[c1])) == 0
+    assert len(example_results.query("sent", groups=[])) == 0
+
+    # Categorical
+    received = to_objects(example_results.query("received",
+                                                categorical=True))
+    expected = example_results.query("received")
+    for column in ("group", "core", "object", "value"):
+        assert list(received[column]) == list(expected[column])
+
+
+def test_query_histogram(example_results):
+    with pytest.raises(ValueError):
+        example_results.query(Counters.latency)
+
+
+def test_table_cache(example_results):
+    """Make sure result tables are cached and shared read-only."""
+    totals = example_results.totals()
+    assert not totals.flags.writeable
+    with pytest.raises(ValueError):
+        totals["sent"][0] = 0
+
+    # Repeated calls (however the arguments are given) share the same data
+    assert np.shares_memory(totals, example_results.totals())
+    assert np.shares_memory(totals,
+                            example_results.totals(categorical=False))
+    assert np.shares_memory(totals, example_results.totals(False))
+    assert not np.shares_memory(totals,
+                                example_results.totals(categorical=True))
+
+    # Clearing the cache should cause tables to be rebuilt
+    example_results.clear_cache()
+    assert not np.shares_memory(totals, example_results.totals())
+    assert to_csv(totals) == to_csv(example_results.totals())
+
+
+def test_table_cache_size(example_results):
+    """Make sure the least recently used tables are evicted to keep within
+    the cache size."""
+    totals = example_results.totals()
+    router_counters = example_results.router_counters()
+    example_results.cache_size = (totals.nbytes +
+                                  example_results.core_totals().nbytes)
+
+    # Use totals so that router_counters is least recently used
+    example_results.totals()
+    example_results.core_totals()
+    assert np.shares_memory(totals, example_results.totals())
+    assert not np.shares_memory(router_counters,
+                                example_results.router_counters())
+
+    # Nothing should be cached with a size of zero
+    example_results.cache_size = 0
+    assert not np.shares_memory(example_results.totals(),
+                                example_results.totals())
+    assert len(example_results._table_cache) == 0
+
+
 def test_to_csv():
     """Make sure the CSV conversion utility actually works..."""
     dt = np.dtype([("a", np.uint), ("b", np.double), ("c", object)])
@@ -590,3 +1302,169 @@ def test_to_csv():
                          "0,0.0,1\n"
                          "0,0.0,f0\n"
                          "0,0.0,1")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 1000])
+@pytest.mark.parametrize("categorical", [False, True])
+def test_write_csv(example_results, chunk_size, categorical):
+    """Make sure the streaming CSV writer matches to_csv."""
+    data = example_results.flow_counters(categorical=categorical)
+
+    f = StringIO()
+    write_csv(data, f, chunk_size=chunk_size)
+    assert f.getvalue() == to_csv(data) + "\n"
+
+    # Options should be respected
+    f = StringIO()
+    write_csv(data, f, header=False, col_sep="\t", row_sep="\r\n",
+              objects_as_name=False, chunk_size=chunk_size)
+    assert f.getvalue() == to_csv(data, header=False, col_sep="\t",
+                                  row_sep="\r\n",
+                                  objects_as_name=False) + "\r\n"
+
+
+def test_write_csv_none():
+    dt = np.dtype([("a", np.uint), ("b", object)])
+    a = np.zeros((2,), dtype=dt)
+    a["b"][0] = None
+    a["b"][1] = "x"
+
+    f = StringIO()
+    write_csv(a, f, none="-")
+    assert f.getvalue() == "a,b\n0,-\n0,x\n"
+
+    # Empty datasets should just produce a header
+    f = StringIO()
+    write_csv(a[:0], f)
+    assert f.getvalue() == "a,b\n"
+
+
+def test_save_columnar(example_results, example_groups, tmpdir):
+    """Make sure tables survive a round-trip through the columnar format."""
+    path = str(tmpdir.join("results"))
+    example_results.save_columnar(path)
+
+    columnar = load_columnar(path)
+    assert columnar.keys() == list(Results.TABLES)
+
+    # Group, core and flow metadata should be retained by name
+    assert [g["name"] for g in columnar.groups] == ["g0", 1]
+    assert columnar.groups[0]["labels"] == {"foobar": "foo",
+                                            "only_group0": 1234}
+    assert [c["name"] for c in columnar.cores] == ["c0", 1, 2, 3]
+    assert columnar.placements == {"c0": (0, 0), 1: (0, 0),
+                                   2: (1, 0), 3: (1, 0)}
+    assert columnar.flows[0] == {"name": "f0", "source": "c0",
+                                 "sinks": [2, 3]}
+
+    for table in Results.TABLES:
+        expected = getattr(example_results, table)(categorical=True)
+        loaded = columnar[table]
+        assert len(loaded) == len(expected)
+        assert loaded.names == expected.dtype.names
+
+        # Columns should be memory-mapped
+        for name in expected.dtype.names:
+            assert isinstance(loaded[name], np.memmap)
+            assert np.array_equal(loaded[name], expected[name],
+                                  equal_nan=True)
+
+        # Assembled tables should produce the same CSV
+        assert to_csv(loaded.to_array()) == to_csv(expected)
+
+    # Dictionary-encoded columns should be decoded by name
+    stats = columnar["counter_statistics"]
+    assert stats.categories("group") == ["g0", 1]
+    assert Counters.sent in stats.categories("counter")
+    assert (0, 1) in stats.categories("object")
+    assert stats.categories("sum") is None
+
+
+def test_save_columnar_subset(example_results, tmpdir):
+    path = str(tmpdir.join("results"))
+    example_results.save_columnar(path, tables=["totals"])
+
+    columnar = load_columnar(path, mmap_mode=None)
+    assert "totals" in columnar
+    assert "flow_counters" not in columnar
+    assert not isinstance(columnar["totals"]["sent"], np.memmap)
+
+
+def test_save_load(example_results, tmpdir):
+    """Make sure raw results survive being saved and reloaded."""
+    filename = str(tmpdir.join("results.pickle"))
+    example_results.save(filename)
+
+    loaded = load_results(filename)
+    assert loaded is not example_results
+    assert loaded.errors == example_results.errors
+    for table in Results.TABLES:
+        assert (to_csv(getattr(loaded, table)()) ==
+                to_csv(getattr(example_results, table)()))
+
+    # The experiment should no longer be associated with a machine
+    assert loaded._experiment._mc is None
+    assert example_results._experiment._mc is not None
+
+
+def test_save_load_fresh_process(example_results, tmpdir):
+    """Make sure saved results can be loaded in a fresh process."""
+    filename = str(tmpdir.join("results.pickle"))
+    example_results.save(filename)
+
+    package_dir = os.path.dirname(os.path.dirname(network_tester.__file__))
+    output = subprocess.check_output([
+        sys.executable, "-c",
+        "import sys\n"
+        "sys.path.insert(0, {!r})\n"
+        "from network_tester import load_results, to_csv\n"
+        "print(to_csv(load_results({!r}).flow_counters()))".format(
+            package_dir, filename)])
+    assert (output.decode("utf-8").strip() ==
+            to_csv(example_results.flow_counters()))
+
+
+def test_load_bad_version(tmpdir):
+    filename = str(tmpdir.join("results.pickle"))
+    with open(filename, "wb") as f:
+        pickle.dump(-1, f)
+
+    with pytest.raises(ValueError):
+        load_results(filename)
+
+
+def test_out_of_core(example_results, tmpdir):
+    """Make sure results processed out-of-core from memory-mapped data are
+    identical to those processed in memory."""
+    r = example_results
+
+    # Memory-map the raw data of every core from a file
+    filename = str(tmpdir.join("results.bin"))
+    extents = {}
+    with open(filename, "wb") as f:
+        for core, data in iteritems(r._cores_result_data):
+            extents[core] = (f.tell(), len(data))
+            f.write(data)
+    mapped = np.memmap(filename, dtype=np.uint8, mode="r")
+    cores_result_data = {core: mapped[offset:offset + num_bytes]
+                         for core, (offset, num_bytes) in iteritems(extents)}
+
+    samples_file = str(tmpdir.join("results.samples.npy"))
+    out_of_core = Results(r._experiment, r._cores, r._flows,
+                          r._cores_records, r._router_recording_cores,
+                          r._placements, r._routes, cores_result_data,
+                          r._groups, samples_file)
+
+    for table in Results.TABLES:
+        assert (to_csv(getattr(out_of_core, table)()) ==
+                to_csv(getattr(r, table)()))
+
+    # The sample matrix should have been written to disk
+    assert isinstance(out_of_core._samples, np.memmap)
+    assert np.array_equal(np.load(samples_file), r._sample_columns(
+        np.ones(len(r._column_counter), dtype=bool)))
+
+    # Out-of-core results should be saved with their raw data
+    saved = str(tmpdir.join("results.pickle"))
+    out_of_core.save(saved)
+    assert to_csv(load_results(saved).totals()) == to_csv(r.totals())
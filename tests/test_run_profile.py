@@ -0,0 +1,226 @@
+import pytest
+
+import json
+
+from network_tester.experiment import Experiment
+
+from network_tester.emulator import EmulatedMachineController
+
+from network_tester.errors import NetworkTesterError
+
+from network_tester.run_profile import \
+    RunProfile, Phase, CostModel, scp_operations
+
+
+def test_scp_operations():
+    assert scp_operations(0) == 1
+    assert scp_operations(1) == 1
+    assert scp_operations(256) == 1
+    assert scp_operations(257) == 2
+
+
+def test_phases(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("network_tester.run_profile.time.time",
+                        lambda: now[0])
+
+    profile = RunProfile()
+    now[0] += 1.0
+    with profile.phase("upload"):
+        profile.count(100, 2)
+        profile.count(10)
+        now[0] += 2.0
+    with profile.phase("barrier", "group"):
+        # Nested phases keep their own counts
+        with profile.phase("inner"):
+            profile.count(1, 1)
+            now[0] += 0.5
+        profile.count()
+    with profile.phase("barrier"):
+        now[0] += 0.25
+
+    # Counts outside of phases are ignored
+    profile.count(1000, 1000)
+
+    assert profile.phases == [
+        Phase("upload", None, 1.0, 2.0, 110, 3),
+        Phase("inner", None, 3.0, 0.5, 1, 1),
+        Phase("barrier", "group", 3.0, 0.5, 0, 1),
+        Phase("barrier", None, 3.5, 0.25, 0, 0),
+    ]
+    assert profile.duration == 3.25
+
+    totals = profile.totals()
+    assert list(totals) == ["upload", "inner", "barrier"]
+    assert totals["barrier"] == Phase("barrier", None, 3.0, 0.75, 0, 1)
+
+    assert str(profile).splitlines()[1].split() == ["upload", "2.000",
+                                                    "110", "3"]
+    assert repr(profile) == "<RunProfile 4 phases, 3.250 s>"
+
+
+def test_chrome_trace(tmpdir):
+    profile = RunProfile()
+    with profile.phase("upload"):
+        profile.count(100, 1)
+
+    filename = str(tmpdir.join("trace.json"))
+    profile.write_chrome_trace(filename)
+    with open(filename) as f:
+        trace = json.load(f)
+
+    event, = trace["traceEvents"]
+    assert event["name"] == "upload"
+    assert event["ph"] == "X"
+    assert event["ts"] >= 0.0
+    assert event["dur"] >= 0.0
+    assert event["args"] == {"bytes": 100, "scp_operations": 1}
+
+
+def test_cost_model():
+    cost_model = CostModel({"upload": (1.0, 0.5, 0.25)})
+    assert cost_model.cost("upload", 4, 8) == 1.0 + 2.0 + 2.0
+    assert cost_model.cost("exit", 0, 1) == \
+        CostModel.DEFAULT_COEFFICIENTS["exit"][0]
+    assert cost_model.cost("unknown", 100, 100) == 0.0
+
+    # Coefficients are fitted to the phases of previous runs
+    profile = RunProfile()
+    profile.phases = [
+        Phase("upload", None, 0.0, 0.1 + (1e-3 * ops), 256 * ops, ops)
+        for ops in (1, 2, 4, 8)
+    ] + [
+        Phase("placement", None, 0.0, duration, 0, 0)
+        for duration in (1.0, 2.0)
+    ] + [
+        # Negative costs are never fitted
+        Phase("barrier", None, 0.0, 1.0 - (1e-3 * ops), 0, ops)
+        for ops in (1, 2)
+    ] + [
+        # The time spent running is not included in profiles
+        Phase("run", None, 0.0, 10.0, 0, 1),
+    ]
+    cost_model = CostModel.calibrate([profile])
+    assert cost_model.cost("upload", 256 * 16, 16) == \
+        pytest.approx(0.1 + 16e-3)
+    assert cost_model.coefficients["placement"] == \
+        pytest.approx((1.5, 0.0, 0.0))
+    assert cost_model.coefficients["barrier"] == \
+        pytest.approx((0.9985, 0.0, 0.0))
+    assert cost_model.coefficients["run"] == \
+        CostModel.DEFAULT_COEFFICIENTS["run"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_predict_duration(compact):
+    e = Experiment(EmulatedMachineController(2, 2, seed=1))
+    e.timestep = 1e-5
+    e.warmup = e.cooldown = e.flush_time = 0.0
+    e.duration = 1e-2
+    e.record_sent = True
+    e.compact_recording = compact
+    cores = [e.new_core(x, 0) for x in range(2)]
+    e.new_flow(cores[0], cores[1])
+    groups = [e.new_group(), e.new_group()]
+    with groups[1]:
+        e.duration = 0.5
+
+    cost_model = CostModel({"barrier": (0.25, 0.0, 0.0)})
+    prediction = e.predict_duration(cost_model)
+    predicted = prediction.profile.totals()
+
+    assert prediction.run == pytest.approx(
+        0.51 + (2 * 0.25) + (2 * 1e-3) + 0.05)
+    assert prediction.total == pytest.approx(
+        prediction.load + prediction.run + prediction.readback)
+    assert prediction.total == pytest.approx(prediction.profile.duration)
+    assert [(p.name, p.group) for p in prediction.profile.phases[-7:]] == [
+        ("barrier", groups[0]),
+        ("run", groups[0]),
+        ("barrier", groups[1]),
+        ("run", groups[1]),
+        ("exit", None),
+        ("readback", None),
+        ("results", None),
+    ]
+
+    # The predicted transfers match those made when the experiment is run
+    actual = e.run().profile.totals()
+    for name in ("sdram_allocation", "upload", "routing_table_load",
+                 "application_load", "barrier", "run", "exit"):
+        assert predicted[name].num_bytes == actual[name].num_bytes
+        assert predicted[name].num_operations == \
+            actual[name].num_operations
+    if compact:
+        # Less data is recorded than the space allocated
+        assert predicted["readback"].num_bytes >= actual["readback"].num_bytes
+    else:
+        assert predicted["readback"][4:] == actual["readback"][4:]
+
+    # Overrunning slots produces a warning
+    with pytest.warns(RuntimeWarning):
+        e.predict_duration(cost_model, slot=1.0)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_experiment_run(compact):
+    mc = EmulatedMachineController(2, 2, seed=1)
+    e = Experiment(mc)
+    e.timestep = 1e-5
+    e.warmup = e.cooldown = e.flush_time = 0.0
+    e.duration = 1e-3
+    e.record_sent = True
+    e.compact_recording = compact
+    cores = [e.new_core(x, 0) for x in range(2)]
+    e.new_flow(cores[0], cores[1])
+    e.new_flow(cores[1], cores[0])
+    groups = [e.new_group(), e.new_group()]
+    results = e.run()
+
+    profile = results.profile
+    assert [(phase.name, phase.group) for phase in profile.phases] == [
+        ("placement", None),
+        ("allocation", None),
+        ("routing", None),
+        ("table_generation", None),
+        ("minimisation", None),
+        ("command_build", None),
+        ("sdram_allocation", None),
+        ("upload", None),
+        ("routing_table_load", None),
+        ("application_load", None),
+        ("barrier", groups[0]),
+        ("run", groups[0]),
+        ("barrier", groups[1]),
+        ("run", groups[1]),
+        ("exit", None),
+        ("readback", None),
+        ("results", None),
+    ]
+
+    totals = profile.totals()
+    assert totals["run"].duration >= 2e-3
+    assert totals["sdram_allocation"].num_operations == 2
+    assert totals["upload"].num_bytes == mc.num_units["write"]
+    assert totals["upload"].num_operations == 2
+    assert totals["routing_table_load"].num_bytes > 0
+    assert totals["application_load"].num_bytes > 0
+    assert totals["barrier"].num_operations == 2
+    assert totals["readback"].num_bytes == mc.num_units["read"]
+    if not compact:
+        assert totals["readback"].num_operations == 2
+
+
+def test_experiment_error():
+    # The profile is also available when errors occur: the simulated cores
+    # cannot keep up with the timestep
+    e = Experiment(EmulatedMachineController(1, 1, simulate=True, seed=1))
+    e.timestep = 1e-7
+    e.warmup = e.cooldown = e.flush_time = 0.0
+    e.duration = 1e-5
+    cores = [e.new_core(0, 0) for _ in range(2)]
+    e.new_flow(cores[0], cores[1])
+    with pytest.raises(NetworkTesterError) as exc_info:
+        e.run()
+    assert exc_info.value.profile is exc_info.value.results.profile
+    assert exc_info.value.profile.phases[-1].name == "results"
@@ -0,0 +1,256 @@
+import pytest
+
+import struct
+
+import numpy as np
+
+from rig.machine_control.machine_controller import SystemInfo, ChipInfo
+from rig.routing_table import RoutingTableEntry, Routes
+
+from network_tester.commands import NT_CMD, Commands, compact_tag_words
+
+from network_tester.counters import Counters
+
+from network_tester.errors import NT_ERR
+
+from network_tester.results import decode_compact, decode_aggregates
+
+from network_tester.simulator import Simulator, decode_commands
+
+
+@pytest.fixture
+def system_info():
+    return SystemInfo(2, 2, {(x, y): ChipInfo()
+                             for x in range(2) for y in range(2)})
+
+
+@pytest.fixture
+def routing_tables():
+    """A single flow (key 0x100) from (0, 0, 1) to (1, 0, 1) and a reply flow
+    (key 0x200) carrying packets back."""
+    return {
+        (0, 0): [RoutingTableEntry({Routes.east}, 0x100, 0xFFFFFF00),
+                 RoutingTableEntry({Routes.core(1)}, 0x200, 0xFFFFFF00)],
+        (1, 0): [RoutingTableEntry({Routes.core(1)}, 0x100, 0xFFFFFF00),
+                 RoutingTableEntry({Routes.west}, 0x200, 0xFFFFFF00)],
+    }
+
+
+def make_commands(source, records, timestep=1e-5, duration=1e-3,
+                  probability=1.0, packets_per_timestep=1, payload=False,
+                  consume=True, reinject=False, echo=False,
+                  compact_samples=None, aggregate=False, record_interval=0.0,
+                  num_bins=0):
+    """Make the commands for either the source or sink core of the flow."""
+    c = Commands()
+    if source:
+        c.num(1, 0)
+        c.source_key(0, 0x100)
+        if echo:
+            c.num_replies(1)
+            c.reply_key(0, 0x200, 0)
+    else:
+        c.num(0, 1)
+        c.sink_key(0, 0x100)
+        if echo:
+            c.echo_key(0, 0x200)
+    if compact_samples is not None:
+        c.compact_recording(compact_samples * compact_tag_words(
+            len([r for r in records if not r.permanent_counter]) + 1))
+    if aggregate:
+        c.aggregate_recording()
+    if num_bins:
+        c.latency_histogram(num_bins, 1e-7)
+    c.seed(1234)
+    c.timestep(timestep)
+    c.record_interval(record_interval)
+    if source:
+        c.probability(0, probability)
+        c.num_packets(0, packets_per_timestep)
+        c.payload(0, payload or echo)
+    c.barrier()
+    c.reinject(reinject)
+    c.consume(consume)
+    c.record(*records)
+    c.run(duration)
+    c.consume(True)
+    c.reinject(False)
+    c.sleep(1e-4)
+    c.exit()
+    return c
+
+
+def run(system_info, routing_tables, source_records, sink_records,
+        simulator_kwargs={}, **kwargs):
+    """Simulate the flow returning the error word and recorded words of the
+    source and sink."""
+    sim = Simulator(system_info, routing_tables, {
+        (0, 0, 1): make_commands(True, source_records, **kwargs),
+        (1, 0, 1): make_commands(False, sink_records, **kwargs),
+    }, seed=1, **simulator_kwargs)
+    out = sim.run()
+    return [struct.unpack("<{}I".format(len(data) // 4), data)
+            for data in (out[(0, 0, 1)], out[(1, 0, 1)])]
+
+
+def test_decode_commands():
+    c = Commands()
+    c.num(2, 1)
+    c.timestep(1e-6)
+    c.exit()
+    assert decode_commands(c.pack()) == [
+        NT_CMD.NUM, 2 | (1 << 16), NT_CMD.TIMESTEP, 1000, NT_CMD.EXIT]
+
+
+def test_flow(system_info, routing_tables):
+    source, sink = run(system_info, routing_tables,
+                       [Counters.sent, Counters.blocked,
+                        Counters.local_multicast],
+                       [Counters.received, Counters.missing,
+                        Counters.external_multicast])
+
+    # Error word, deadlines_missed, local_multicast, sent, blocked
+    assert source == (0, 0, 100, 100, 0)
+
+    # Error word, deadlines_missed, external_multicast, received, missing.
+    # The final packet is still in flight when the sink stops recording.
+    assert sink == (0, 0, 99, 99, 0)
+
+
+def test_probability(system_info, routing_tables):
+    source, sink = run(system_info, routing_tables, [Counters.sent],
+                       [Counters.received], probability=0.5)
+    assert 30 < source[2] < 70
+    assert sink[2] in (source[2], source[2] - 1)
+
+
+def test_overload(system_info, routing_tables):
+    # Try to send more packets than the source and sink can handle
+    records = [Counters.dropped_multicast, Counters.received,
+               Counters.missing]
+    source, sink = run(system_info, routing_tables,
+                       [Counters.sent, Counters.blocked], records,
+                       timestep=1e-6, packets_per_timestep=8)
+
+    error, deadlines_missed, sent, blocked = source
+    assert error == NT_ERR.DEADLINE_MISSED | NT_ERR.MOST_DEADLINES_MISSED
+    assert deadlines_missed > 500
+    assert blocked > 0
+
+    # Back-pressure from the sink prevents packets being sent and so none
+    # are lost
+    error, deadlines_missed, dropped, received, missing = sink
+    assert error == 0
+    assert deadlines_missed == 0
+    assert dropped == 0
+    assert missing == 0
+    assert received < sent
+
+    # If the sink takes longer to handle each packet than the router
+    # timeout, packets are dropped
+    _, sink = run(system_info, routing_tables, [], records, timestep=1e-6,
+                  simulator_kwargs={"receive_cycles": 2000})
+    error, deadlines_missed, dropped, received, missing = sink
+    assert dropped > 0
+    assert missing > 0
+    assert received < 1000
+
+
+def test_no_consume(system_info, routing_tables):
+    records = [Counters.dropped_multicast, Counters.reinjected,
+               Counters.reinject_missed]
+    _, sink = run(system_info, routing_tables, [], records, consume=False)
+    error, deadlines_missed, dropped, reinjected, missed = sink
+    assert error == 0
+    assert dropped >= 98
+    assert reinjected == missed == 0
+
+    # With reinjection enabled, dropped packets are reinjected (and dropped
+    # again)
+    _, sink = run(system_info, routing_tables, [], records, consume=False,
+                  reinject=True)
+    error, deadlines_missed, dropped, reinjected, missed = sink
+    assert dropped > 98
+    assert reinjected > 0
+    assert dropped >= reinjected + missed
+
+
+def test_latency_and_round_trip(system_info, routing_tables):
+    source, sink = run(system_info, routing_tables,
+                       [Counters.sent, Counters.round_trip],
+                       [Counters.received, Counters.latency],
+                       echo=True, num_bins=32)
+    sent = source[2]
+    round_trip = source[3:]
+    received = sink[2]
+    latency = sink[3:]
+
+    # Every packet arrives (except the final one still in transit) and
+    # (except the last couple) returns
+    assert len(latency) == len(round_trip) == 32
+    assert sum(latency) == received == sent - 1
+    assert sent - 2 <= sum(round_trip) <= sent
+
+    # Latencies are a few hundred ns, round trips take longer
+    latency_bin = np.argmax(latency)
+    round_trip_bin = np.argmax(round_trip)
+    assert 0 < latency_bin < round_trip_bin < 31
+
+
+@pytest.mark.parametrize("record_interval", [0.0, 1e-4])
+def test_compact_and_aggregate_recording(system_info, routing_tables,
+                                         record_interval):
+    records = [Counters.sent, Counters.blocked, Counters.local_multicast]
+    num_samples = 1 if record_interval == 0.0 else 10
+
+    source, _ = run(system_info, routing_tables, records, [],
+                    probability=0.5, record_interval=record_interval)
+    raw = np.array(source[1:], dtype=np.uint).reshape((num_samples, -1))
+
+    # Compactly recorded values are identical
+    source, _ = run(system_info, routing_tables, records, [],
+                    probability=0.5, record_interval=record_interval,
+                    compact_samples=num_samples)
+    data = struct.pack("<{}I".format(len(source)), *source)
+    assert source[0] == 0
+    assert np.array_equal(decode_compact(data[4:], num_samples, 4), raw)
+
+    # Aggregates match the samples
+    source, _ = run(system_info, routing_tables, records, [],
+                    probability=0.5, record_interval=record_interval,
+                    aggregate=True)
+    data = struct.pack("<{}I".format(len(source)), *source)
+    assert source[0] == 0
+    total, minimum, maximum, total_squares = decode_aggregates(data[4:],
+                                                               1, 4)
+    assert np.array_equal(total[0], raw.sum(axis=0))
+    assert np.array_equal(minimum[0], raw.min(axis=0))
+    assert np.array_equal(maximum[0], raw.max(axis=0))
+    assert np.array_equal(total_squares[0], (raw * raw).sum(axis=0))
+
+
+def test_errors(system_info, routing_tables):
+    # Packets arriving at a core with no matching sink are unexpected
+    source = make_commands(True, [])
+    sink = Commands()
+    sink.barrier()
+    sink.sleep(1e-3)
+    sink.exit()
+    out = Simulator(system_info, routing_tables,
+                    {(0, 0, 1): source, (1, 0, 1): sink}).run()
+    assert struct.unpack("<I", out[(0, 0, 1)][:4])[0] == 0
+    assert struct.unpack("<I", out[(1, 0, 1)][:4])[0] == \
+        NT_ERR.UNEXPECTED_PACKET
+
+    # Unknown commands terminate the application
+    out = Simulator(system_info, {},
+                    {(0, 0, 1): struct.pack("<II", 4, 0xFF)}).run()
+    assert out[(0, 0, 1)] == struct.pack("<I", NT_ERR.UNKNOWN_COMMAND)
+
+    # Bad arguments are reported
+    c = Commands()
+    c.num(1, 0)
+    c._commands.extend([NT_CMD.SOURCE_KEY | (1 << 8), 0x100])
+    c.exit()
+    out = Simulator(system_info, {}, {(0, 0, 1): c}).run()
+    assert out[(0, 0, 1)] == struct.pack("<I", NT_ERR.BAD_ARGUMENTS)